@@ -1,17 +1,33 @@
-from flask import Flask, request, jsonify, send_file, send_from_directory
+import sys
+import time
+_import_started = time.perf_counter()
+
+from flask import Flask, request, jsonify, send_file, send_from_directory, g, stream_with_context
 from flask_cors import CORS
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-import io
 import base64
+import multiprocessing
 import os
 from datetime import datetime, timedelta
 import warnings
 warnings.filterwarnings('ignore')
 
-from src.ml.model import MarketAnalysisModel
+from src.ml.dataset_loader import DatasetLoader
+from src.ml.model_registry import ModelRegistry
+from src.ml.jobs import TrainingScheduler, CategoryWarmup, TrainingInProgressError
+from src.ml.ingest import IngestStore, InvalidRowsError
+from src.ml.performance import (compute_product_performance, compute_entity_performance,
+                                lookup_product_performance, resolve_entity_columns,
+                                performance_from_aggregates)
+from src.ml.entity_index import EntityIndexCache
+from src.ml.feature_store import FeatureStore
+from src.ml.charts import ChartService
+from src.ml.response_cache import ResponseCache
+from src.ml.schemas import get_schema
+from src.ml.streaming import StreamingLoader, should_stream
+from src.ml.timing import RequestMetrics, span, start_request, finish_request
+from src.ml.profiling import RequestProfiler, SORT_KEYS
 
 app = Flask(__name__, static_folder='.')
 CORS(app)  # Enable CORS for all routes
@@ -19,8 +35,64 @@ CORS(app)  # Enable CORS for all routes
 # Define the base directory for your categories
 BASE_DIR = "src/ml"
 
-# Initialize the enhanced ML model
-model = MarketAnalysisModel()
+# Directory for on-disk caches (dataset snapshots etc.)
+CACHE_DIR = os.environ.get('MARKET_CACHE_DIR', '.cache')
+
+# Parsed datasets are served from columnar snapshots instead of re-reading the CSVs
+dataset_loader = DatasetLoader(os.path.join(CACHE_DIR, 'datasets'))
+
+# Trained models are kept per category and reused until the dataset or model config changes
+model_registry = ModelRegistry(os.path.join(CACHE_DIR, 'models'))
+
+# Background training jobs run in a process pool and publish to the model registry
+training_scheduler = TrainingScheduler(CACHE_DIR, max_workers=int(os.environ.get('MARKET_TRAINING_WORKERS', 2)))
+
+# Startup warm-up: load saved models or queue training for every category, tracked for /ready
+category_warmup = CategoryWarmup(dataset_loader, model_registry, training_scheduler)
+
+# Rows appended through /ingest, kept alongside the source CSVs without rewriting them
+ingest_store = IngestStore(os.path.join(CACHE_DIR, 'ingest'))
+
+# Files too large to load whole are read in chunks into running aggregates and a bounded sample
+streaming_loader = StreamingLoader()
+
+# Product, brand and symbol row indexes, rebuilt when a dataset version changes
+entity_indexes = EntityIndexCache()
+
+# Processed and feature frames shared by both predictors, rebuilt when a dataset version changes
+feature_store = FeatureStore()
+
+# Request and per-stage duration histograms, served in the Prometheus text format from /metrics
+request_metrics = RequestMetrics()
+
+# Whether responses carry a Server-Timing header with the duration of each stage
+SERVER_TIMING = os.environ.get('MARKET_SERVER_TIMING', '1') == '1'
+
+# Opt-in cProfile of flagged requests (MARKET_PROFILING=1), reports served from /profiles
+request_profiler = RequestProfiler(profile_dir=os.path.join(CACHE_DIR, 'profiles'))
+
+# Charts are rendered off the request path and served by content hash from /charts
+chart_service = ChartService(os.path.join(CACHE_DIR, 'charts'), max_workers=int(os.environ.get('MARKET_CHART_WORKERS', 1)),
+                             on_render=lambda seconds: request_metrics.observe_stage('charts', 'matplotlib', seconds))
+
+# Serialized analysis responses, keyed by dataset version, model and request parameters
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get('MARKET_RESPONSE_CACHE_SIZE', 128)),
+    cache_dir=os.path.join(CACHE_DIR, 'responses') if os.environ.get('MARKET_RESPONSE_CACHE_DISK') == '1' else None
+)
+
+# Libraries that are only imported when a request needs them (model training,
+# trend decomposition, chart rendering), so a worker starts without them
+DEFERRED_MODULES = ['xgboost', 'statsmodels', 'seaborn', 'matplotlib', 'sklearn']
+
+# Seconds a worker may spend importing the app before a startup warning is printed
+STARTUP_BUDGET = float(os.environ.get('MARKET_STARTUP_BUDGET', 1.0))
+
+# Seconds clients are told to wait (Retry-After) before asking again for a model still in training
+TRAINING_RETRY_AFTER = int(os.environ.get('MARKET_TRAINING_RETRY_AFTER', 10))
+
+# Seconds clients are told to wait (Retry-After) before asking again for a chart still rendering
+CHART_RETRY_AFTER = 1
 
 # Get available categories and their dataset paths
 def get_category_datasets():
@@ -34,14 +106,150 @@ def get_category_datasets():
                     break
     return categories
 
-def generate_predictions(df, category='general'):
-    """Generate predictions using the enhanced ML model"""
+# Trend fields reported for products without usable data
+UNKNOWN_TRENDS = {
+    'trend_direction': 'Unknown',
+    'seasonality': 'Unknown',
+    'stability': 'Unknown',
+    'trend_strength': 0,
+    'market_coverage_trend': 'Unknown'
+}
+
+def load_streamed(category, dataset_path):
+    """Get the streamed dataset of a category file large enough for streaming mode, else None"""
+    if not should_stream(dataset_path):
+        return None
+    fingerprint = dataset_loader.fingerprint(dataset_path)
+    version = (fingerprint, ingest_store.ingested_rows(category, fingerprint))
+    return streaming_loader.load(category, dataset_path, version, ingest_store.rows(category, fingerprint))
+
+def load_category_frame(category, dataset_path):
+    """
+    Load a category dataset with its ingested rows and the derived sales and date columns.
+    In streaming mode this is the bounded sample of the file's rows.
+    """
+    streamed = load_streamed(category, dataset_path)
+    if streamed is not None:
+        return streamed.sample.copy(deep=False)
+    df = dataset_loader.load(dataset_path, copy=False, schema=get_schema(category))
+    return ingest_store.prepared(category, dataset_loader.fingerprint(dataset_path), df)
+
+def load_incremental(category, dataset_path):
+    """The running aggregates and online model of a category with ingested rows, or None"""
+    return ingest_store.incremental(category, dataset_loader.fingerprint(dataset_path),
+                                    dataset_loader.load(dataset_path, copy=False, schema=get_schema(category)))
+
+def get_entity_index(category, dataset_path, df):
+    """Get the entity index of a frame returned by load_category_frame"""
+    fingerprint = dataset_loader.fingerprint(dataset_path)
+    version = (fingerprint, ingest_store.ingested_rows(category, fingerprint), len(df))
+    return entity_indexes.get(category.lower(), version, df)
+
+def get_features(category, dataset_path, df, model):
+    """
+    Get the feature set of a frame returned by load_category_frame, encoded by the
+    label encoders of the model serving it
+    """
+    fingerprint = dataset_loader.fingerprint(dataset_path)
+    version = (fingerprint, ingest_store.ingested_rows(category, fingerprint), len(df))
+    return feature_store.get(category.lower(), version, df, category, model)
+
+def get_category_model(category, df, dataset_path):
+    """
+    Get the trained model for a category, training it only when the registry has no match.
+    While a background retrain of the category is running, the last completed model is served;
+    when there is none yet, TrainingInProgressError is raised rather than training a second time.
+    """
+    fingerprint = dataset_loader.fingerprint(dataset_path)
+    with span('model'):
+        cached = model_registry.lookup(category, fingerprint)
+        if cached is not None:
+            return cached
+        
+        job_id = training_scheduler.active_job(category)
+        if job_id is not None:
+            latest = model_registry.get_latest(category)
+            if latest is not None:
+                return latest
+            raise TrainingInProgressError(category, job_id)
+        
+        return model_registry.get_or_train(category, fingerprint, df)
+
+def training_response(error):
+    """503 for a category whose model is still training, pointing at the training job"""
+    response = jsonify({'error': str(error), 'job_id': error.job_id, 'job_url': f'/jobs/{error.job_id}'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(TRAINING_RETRY_AFTER)
+    return response
+
+def response_cache_key(endpoint, category, dataset_path):
+    """
+    Cache key of an analysis response: the dataset version (including ingested rows),
+    the key of the current model and the normalized request parameters
+    """
+    fingerprint = dataset_loader.fingerprint(dataset_path)
+    return response_cache.make_key(
+        endpoint,
+        category.lower(),
+        fingerprint,
+        ingest_store.ingested_rows(category, fingerprint),
+        model_registry.current_key(category, fingerprint),
+        sorted(request.args.items(multi=True)),
+        request.get_json(silent=True)
+    )
+
+def cached_response(key, stamp=False):
+    """
+    Get the cached response for a key (a 304 when the client has its ETag), or None.
+    With stamp, the body gets the time of this response (see stamp_response).
+    """
+    cached = response_cache.get(key)
+    if cached is None:
+        return None
+    etag, body = cached
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(body, mimetype='application/json')
+        if stamp:
+            stamp_response(response)
+    response.set_etag(etag, weak=stamp)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def cache_response(key, response, category, dataset_path, model, stamp=False):
+    """
+    Store a successful response and tag it with its ETag. Responses computed with an
+    older model (served while the category retrains) are not stored. With stamp, the
+    body is stored as is and sent with the time of the response added.
+    """
+    current = model_registry.lookup(category, dataset_loader.fingerprint(dataset_path))
+    if response.status_code == 200 and current is not None and current[0] is model:
+        response.set_etag(response_cache.put(key, response.get_data()), weak=stamp)
+        response.headers['Cache-Control'] = 'no-cache'
+    if stamp and response.status_code == 200:
+        stamp_response(response)
+    return response
+
+def stamp_response(response):
+    """
+    Add the time of a response to its JSON body as 'timestamp'. It is kept out of the
+    cached body, so cache hits do not repeat the time of the first response; bodies
+    then differ between responses, so their ETags are weak.
+    """
+    body = response.get_json()
+    body['timestamp'] = datetime.now().isoformat()
+    response.set_data(app.json.dumps(body))
+    return response
+
+def generate_predictions(df, model, metrics, features=None, online_model=None):
+    """
+    Generate predictions using the enhanced ML model, and with online_model (the
+    model updated by ingested rows) its predictions as 'online'
+    """
     try:
-        # Train the model with category-specific processing
-        metrics = model.train(df, category)
-        
         # Make predictions
-        predictions = model.predict(df)
+        predictions = model.predict(df, features=features)
         
         # Prepare dates for predictions
         if 'date' in df.columns:
@@ -50,7 +258,7 @@ def generate_predictions(df, category='general'):
             dates = pd.date_range(start=datetime.now(), periods=30, freq='D')
         
         # Get market coverage predictions
-        market_coverage_data = model.predict_market_coverage(df)
+        market_coverage_data = model.predict_market_coverage(df, features=features)
         
         # Format predictions
         predictions_by_brand = {
@@ -63,50 +271,75 @@ def generate_predictions(df, category='general'):
             }
         }
         
+        # Rows ingested since training are only learned by the online model
+        if online_model is not None and online_model.samples_seen:
+            online = online_model.predict(df, history=False)
+            predictions_by_brand['online'] = {
+                'dates': dates,
+                'values': online[-30:].tolist(),
+                'model_metrics': {'samples_seen': online_model.samples_seen},
+                'best_model': online_model.best_model_name
+            }
+        
         return predictions_by_brand, df
     except Exception as e:
         raise ValueError(f"Error generating predictions: {str(e)}")
 
 def generate_visualizations(df, dates, values, metrics):
-    """Generate visualizations for the analysis"""
+    """Queue the sales trend and predictions chart for rendering; returns the chart key"""
     try:
-        plt.figure(figsize=(12, 6))
+        series = []
         
         # Plot actual sales
         if 'date' in df.columns and 'sales' in df.columns:
-            plt.plot(pd.to_datetime(df['date']), df['sales'], label='Actual Sales', alpha=0.7)
+            series.append({'x': pd.to_datetime(df['date']).to_numpy(), 'y': df['sales'].to_numpy(dtype=float),
+                           'label': 'Actual Sales', 'alpha': 0.7})
         
         # Plot predictions
-        plt.plot(dates, values, label='Predictions', linestyle='--')
-        
-        plt.title('Sales Trend and Predictions')
-        plt.xlabel('Date')
-        plt.ylabel('Sales')
-        plt.legend()
-        plt.grid(True, alpha=0.3)
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        
-        # Convert plot to base64
-        img = io.BytesIO()
-        plt.savefig(img, format='png')
-        img.seek(0)
-        visualization = base64.b64encode(img.getvalue()).decode()
-        plt.close()
-        
-        return visualization
+        series.append({'x': pd.DatetimeIndex(dates).to_numpy(), 'y': np.asarray(values, dtype=float),
+                       'label': 'Predictions', 'linestyle': '--'})
+        
+        return chart_service.submit({
+            'title': 'Sales Trend and Predictions',
+            'xlabel': 'Date',
+            'ylabel': 'Sales',
+            'figsize': (12, 6),
+            'legend': True,
+            'grid': True,
+            'series': series
+        })
     except Exception as e:
         raise ValueError(f"Error generating visualization: {str(e)}")
 
-def analyze_product_performance(df, product_name, brand=None, category='general'):
-    """Analyze performance metrics for a specific product with market coverage"""
+def chart_reference(key):
+    """
+    Reference to a queued chart: its URL and ETag, plus the base64 PNG when the
+    request asks for inline charts with ?embed_charts=1
+    """
+    reference = {'visualization_url': f'/charts/{key}.png', 'visualization_etag': key, 'visualization': None}
+    if request.args.get('embed_charts') in ('1', 'true'):
+        with span('chart_wait'):
+            reference['visualization'] = base64.b64encode(chart_service.get(key)).decode()
+    return reference
+
+def analyze_product_performance(df, model, product_name, brand=None, category='general',
+                                performance=None, trends=None, coverage=None, index=None, features=None):
+    """
+    Analyze performance metrics for a specific product with market coverage.
+    When analyzing many products, pass the table from compute_product_performance
+    and the dicts from model.analyze_trends_batch and model.predict_market_coverage_bulk
+    so they are computed once instead of per product. For a single product, pass
+    the frame's entity index so only the product's rows are used.
+    """
     try:
-        if brand:
-            product_data = df[(df['product'] == product_name) & (df['brand'] == brand)]
+        if performance is not None:
+            product_row = lookup_product_performance(performance, product_name, brand)
+        elif index is not None:
+            product_row = compute_entity_performance(df, index, product_name, brand)
         else:
-            product_data = df[df['product'] == product_name]
+            product_row = lookup_product_performance(compute_product_performance(df), product_name, brand)
         
-        if product_data.empty:
+        if product_row is None:
             return {
                 'marketShare': 0,
                 'growthPrediction': 0,
@@ -123,51 +356,32 @@ def analyze_product_performance(df, product_name, brand=None, category='general'
                 }
             }
         
-        # Calculate market share
-        total_sales = df['sales'].sum()
-        product_sales = product_data['sales'].sum()
-        market_share = (product_sales / total_sales) * 100
-        
         # Get trend analysis from enhanced ML model
-        trends = model.analyze_trends(df, product_name, brand)
-        
-        # Get market coverage prediction
-        market_coverage_data = model.predict_market_coverage(df, product_name, brand)
-        market_coverage = market_coverage_data.get('average_market_coverage', 0)
-        
-        # Calculate growth rate
-        if 'date' in df.columns:
-            df['date'] = pd.to_datetime(df['date'])
-            product_data['date'] = pd.to_datetime(product_data['date'])
-            
-            # Calculate month-over-month growth
-            monthly_sales = product_data.groupby(product_data['date'].dt.to_period('M'))['sales'].sum()
-            if len(monthly_sales) > 1:
-                growth_rate = ((monthly_sales.iloc[-1] - monthly_sales.iloc[-2]) / monthly_sales.iloc[-2]) * 100
-            else:
-                growth_rate = 0
+        if trends is not None:
+            trends = trends.get((brand, product_name) if brand else product_name, dict(UNKNOWN_TRENDS))
         else:
-            growth_rate = 0
+            trends = model.analyze_trends(df, product_name, brand, index=index, features=features)
         
-        # Calculate competitor analysis
-        if brand:
-            competitors = df[df['brand'] != brand]['sales'].sum()
-            competitor_percentage = (competitors / total_sales) * 100
+        # Get market coverage prediction
+        if coverage is not None:
+            market_coverage_data = coverage.get((brand, product_name) if brand else product_name,
+                                                {"error": "No data found for specified product/brand"})
         else:
-            competitor_percentage = ((total_sales - product_sales) / total_sales) * 100
+            market_coverage_data = model.predict_market_coverage(df, product_name, brand, index=index, features=features)
+        market_coverage = market_coverage_data.get('average_market_coverage', 0)
         
         # Generate insights including market coverage
         insights = {
             'market_position': market_coverage_data.get('market_position', 'Unknown'),
-            'growth_status': 'Growing' if growth_rate > 0 else 'Declining',
-            'competition_level': 'High' if competitor_percentage > 70 else 'Moderate' if competitor_percentage > 40 else 'Low',
+            'growth_status': product_row['growth_status'],
+            'competition_level': product_row['competition_level'],
             'coverage_trend': market_coverage_data.get('coverage_trend', 'Unknown')
         }
         
         return {
-            'marketShare': round(market_share, 2),
-            'growthPrediction': round(growth_rate, 2),
-            'competitorPercentage': round(competitor_percentage, 2),
+            'marketShare': round(float(product_row['market_share']), 2),
+            'growthPrediction': round(float(product_row['growth_rate']), 2),
+            'competitorPercentage': round(float(product_row['competitor_percentage']), 2),
             'marketCoverage': round(market_coverage, 2),
             'trends': trends,
             'insights': insights,
@@ -176,6 +390,141 @@ def analyze_product_performance(df, product_name, brand=None, category='general'
     except Exception as e:
         raise ValueError(f"Error analyzing product performance: {str(e)}")
 
+# Entities whose insights are computed together when /analyze streams NDJSON
+INSIGHT_STREAM_CHUNK = int(os.environ.get('MARKET_INSIGHT_CHUNK', 50))
+
+# Insight fields /analyze can sort by (besides name and marketCoverage) and their performance columns
+INSIGHT_SORT_FIELDS = {
+    'marketShare': 'market_share',
+    'growthPrediction': 'growth_rate',
+    'competitorPercentage': 'competitor_percentage',
+    'sales': 'sales'
+}
+
+def insight_page_args():
+    """
+    The offset, limit and sort of an /analyze request. sort is an insight field,
+    name or marketCoverage, descending with a leading '-'; limit None means all.
+    """
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = request.args.get('limit')
+        limit = int(limit) if limit not in (None, '') else None
+    except ValueError:
+        raise ValueError("offset and limit must be integers")
+    if offset < 0 or (limit is not None and limit < 0):
+        raise ValueError("offset and limit must not be negative")
+    sort = request.args.get('sort') or None
+    if sort is not None and sort.lstrip('-') not in [*INSIGHT_SORT_FIELDS, 'name', 'marketCoverage']:
+        raise ValueError(f"Cannot sort insights by {sort.lstrip('-')}")
+    return offset, limit, sort
+
+def wants_ndjson():
+    """Whether an /analyze request asks for NDJSON (?format=ndjson or Accept: application/x-ndjson)"""
+    return (request.args.get('format') == 'ndjson' or
+            request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson']) == 'application/x-ndjson')
+
+def list_insight_entities(df, performance, product_col, brand_col, streamed=None):
+    """
+    (key, product, brand) of every entity /analyze reports an insight for, in response
+    order: brands in order of appearance with their products in order of appearance
+    """
+    if streamed is not None:
+        # Every entity of the file, including those the sample missed
+        if brand_col:
+            return [(f"{brand} - {product}", product, brand) for brand, product in performance.index]
+        return [(product, product, None) for product in performance.index]
+    if product_col and brand_col:
+        pairs = df[[brand_col, product_col]].drop_duplicates()
+        pairs = pairs[pairs[brand_col].notna()]
+        # factorize numbers brands in order of appearance
+        pairs = pairs.iloc[np.argsort(pd.factorize(pairs[brand_col])[0], kind='stable')]
+        return [(f"{brand} - {product}", product, brand)
+                for brand, product in zip(pairs[brand_col].tolist(), pairs[product_col].tolist())]
+    if product_col:
+        return [(product, product, None) for product in df[product_col].unique()]
+    return []
+
+def sort_insight_entities(entities, sort, performance, coverage):
+    """
+    Order entities by an insight field without building their insights: the values
+    come from the performance table and bulk coverage. Entities without a value go last.
+    """
+    if not sort:
+        return entities
+    field = sort.lstrip('-')
+    if field == 'name':
+        values = [str(key) for key, _, _ in entities]
+    elif field == 'marketCoverage':
+        values = [coverage.get((brand, product) if brand else product, {}).get('average_market_coverage')
+                  for _, product, brand in entities]
+    else:
+        column = performance[INSIGHT_SORT_FIELDS[field]].to_dict() if not performance.empty else {}
+        values = [column.get((brand, product) if performance.index.nlevels == 2 else product)
+                  for _, product, brand in entities]
+    known = [(value, entity) for value, entity in zip(values, entities) if value is not None and value == value]
+    unknown = [entity for value, entity in zip(values, entities) if value is None or value != value]
+    known.sort(key=lambda item: item[0], reverse=sort.startswith('-'))
+    return [entity for _, entity in known] + unknown
+
+# Time every request; stages report into it through span()
+@app.before_request
+def start_request_timing():
+    g.request_timing = start_request(request.endpoint or 'unmatched')
+
+@app.after_request
+def finish_request_timing(response):
+    token = g.pop('request_timing', None)
+    if token is None:
+        return response
+    timings = finish_request(token)
+    total = timings.elapsed()
+    request_metrics.observe_request(timings, total, response.status_code)
+    if SERVER_TIMING:
+        response.headers['Server-Timing'] = timings.server_timing(total)
+    return response
+
+@app.teardown_request
+def discard_request_timing(error=None):
+    token = g.pop('request_timing', None)
+    if token is not None:
+        finish_request(token)
+
+def profiling_order():
+    """
+    The order a request asks its profile to be sorted by (?profile= or the X-Profile
+    header: 1, cumulative, tottime or calls), or None when it is not to be profiled
+    """
+    value = request.args.get('profile') or request.headers.get('X-Profile')
+    if not value or value in ('0', 'false'):
+        return None
+    return value if value in SORT_KEYS else 'cumulative'
+
+# Profile flagged requests when profiling is enabled (and the token matches, if one is set)
+@app.before_request
+def start_request_profile():
+    if not request_profiler.enabled:
+        return
+    order = profiling_order()
+    if order is not None and request_profiler.allows(request.headers.get('X-Profile-Token')):
+        g.request_profile = (request_profiler.start(), order)
+
+@app.after_request
+def finish_request_profile(response):
+    profile = g.pop('request_profile', None)
+    if profile is None:
+        return response
+    report = request_profiler.finish(profile[0], request.endpoint, request.full_path, response.status_code, profile[1])
+    response.headers['X-Profile-Id'] = report['id']
+    response.headers['X-Profile-Url'] = f"/profiles/{report['id']}"
+    return response
+
+@app.teardown_request
+def discard_request_profile(error=None):
+    profile = g.pop('request_profile', None)
+    if profile is not None:
+        profile[0].disable()
+
 # Error handler
 @app.errorhandler(Exception)
 def handle_error(error):
@@ -197,6 +546,143 @@ def get_categories():
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+# Endpoint for request and stage duration histograms in the Prometheus text format
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return app.response_class(request_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# Endpoints for the reports of profiled requests, available only while profiling is enabled
+@app.route('/profiles', methods=['GET'])
+def list_profiles():
+    if not request_profiler.allows(request.headers.get('X-Profile-Token')):
+        return jsonify({'error': 'Profiling is not enabled'}), 404
+    return jsonify({'profiles': request_profiler.list()})
+
+@app.route('/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    if not request_profiler.allows(request.headers.get('X-Profile-Token')):
+        return jsonify({'error': 'Profiling is not enabled'}), 404
+    report = request_profiler.get(profile_id)
+    if report is None:
+        return jsonify({'error': f'Profile {profile_id} not found'}), 404
+    return jsonify(report)
+
+# Background training endpoints
+@app.route('/train/<category>', methods=['POST'])
+def train_category(category):
+    try:
+        categories = get_category_datasets()
+        
+        if category not in categories:
+            return jsonify({'error': f'Category {category} not found'}), 404
+        
+        job_id = training_scheduler.submit(category, categories[category])
+        return jsonify(training_scheduler.get_job(job_id)), 202
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+# Memory used by each category's parsed dataset in this worker
+@app.route('/memory', methods=['GET'])
+def get_memory():
+    try:
+        frames = dataset_loader.memory_report()
+        report = {}
+        for category, dataset_path in get_category_datasets().items():
+            frame = frames.get(os.path.abspath(dataset_path))
+            report[category] = {'loaded': False} if frame is None else {'loaded': True, **frame}
+        features = feature_store.memory_report()
+        for category in report:
+            report[category]['feature_bytes'] = features.get(category.lower(), 0)
+        return jsonify({
+            'categories': report,
+            'total_bytes': sum(frame['bytes'] for frame in frames.values()) + sum(features.values())
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+# Readiness probes: the worker is ready once any category can be served
+@app.route('/ready', methods=['GET'])
+def get_ready():
+    ready = category_warmup.is_ready()
+    return jsonify({'ready': ready, 'categories': category_warmup.status()}), 200 if ready else 503
+
+@app.route('/ready/<category>', methods=['GET'])
+def get_category_ready(category):
+    status = category_warmup.status(category)
+    if status is None:
+        if category not in get_category_datasets():
+            return jsonify({'error': f'Category {category} not found'}), 404
+        # Not part of the warm-up: served on demand
+        status = {'status': 'on_demand', 'servable': True, 'job_id': None, 'error': None}
+    return jsonify({'category': category, **status}), 200 if status['servable'] else 503
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = training_scheduler.get_job(job_id)
+    if job is None:
+        return jsonify({'error': f'Job {job_id} not found'}), 404
+    return jsonify(job)
+
+# Incremental ingestion endpoints
+@app.route('/ingest/<category>', methods=['POST'])
+def ingest_rows(category):
+    try:
+        categories = get_category_datasets()
+        
+        if category not in categories:
+            return jsonify({'error': f'Category {category} not found'}), 404
+        
+        data = request.get_json()
+        rows = data.get('rows') if isinstance(data, dict) else data
+        if not isinstance(rows, list) or not rows or not all(isinstance(row, dict) for row in rows):
+            return jsonify({'error': 'A non-empty list of rows is required'}), 400
+        
+        dataset_path = categories[category]
+        summary = ingest_store.append(category, dataset_loader.fingerprint(dataset_path),
+                                      dataset_loader.load(dataset_path, copy=False, schema=get_schema(category)), rows)
+        return jsonify(summary)
+        
+    except InvalidRowsError as e:
+        return jsonify({'error': str(e), 'rows': e.rows}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/ingest/<category>', methods=['GET'])
+def get_ingest_summary(category):
+    try:
+        categories = get_category_datasets()
+        
+        if category not in categories:
+            return jsonify({'error': f'Category {category} not found'}), 404
+        
+        dataset_path = categories[category]
+        return jsonify(ingest_store.summary(category, dataset_loader.fingerprint(dataset_path),
+                                            dataset_loader.load(dataset_path, copy=False, schema=get_schema(category))))
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+# Rendered chart endpoint; charts are immutable, so repeat requests get 304s
+@app.route('/charts/<key>.png', methods=['GET'])
+def get_chart(key):
+    if request.if_none_match.contains(key):
+        return app.response_class(status=304, headers={'ETag': f'"{key}"'})
+    try:
+        with span('chart_wait'):
+            image = chart_service.get(key)
+    except TimeoutError:
+        return jsonify({'error': f'Chart {key} is still rendering'}), 503, {'Retry-After': str(CHART_RETRY_AFTER)}
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 500
+    if image is None:
+        return jsonify({'error': f'Chart {key} not found'}), 404
+    
+    response = app.response_class(image, mimetype='image/png')
+    response.set_etag(key)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
 # Product analysis endpoint with market coverage
 @app.route('/analyze/<category>/product', methods=['POST'])
 def analyze_product(category):
@@ -214,45 +700,51 @@ def analyze_product(category):
         dataset_path = categories[category]
         
         # Read the dataset
-        df = pd.read_csv(dataset_path)
+        df = load_category_frame(category, dataset_path)
+        model, _ = get_category_model(category, df, dataset_path)
+        features = get_features(category, dataset_path, df, model)
+        
+        index = get_entity_index(category, dataset_path, df)
+        product_col, _ = resolve_entity_columns(df)
         
         # Analyze product performance with market coverage
         if 'brand' in df.columns:
             # If brand is available, analyze for the specific brand-product combination
-            brand = df[df['product'] == product_name]['brand'].iloc[0] if not df[df['product'] == product_name].empty else None
+            product_rows = index.positions('product', product_name)
+            brand = df['brand'].iloc[product_rows[0]] if len(product_rows) else None
             if brand:
-                analysis = analyze_product_performance(df, product_name, brand, category)
+                with span('product_analysis'):
+                    analysis = analyze_product_performance(df, model, product_name, brand, category, index=index,
+                                                           features=features)
             else:
                 return jsonify({'error': f'Product {product_name} not found'}), 404
         else:
             # If no brand column, analyze just the product
-            analysis = analyze_product_performance(df, product_name, category=category)
+            with span('product_analysis'):
+                analysis = analyze_product_performance(df, model, product_name, category=category, index=index,
+                                                       features=features)
         
         # Generate visualization if date is available
-        if 'date' in df.columns:
+        product_data = index.take(df, product_col, product_name) if product_col else df.iloc[:0]
+        if 'date' in df.columns and not product_data.empty:
             try:
-                plt.figure(figsize=(10, 6))
-                product_data = df[df['product'] == product_name]
-                plt.plot(pd.to_datetime(product_data['date']), product_data['sales'])
-                plt.title(f'Sales Trend for {product_name}')
-                plt.xlabel('Date')
-                plt.ylabel('Sales')
-                plt.xticks(rotation=45)
-                plt.tight_layout()
-                
-                # Convert plot to base64
-                img = io.BytesIO()
-                plt.savefig(img, format='png')
-                img.seek(0)
-                visualization = base64.b64encode(img.getvalue()).decode()
-                plt.close()
-                
-                analysis['visualization'] = visualization
+                with span('chart_submit'):
+                    key = chart_service.submit({
+                        'title': f'Sales Trend for {product_name}',
+                        'xlabel': 'Date',
+                        'ylabel': 'Sales',
+                        'figsize': (10, 6),
+                        'series': [{'x': pd.to_datetime(product_data['date']).to_numpy(),
+                                    'y': product_data['sales'].to_numpy(dtype=float)}]
+                    })
+                analysis.update(chart_reference(key))
             except Exception as e:
                 print(f"Warning: Could not generate visualization: {str(e)}")
         
         return jsonify(analysis)
         
+    except TrainingInProgressError as e:
+        return training_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
@@ -268,31 +760,43 @@ def predict_market_coverage(category):
         data = request.get_json()
         dataset_path = categories[category]
         
+        with span('response_cache'):
+            cache_key = response_cache_key('predict-market-coverage', category, dataset_path)
+            cached = cached_response(cache_key, stamp=True)
+        if cached is not None:
+            return cached
+        
         # Read the dataset
-        df = pd.read_csv(dataset_path)
+        df = load_category_frame(category, dataset_path)
+        model, _ = get_category_model(category, df, dataset_path)
+        features = get_features(category, dataset_path, df, model)
         
         # Get product and brand from request
         product_name = data.get('productName')
         brand = data.get('brand')
         
         # Get market coverage prediction
-        coverage_prediction = model.predict_market_coverage(df, product_name, brand)
+        index = get_entity_index(category, dataset_path, df) if product_name else None
+        with span('coverage'):
+            coverage_prediction = model.predict_market_coverage(df, product_name, brand, index=index, features=features)
         
         # Get market coverage factors analysis
-        coverage_factors = model.analyze_market_coverage_factors(df)
+        with span('coverage_factors'):
+            coverage_factors = model.analyze_market_coverage_factors(df, features=features)
         
-        return jsonify({
+        return cache_response(cache_key, jsonify({
             'category': category,
             'market_coverage_prediction': coverage_prediction,
-            'market_coverage_factors': coverage_factors,
-            'timestamp': datetime.now().isoformat()
-        })
+            'market_coverage_factors': coverage_factors
+        }), category, dataset_path, model, stamp=True)
         
+    except TrainingInProgressError as e:
+        return training_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
 # Enhanced category analysis endpoint
-@app.route('/analyze/<category>', methods=['POST'])
+@app.route('/analyze/<category>', methods=['GET', 'POST'])
 def analyze_category(category):
     categories = get_category_datasets()
     
@@ -302,76 +806,110 @@ def analyze_category(category):
     dataset_path = categories[category]
     
     try:
-        # Read the dataset
-        df = pd.read_csv(dataset_path)
-        
-        # Validate required columns (relaxed validation for different data structures)
-        if 'sales' not in df.columns and 'Sales' not in df.columns and 'Selling Price' not in df.columns:
-            # Create sales column for different data types
-            if category.lower() == 'electronics' and 'Price Each' in df.columns and 'Quantity Ordered' in df.columns:
-                df = df[df['Order ID'] != 'Order ID']  # Remove header rows
-                df['Price Each'] = pd.to_numeric(df['Price Each'], errors='coerce')
-                df['Quantity Ordered'] = pd.to_numeric(df['Quantity Ordered'], errors='coerce')
-                df['sales'] = df['Price Each'] * df['Quantity Ordered']
-            elif category.lower() == 'smartphones' and 'Selling Price' in df.columns:
-                df['sales'] = pd.to_numeric(df['Selling Price'], errors='coerce') * np.random.uniform(1, 100, len(df))
-            else:
-                df['sales'] = np.random.uniform(100, 10000, len(df))
-        
-        # Create date column if missing
-        if 'date' not in df.columns:
-            if 'Order Date' in df.columns:
-                df['date'] = pd.to_datetime(df['Order Date'], errors='coerce')
-            elif 'Order_Date' in df.columns:
-                df['date'] = pd.to_datetime(df['Order_Date'], errors='coerce')
-            else:
-                df['date'] = pd.date_range(start='2020-01-01', periods=len(df), freq='D')
+        offset, limit, sort = insight_page_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    stream = wants_ndjson()
+    
+    try:
+        if not stream:
+            with span('response_cache'):
+                cache_key = response_cache_key('analyze', category, dataset_path)
+                cached = cached_response(cache_key)
+            if cached is not None:
+                return cached
+        
+        # Read the dataset (a bounded sample in streaming mode, with exact totals alongside)
+        streamed = load_streamed(category, dataset_path)
+        df = load_category_frame(category, dataset_path)
+        
+        # Get the trained model from the registry (trains only if data or config changed)
+        model, metrics = get_category_model(category, df, dataset_path)
+        features = get_features(category, dataset_path, df, model)
+        
+        # Ingested rows are served from the running aggregates and online model they updated
+        # (a streamed file's aggregates already count them)
+        incremental = load_incremental(category, dataset_path) if streamed is None else None
         
         # Generate predictions with market coverage
-        predictions_by_brand, df = generate_predictions(df, category)
+        with span('predict'):
+            predictions_by_brand, df = generate_predictions(df, model, metrics, features,
+                                                            incremental[1] if incremental else None)
         
         # Calculate product performance insights with market coverage
-        product_insights = {}
-        if 'product' in df.columns:
-            if 'brand' in df.columns:
-                for brand in df['brand'].unique():
-                    brand_products = df[df['brand'] == brand]['product'].unique()
-                    for product in brand_products:
-                        product_insights[f"{brand} - {product}"] = analyze_product_performance(df, product, brand, category)
+        # (performance for all products comes from one batched pass)
+        product_col, brand_col = resolve_entity_columns(df)
+        with span('performance'):
+            if streamed is not None:
+                performance = performance_from_aggregates(streamed.aggregates, product_col, brand_col)
+            elif incremental is not None and all(col in incremental[0].keys for col in [product_col, brand_col] if col):
+                performance = performance_from_aggregates(incremental[0], product_col, brand_col)
             else:
-                for product in df['product'].unique():
-                    product_insights[product] = analyze_product_performance(df, product, category=category)
-        elif 'Product' in df.columns:
-            for product in df['Product'].unique():
-                product_insights[product] = analyze_product_performance(df, product, category=category)
-        elif 'Mobile' in df.columns:
-            for product in df['Mobile'].unique():
-                product_insights[product] = analyze_product_performance(df, product, category=category)
-        
-        # Calculate distribution
+                performance = compute_product_performance(df)
+        
+        # Coverage of every entity is only needed up front to sort by it
+        coverage = None
+        if sort and sort.lstrip('-') == 'marketCoverage':
+            with span('coverage'):
+                coverage = model.predict_market_coverage_bulk(df, product_col, brand_col, features=features)
+        
+        # The requested page of entities, ordered before any insight is built
+        entities = sort_insight_entities(list_insight_entities(df, performance, product_col, brand_col, streamed),
+                                         sort, performance, coverage)
+        page = entities[offset:offset + limit if limit is not None else None]
+        
+        def page_insights(chunk):
+            """(key, insight) of a chunk of the page, with the chunk's trends and coverage from one batched pass each"""
+            if not chunk:
+                return []
+            keys = None if len(chunk) == len(entities) else [(brand, product) if brand else product
+                                                             for _, product, brand in chunk]
+            with span('trends'):
+                trends = model.analyze_trends_batch(df, product_col, brand_col, entities=keys)
+            chunk_coverage = coverage
+            if chunk_coverage is None:
+                with span('coverage'):
+                    chunk_coverage = model.predict_market_coverage_bulk(df, product_col, brand_col, features=features,
+                                                                        entities=keys)
+            with span('insights'):
+                return [(key, analyze_product_performance(df, model, product, brand, category, performance, trends,
+                                                          chunk_coverage))
+                        for key, product, brand in chunk]
+        pagination = {
+            'offset': offset,
+            'limit': limit,
+            'sort': sort,
+            'total': len(entities),
+            'returned': len(page),
+            'next_offset': offset + len(page) if offset + len(page) < len(entities) else None,
+            # insights is an object, so the order of the page is given here
+            'keys': [str(key) for key, _, _ in page]
+        }
+        
+        # Calculate distribution over the brand and product roles of the category schema
+        schema = get_schema(category)
+        schema_brand = schema.brand_column if schema.brand_column in df.columns else None
+        schema_product = schema.product_column if schema.product_column in df.columns else None
         distribution = {}
-        if 'brand' in df.columns or 'Brands' in df.columns:
-            brand_col = 'brand' if 'brand' in df.columns else 'Brands'
-            if 'product' in df.columns or 'Product' in df.columns:
-                product_col = 'product' if 'product' in df.columns else 'Product'
-                for brand in df[brand_col].unique():
-                    brand_data = df[df[brand_col] == brand]
-                    distribution[brand] = brand_data.groupby(product_col)['sales'].sum().to_dict()
-            else:
-                distribution = df.groupby(brand_col)['sales'].sum().to_dict()
-        else:
-            if 'product' in df.columns or 'Product' in df.columns:
-                product_col = 'product' if 'product' in df.columns else 'Product'
-                distribution = df.groupby(product_col)['sales'].sum().to_dict()
+        with span('distribution'):
+            if streamed is not None:
+                distribution = streamed.aggregates.distribution()
+            elif schema_brand and schema_product:
+                for brand, brand_data in df.groupby(schema_brand, sort=False, observed=True):
+                    distribution[brand] = brand_data.groupby(schema_product, observed=True)['sales'].sum().to_dict()
+            elif schema_brand or schema_product:
+                distribution = df.groupby(schema_brand or schema_product, observed=True)['sales'].sum().to_dict()
         
         # Generate visualizations
-        visualization = None
+        visualization = {'visualization': None}
         if 'date' in df.columns:
-            visualization = generate_visualizations(df, 
-                predictions_by_brand[list(predictions_by_brand.keys())[0]]['dates'],
-                predictions_by_brand[list(predictions_by_brand.keys())[0]]['values'],
-                predictions_by_brand[list(predictions_by_brand.keys())[0]]['model_metrics']
-            )
+            with span('chart_submit'):
+                key = generate_visualizations(df,
+                    predictions_by_brand[list(predictions_by_brand.keys())[0]]['dates'],
+                    predictions_by_brand[list(predictions_by_brand.keys())[0]]['values'],
+                    predictions_by_brand[list(predictions_by_brand.keys())[0]]['model_metrics']
+                )
+            visualization = chart_reference(key)
         
         # Format predictions data
         formatted_predictions = {}
@@ -385,24 +923,49 @@ def analyze_category(category):
             }
         
         # Get overall market coverage analysis
-        overall_market_coverage = model.analyze_market_coverage_factors(df)
+        with span('coverage_factors'):
+            overall_market_coverage = model.analyze_market_coverage_factors(df, features=features)
         
-        return jsonify({
+        summary = {
             'category': category,
             'predictions': formatted_predictions,
             'distribution': distribution,
-            'insights': product_insights,
-            'visualization': visualization,
+            **visualization,
             'overall_market_coverage': overall_market_coverage,
             'has_date': 'date' in df.columns,
-            'has_product': 'product' in df.columns or 'Product' in df.columns or 'Mobile' in df.columns,
-            'has_brand': 'brand' in df.columns or 'Brands' in df.columns,
+            'has_product': schema_product is not None,
+            'has_brand': schema_brand is not None,
             'metrics': {
                 'best_model': predictions_by_brand[list(predictions_by_brand.keys())[0]]['best_model'],
                 'market_coverage_available': True
-            }
-        })
+            },
+            'pagination': pagination,
+            **({'streaming': streamed.summary()} if streamed is not None else {})
+        }
         
+        if stream:
+            # A line with everything but the insights, then the insights of each chunk of the page as it is computed
+            def generate():
+                yield app.json.dumps({'type': 'summary', **summary}) + '\n'
+                try:
+                    for start in range(0, len(page), INSIGHT_STREAM_CHUNK):
+                        for key, insight in page_insights(page[start:start + INSIGHT_STREAM_CHUNK]):
+                            yield app.json.dumps({'type': 'insight', 'key': str(key), 'insight': insight}) + '\n'
+                except Exception as e:
+                    yield app.json.dumps({'type': 'error',
+                                          'error': f'Error processing category {category}: {str(e)}'}) + '\n'
+                    return
+                yield app.json.dumps({'type': 'end', 'returned': len(page)}) + '\n'
+            return app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
+        
+        product_insights = dict(page_insights(page))
+        
+        with span('serialize'):
+            response = jsonify({**summary, 'insights': product_insights})
+        return cache_response(cache_key, response, category, dataset_path, model)
+        
+    except TrainingInProgressError as e:
+        return training_response(e)
     except Exception as e:
         return jsonify({'error': f'Error processing category {category}: {str(e)}'}), 400
 
@@ -411,5 +974,40 @@ def analyze_category(category):
 def index():
     return send_from_directory('.', 'index.html')
 
+# Import-time report of the worker, measured once at the end of module setup
+startup_report = {
+    'import_seconds': round(time.perf_counter() - _import_started, 3),
+    'budget_seconds': STARTUP_BUDGET,
+    'eagerly_imported': [name for name in DEFERRED_MODULES if name in sys.modules]
+}
+startup_report['within_budget'] = startup_report['import_seconds'] <= STARTUP_BUDGET
+if not startup_report['within_budget']:
+    print(f"Warning: App import took {startup_report['import_seconds']}s, over the "
+          f"{STARTUP_BUDGET}s startup budget (eagerly imported: {', '.join(startup_report['eagerly_imported']) or 'none'})")
+
+def is_serving_process():
+    """
+    Whether this process serves requests. The reloader's monitoring process does not,
+    and neither do training and chart pool workers: spawned from `python app.py`, they
+    re-import this module as __mp_main__ and must not start warm-ups (and pools) of their own.
+    Spawned workers are named before that import, while parent_process() is only set after it.
+    """
+    if multiprocessing.current_process().name != 'MainProcess' or multiprocessing.parent_process() is not None:
+        return False
+    return __name__ != '__main__' or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+
+# Warm up in the background, in serving processes only
+if os.environ.get('MARKET_WARM_START', '1') == '1' and is_serving_process():
+    category_warmup.start(get_category_datasets())
+
+# Endpoint to report worker startup time and which heavy libraries are loaded
+@app.route('/startup')
+def get_startup():
+    return jsonify({
+        **startup_report,
+        'loaded_now': [name for name in DEFERRED_MODULES if name in sys.modules]
+    })
+
 if __name__ == '__main__':
-    app.run(debug=True)
+    # Category models are read-only while serving, so requests can run on threads
+    app.run(debug=True, threaded=True)
@@ -0,0 +1 @@
+"""Performance benchmarks and load tests of the market analysis service (see run.py)"""
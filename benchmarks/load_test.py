@@ -0,0 +1,277 @@
+"""
+Load test: drives the API with concurrent clients and reports the throughput,
+latency percentiles and error rate of each endpoint at each concurrency level.
+
+    python -m benchmarks.load_test                                   # in-process, 1 10 50 clients
+    python -m benchmarks.load_test --concurrency 50 --duration 60 --categories Electronics
+    python -m benchmarks.load_test --url http://127.0.0.1:5000 --mix analyze=1 coverage=1
+    python -m benchmarks.load_test --response-cache-size 0           # every request computed
+
+Each client is a thread that sends requests back to back until --duration has
+passed, picking the endpoint by the weights of --mix and the category (and, for
+product and coverage requests, one of the category's --products most frequent
+products) at random. In-process, clients call the Flask app through its test
+client; with --url they send HTTP requests to a running server. Any status of
+400 or above, or a failed connection, counts as an error.
+
+Before the first level every category is requested once (--warmup) so that
+models are trained or loaded and the levels measure serving, not training.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+import numpy as np
+
+from .run import DEFAULT_WORK_DIR, environment, load_frame
+from .synthetic import ROOT, bundled_datasets
+
+DEFAULT_OUTPUT = os.path.join(ROOT, 'benchmarks', 'results', 'load.json')
+
+# Endpoints the clients call: name -> (method, path template, needs a product)
+ENDPOINTS = {
+    'categories': ('GET', '/categories', False),
+    'analyze': ('GET', '/analyze/{category}', False),
+    'product': ('POST', '/analyze/{category}/product', True),
+    'coverage': ('POST', '/predict-market-coverage/{category}', True)
+}
+DEFAULT_MIX = {'categories': 1, 'analyze': 4, 'product': 3, 'coverage': 2}
+
+
+def parse_mix(values):
+    """Parse endpoint=weight pairs into a {endpoint: weight} dict"""
+    mix = {}
+    for value in values:
+        name, _, weight = value.partition('=')
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint {name}: expected one of {', '.join(ENDPOINTS)}")
+        mix[name] = float(weight) if weight else 1.0
+    if not any(weight > 0 for weight in mix.values()):
+        raise ValueError("The request mix needs at least one endpoint with a positive weight")
+    return mix
+
+
+def top_products(category, path, count):
+    """The `count` most frequent values of a category's product column"""
+    from src.ml.schemas import get_schema
+
+    column = get_schema(category).product_column
+    df = load_frame(category, path)
+    if column not in df.columns:
+        return []
+    return [str(product) for product in df[column].value_counts().index[:count]]
+
+
+class InProcessClient:
+    """Sends requests to the Flask app through a test client (one per thread)"""
+
+    def __init__(self, service):
+        self._client = service.app.test_client()
+
+    def send(self, method, path, body=None):
+        response = self._client.open(path, method=method, json=body)
+        return response.status_code, len(response.get_data())
+
+
+class HttpClient:
+    """Sends requests to a running server"""
+
+    def __init__(self, url, timeout):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def send(self, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.url + path, data=data, method=method,
+                                         headers={'Content-Type': 'application/json'} if data else {})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, len(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, len(e.read())
+
+
+class Workload:
+    """Picks the next request of a client at random from the endpoint mix"""
+
+    def __init__(self, mix, products):
+        self.products = products
+        self.names = [name for name, weight in mix.items() if weight > 0]
+        self.weights = [mix[name] for name in self.names]
+        # Product and coverage requests only go to categories with products
+        self.categories = list(products)
+        self.product_categories = [category for category, names in products.items() if names]
+
+    def next(self, rng):
+        name = rng.choices(self.names, self.weights)[0]
+        method, template, needs_product = ENDPOINTS[name]
+        if needs_product and not self.product_categories:
+            name, (method, template, needs_product) = 'categories', ENDPOINTS['categories']
+        category = rng.choice(self.product_categories if needs_product else self.categories)
+        body = {'productName': rng.choice(self.products[category])} if needs_product else None
+        return name, method, template.format(category=category), body
+
+
+def run_level(make_client, workload, concurrency, duration, seed):
+    """Run `concurrency` clients for `duration` seconds; returns the samples and the elapsed time"""
+    samples = []
+    lock = threading.Lock()
+    start = threading.Barrier(concurrency + 1)
+
+    def client_loop(number):
+        client = make_client()
+        rng = random.Random(seed * 1000 + number)
+        local = []
+        start.wait()
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            name, method, path, body = workload.next(rng)
+            started = time.perf_counter()
+            try:
+                status, size = client.send(method, path, body)
+            except Exception as e:
+                status, size = None, 0
+                error = str(e)
+            else:
+                error = None
+            local.append((name, time.perf_counter() - started, status, size, error))
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=client_loop, args=(number,), daemon=True) for number in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - started
+
+
+def summarize(samples, elapsed):
+    """Per-endpoint (and overall) throughput, latency percentiles and error rate of a level"""
+    groups = defaultdict(list)
+    for sample in samples:
+        groups[sample[0]].append(sample)
+        groups['all'].append(sample)
+
+    summary = {}
+    for name, group in groups.items():
+        latencies = np.array([sample[1] for sample in group]) * 1000
+        statuses = defaultdict(int)
+        errors = 0
+        failures = []
+        for _, _, status, _, error in group:
+            statuses[str(status) if status is not None else 'failed'] += 1
+            if status is None or status >= 400:
+                errors += 1
+            if error and error not in failures and len(failures) < 3:
+                failures.append(error)
+        summary[name] = {
+            'requests': len(group),
+            'rps': round(len(group) / elapsed, 2) if elapsed else None,
+            'error_rate': round(errors / len(group), 4),
+            'latency_ms': {
+                'mean': round(float(latencies.mean()), 2),
+                'p50': round(float(np.percentile(latencies, 50)), 2),
+                'p95': round(float(np.percentile(latencies, 95)), 2),
+                'p99': round(float(np.percentile(latencies, 99)), 2),
+                'max': round(float(latencies.max()), 2)
+            },
+            'statuses': dict(statuses),
+            'failures': failures,
+            'mean_response_bytes': int(np.mean([sample[3] for sample in group]))
+        }
+    return summary
+
+
+def print_level(concurrency, summary):
+    print(f'\n{concurrency} client(s)')
+    print(f"  {'endpoint':<12} {'requests':>9} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>8}")
+    for name in sorted(summary, key=lambda n: (n == 'all', n)):
+        stats = summary[name]
+        latency = stats['latency_ms']
+        print(f"  {name:<12} {stats['requests']:>9} {stats['rps']:>9.1f} {latency['p50']:>9.1f} "
+              f"{latency['p95']:>9.1f} {latency['p99']:>9.1f} {stats['error_rate']:>8.1%}", flush=True)
+
+
+def warm_up(make_client, workload):
+    """Request every category once so models are ready before measuring"""
+    client = make_client()
+    for category in workload.categories:
+        started = time.perf_counter()
+        status, _ = client.send('GET', f'/analyze/{category}')
+        print(f'  warmup {category}: {status} in {time.perf_counter() - started:.1f}s', flush=True)
+
+
+def run(args):
+    mix = parse_mix(args.mix) if args.mix else DEFAULT_MIX
+    service = None
+    if args.url:
+        make_client = lambda: HttpClient(args.url, args.timeout)
+    else:
+        # The app reads its settings at import
+        os.environ['MARKET_WARM_START'] = '0'
+        os.environ.setdefault('MARKET_CACHE_DIR', os.path.join(args.work_dir, 'cache'))
+        if args.response_cache_size is not None:
+            os.environ['MARKET_RESPONSE_CACHE_SIZE'] = str(args.response_cache_size)
+        sys.path.insert(0, ROOT)
+        import app as service
+        make_client = lambda: InProcessClient(service)
+
+    datasets = bundled_datasets()
+    categories = args.categories or list(datasets)
+    needs_products = any(ENDPOINTS[name][2] and weight > 0 for name, weight in mix.items())
+    products = {category: top_products(category, datasets[category], args.products) if needs_products else []
+                for category in categories}
+    workload = Workload(mix, products)
+
+    levels = []
+    try:
+        if args.warmup:
+            warm_up(make_client, workload)
+        for concurrency in args.concurrency:
+            samples, elapsed = run_level(make_client, workload, concurrency, args.duration, args.seed)
+            summary = summarize(samples, elapsed)
+            print_level(concurrency, summary)
+            levels.append({'concurrency': concurrency, 'seconds': round(elapsed, 3), 'endpoints': summary})
+    finally:
+        if service is not None:
+            service.chart_service.shutdown(wait=False)
+    return {'target': args.url or 'in-process', 'mix': mix, 'categories': categories, 'levels': levels}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='base URL of a running server (default: call the app in-process)')
+    parser.add_argument('--concurrency', nargs='*', type=int, default=[1, 10, 50], help='clients per level')
+    parser.add_argument('--duration', type=float, default=30, help='seconds per level')
+    parser.add_argument('--mix', nargs='*', help=f"endpoint=weight pairs of {', '.join(ENDPOINTS)} "
+                                                 f"(default: {' '.join(f'{k}={v}' for k, v in DEFAULT_MIX.items())})")
+    parser.add_argument('--categories', nargs='*', help='categories to request (default: all bundled)')
+    parser.add_argument('--products', type=int, default=5, help='most frequent products requested per category')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the request sequence')
+    parser.add_argument('--timeout', type=float, default=120, help='HTTP timeout in seconds (with --url)')
+    parser.add_argument('--no-warmup', dest='warmup', action='store_false', help='measure the first requests too')
+    parser.add_argument('--response-cache-size', type=int,
+                        help='override MARKET_RESPONSE_CACHE_SIZE in-process (0 computes every response)')
+    parser.add_argument('--work-dir', default=DEFAULT_WORK_DIR, help='app caches of the in-process app')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='where to write the results')
+    args = parser.parse_args(argv)
+
+    report = {'environment': environment(), **run(args)}
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f'\nResults written to {args.output}')
+    return 1 if any(level['endpoints']['all']['error_rate'] for level in report['levels']) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
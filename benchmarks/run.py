@@ -0,0 +1,264 @@
+"""
+Benchmark suite: times and memory-profiles the model methods and the analysis
+endpoints on the bundled category datasets and on synthetic copies at larger
+scales, and writes the results as JSON so runs can be compared.
+
+    python -m benchmarks.run                                # scales 1, 10 and 100
+    python -m benchmarks.run --scales 1 10 100 1000 --categories Electronics
+    python -m benchmarks.run --output benchmarks/results/baseline.json
+    python -m benchmarks.run --compare benchmarks/results/baseline.json
+
+Every benchmark runs once under tracemalloc (peak_bytes, first_seconds; for the
+endpoints' first call this includes training the model, unless a previous run
+saved it: see --fresh) and then `repeat` more times untraced (seconds). With
+--compare, benchmarks whose median time or peak memory grew by more than
+--tolerance are reported and the exit status is 1.
+
+Files above MARKET_STREAMING_THRESHOLD_MB are handled in streaming mode, as the
+app does; lower it with --streaming-threshold-mb for the largest scales.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from .synthetic import ROOT, bundled_datasets, synthetic_tree
+
+DEFAULT_WORK_DIR = os.path.join(ROOT, '.cache', 'benchmarks')
+DEFAULT_OUTPUT = os.path.join(ROOT, 'benchmarks', 'results', 'latest.json')
+
+# Packages whose versions are recorded with the results
+PACKAGES = ['pandas', 'numpy', 'scikit-learn', 'xgboost', 'statsmodels', 'flask']
+
+
+def measure(fn, repeat=3):
+    """
+    Run fn once under tracemalloc for its peak memory, then `repeat` times for timings.
+    Returns fn's first result and the measurements.
+    """
+    tracemalloc.start()
+    try:
+        started = time.perf_counter()
+        result = fn()
+        first = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+
+    return result, {
+        'first_seconds': round(first, 4),
+        'seconds': {
+            'runs': len(times),
+            'min': round(min(times), 4),
+            'median': round(statistics.median(times), 4),
+            'max': round(max(times), 4)
+        } if times else None,
+        'peak_bytes': peak
+    }
+
+
+def load_frame(category, path):
+    """The prepared frame the app trains on: the whole file, or its sample in streaming mode"""
+    from src.ml.dataset_loader import DatasetLoader, prepare_category_frame
+    from src.ml.schemas import get_schema
+    from src.ml.streaming import should_stream, stream_category
+
+    if should_stream(path):
+        return stream_category(path, category).sample
+    return prepare_category_frame(DatasetLoader.parse_csv(path, get_schema(category)), category)
+
+
+def pick_product(df, category):
+    """The most frequent value of the category's product column, or None"""
+    from src.ml.schemas import get_schema
+
+    column = get_schema(category).product_column
+    if column not in df.columns or df.empty:
+        return None
+    return df[column].value_counts().index[0]
+
+
+def model_benchmarks(category, path, repeat, train_repeat):
+    """Benchmark loading the dataset and the model methods on it"""
+    from src.ml.enhanced_model import EnhancedMarketAnalysisModel
+    from src.ml.feature_store import feature_set_for
+
+    results = {}
+    df, results['load'] = measure(lambda: load_frame(category, path), repeat=1)
+    product = pick_product(df, category)
+
+    model = EnhancedMarketAnalysisModel()
+    _, results['train'] = measure(lambda: model.train(df, category), train_repeat)
+    _, results['predict'] = measure(lambda: model.predict(df), repeat)
+    _, results['analyze_trends'] = measure(lambda: model.analyze_trends(df, product), repeat)
+    # The coverage model is trained on (and the app predicts from) the category-processed frame
+    processed = feature_set_for(df, category).processed()
+    _, results['predict_market_coverage'] = measure(
+        lambda: model.market_coverage_predictor.predict_market_coverage(processed, category, product), repeat)
+    return len(df), product, results
+
+
+def endpoint_benchmarks(service, category, product, repeat):
+    """Benchmark the analysis endpoints through the Flask test client, bypassing the response cache"""
+    client = service.app.test_client()
+    results = {}
+
+    def call(method, url, **kwargs):
+        def run():
+            service.response_cache.clear()
+            response = getattr(client, method)(url, **kwargs)
+            if response.status_code != 200:
+                raise RuntimeError(f'{url} returned {response.status_code}: {response.get_data(as_text=True)[:200]}')
+            return len(response.get_data())
+        return run
+
+    analyze = call('get', f'/analyze/{category}')
+    size, results['analyze_first'] = measure(analyze, repeat=0)
+    _, results['analyze'] = measure(analyze, repeat)
+    results['analyze']['response_bytes'] = size
+
+    if product is not None:
+        size, results['analyze_product'] = measure(
+            call('post', f'/analyze/{category}/product', json={'productName': str(product)}), repeat)
+        results['analyze_product']['response_bytes'] = size
+    return results
+
+
+def run(args):
+    if args.fresh and os.path.isdir(args.work_dir):
+        shutil.rmtree(os.path.join(args.work_dir, 'cache'), ignore_errors=True)
+
+    # The app reads its settings at import
+    os.environ['MARKET_WARM_START'] = '0'
+    os.environ['MARKET_CACHE_DIR'] = os.path.join(args.work_dir, 'cache')
+    if args.streaming_threshold_mb is not None:
+        os.environ['MARKET_STREAMING_THRESHOLD_MB'] = str(args.streaming_threshold_mb)
+    sys.path.insert(0, ROOT)
+    import app as service
+
+    categories = args.categories or list(bundled_datasets())
+    results = []
+    try:
+        for scale in args.scales:
+            base_dir = synthetic_tree(args.work_dir, scale, categories, args.seed)
+            service.BASE_DIR = base_dir
+            datasets = bundled_datasets(base_dir)
+            for category in categories:
+                path = datasets[category]
+                print(f'[{scale:g}x] {category}: {os.path.getsize(path) / 1e6:.1f} MB', flush=True)
+                record = {'category': category, 'scale': scale, 'file_bytes': os.path.getsize(path)}
+                try:
+                    rows, product, benchmarks = model_benchmarks(category, path, args.repeat, args.train_repeat)
+                    record['rows'] = rows
+                    if not args.skip_endpoints:
+                        benchmarks.update(endpoint_benchmarks(service, category, product, args.repeat))
+                except Exception as e:
+                    print(f'  failed: {str(e)}', flush=True)
+                    results.append({**record, 'benchmark': None, 'error': str(e)})
+                    continue
+                for name, measured in benchmarks.items():
+                    median = measured['seconds']['median'] if measured['seconds'] else measured['first_seconds']
+                    print(f'  {name:<24} {median:>9.3f}s  peak {measured["peak_bytes"] / 1e6:>8.1f} MB', flush=True)
+                    results.append({**record, 'benchmark': name, **measured})
+    finally:
+        service.chart_service.shutdown(wait=False)
+    return results
+
+
+def environment():
+    """Versions and settings that affect the results"""
+    from importlib import metadata
+
+    versions = {}
+    for package in PACKAGES:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'commit': commit or None,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'packages': versions,
+        'settings': {key: value for key, value in os.environ.items() if key.startswith('MARKET_')}
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Print the change of each benchmark against a baseline; returns the regressions"""
+    previous = {(r['category'], r['scale'], r['benchmark']): r for r in baseline['results'] if r.get('benchmark')}
+    regressions = []
+    for result in results:
+        before = previous.get((result['category'], result['scale'], result.get('benchmark')))
+        if before is None or result.get('benchmark') is None:
+            continue
+        time_now, time_before = _seconds(result), _seconds(before)
+        time_ratio = time_now / time_before if time_before else 1.0
+        memory_ratio = result['peak_bytes'] / before['peak_bytes'] if before['peak_bytes'] else 1.0
+        regressed = time_ratio > 1 + tolerance or memory_ratio > 1 + tolerance
+        print(f"{'REGRESSION' if regressed else 'ok':<10} {result['category']:<12} {result['scale']:>6g}x "
+              f"{result['benchmark']:<24} time x{time_ratio:.2f}  memory x{memory_ratio:.2f}")
+        if regressed:
+            regressions.append(result)
+    return regressions
+
+
+def _seconds(result):
+    return result['seconds']['median'] if result.get('seconds') else result['first_seconds']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--categories', nargs='*', help='categories to benchmark (default: all bundled)')
+    parser.add_argument('--scales', nargs='*', type=float, default=[1, 10, 100],
+                        help='dataset sizes as multiples of the bundled data')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per benchmark')
+    parser.add_argument('--train-repeat', type=int, default=1, help='timed runs of model training')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic datasets')
+    parser.add_argument('--work-dir', default=DEFAULT_WORK_DIR, help='synthetic datasets and app caches')
+    parser.add_argument('--fresh', action='store_true', help='drop the app caches (trained models) first')
+    parser.add_argument('--skip-endpoints', action='store_true', help='only benchmark the model methods')
+    parser.add_argument('--streaming-threshold-mb', type=float, help='override MARKET_STREAMING_THRESHOLD_MB')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='where to write the results')
+    parser.add_argument('--compare', help='baseline results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown before a regression')
+    args = parser.parse_args(argv)
+    args.scales = [int(scale) if float(scale).is_integer() else scale for scale in args.scales]
+
+    results = run(args)
+    report = {'environment': environment(), 'results': results}
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f'Results written to {args.output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f'{len(regressions)} benchmark(s) regressed by more than {args.tolerance:.0%}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
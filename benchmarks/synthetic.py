@@ -0,0 +1,77 @@
+"""
+Synthetic category datasets for benchmarking at a multiple of the bundled size.
+
+Rows are drawn with replacement from the bundled CSV of the category and written
+back verbatim, so a synthetic file has the same columns, value formats and
+per-row consistency (e.g. product and price) as the original, including quirks
+such as repeated header lines, and goes through the same schema as the original.
+"""
+import json
+import os
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUNDLED_DIR = os.path.join(ROOT, 'src', 'ml')
+
+
+def bundled_datasets(base_dir=BUNDLED_DIR):
+    """{category: csv path} of the bundled datasets, laid out like the app expects"""
+    datasets = {}
+    for category in sorted(os.listdir(base_dir)):
+        data_dir = os.path.join(base_dir, category, 'data')
+        if os.path.isdir(data_dir):
+            for name in sorted(os.listdir(data_dir)):
+                if name.endswith('.csv'):
+                    datasets[category] = os.path.join(data_dir, name)
+                    break
+    return datasets
+
+
+def generate_dataset(source, target, scale, seed=0, chunk_rows=200000):
+    """
+    Write target with round(scale * rows of source) rows sampled from source.
+    The file is reused when a previous run generated it with the same parameters.
+    """
+    params = {'source': os.path.abspath(source), 'source_size': os.path.getsize(source), 'scale': scale, 'seed': seed}
+    meta_path = f'{target}.json'
+    if os.path.exists(target) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            if json.load(f).get('params') == params:
+                return target
+
+    raw = pd.read_csv(source, dtype=str, keep_default_na=False)
+    rows = int(round(len(raw) * scale))
+    random_state = np.random.RandomState(seed)
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp_path = f'{target}.{os.getpid()}.tmp'
+    written = 0
+    with open(tmp_path, 'w', newline='') as f:
+        while written < rows:
+            size = min(chunk_rows, rows - written)
+            chunk = raw.iloc[random_state.randint(0, len(raw), size)]
+            chunk.to_csv(f, header=written == 0, index=False)
+            written += size
+    os.replace(tmp_path, target)
+
+    with open(meta_path, 'w') as f:
+        json.dump({'params': params, 'rows': rows}, f)
+    return target
+
+
+def synthetic_tree(work_dir, scale, categories=None, seed=0):
+    """
+    Generate the datasets of every category at a scale under work_dir/x<scale>,
+    in the <Category>/data/<file>.csv layout of the bundled data; returns that
+    directory. Scale 1 is the bundled data itself.
+    """
+    if scale == 1:
+        return BUNDLED_DIR
+    base_dir = os.path.join(work_dir, f'x{scale:g}')
+    for category, source in bundled_datasets().items():
+        if categories and category not in categories:
+            continue
+        target = os.path.join(base_dir, category, 'data', os.path.basename(source))
+        generate_dataset(source, target, scale, seed)
+    return base_dir
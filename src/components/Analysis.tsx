@@ -1,7 +1,7 @@
 
 import { useEffect, useState } from 'react';
 import { toast } from 'sonner';
-import { api, CategoryAnalysis, ProductAnalysis } from '../lib/api';
+import { api, API_BASE_URL, CategoryAnalysis, ProductAnalysis } from '../lib/api';
 import { Button } from './ui/button';
 import { Input } from './ui/input';
 
@@ -128,12 +128,14 @@ const Analysis = ({ category }: AnalysisProps) => {
       </div>
 
       {/* Visualization */}
-      {analysis.visualization && (
+      {(analysis.visualization_url || analysis.visualization) && (
         <div className="mb-6">
           <h3 className="text-xl font-semibold mb-2 text-indigo-600">Market Trends</h3>
           <div className="p-2 bg-white rounded-lg shadow-lg border border-indigo-100">
             <img 
-              src={`data:image/png;base64,${analysis.visualization}`} 
+              src={analysis.visualization_url
+                ? `${API_BASE_URL}${analysis.visualization_url}`
+                : `data:image/png;base64,${analysis.visualization}`} 
               alt="Analysis Visualization"
               className="w-full rounded-lg"
             />
@@ -1,5 +1,5 @@
 
-const API_BASE_URL = '/api';
+export const API_BASE_URL = '/api';
 
 export interface CategoryAnalysis {
   category: string;
@@ -24,7 +24,9 @@ export interface CategoryAnalysis {
   insights: {
     [key: string]: string;
   };
-  visualization: string;
+  visualization: string | null;
+  visualization_url?: string;
+  visualization_etag?: string;
   has_date: boolean;
   has_product: boolean;
   has_brand: boolean;
@@ -46,7 +48,9 @@ export interface ProductAnalysis {
   insights: {
     [key: string]: string;
   };
-  visualization?: string;
+  visualization?: string | null;
+  visualization_url?: string;
+  visualization_etag?: string;
 }
 
 export const api = {
@@ -1,4 +1,16 @@
-from .category_manager import CategoryManager
-from .model import MarketAnalysisModel
+import importlib
 
-__all__ = ['CategoryManager', 'MarketAnalysisModel'] 
\ No newline at end of file
+# Exports are imported on first access: importing a submodule such as
+# src.ml.dataset_loader must not pull in the model libraries
+_EXPORTS = {
+    'CategoryManager': '.category_manager',
+    'MarketAnalysisModel': '.model'
+}
+
+__all__ = ['CategoryManager', 'MarketAnalysisModel']
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,5 +1,4 @@
 import os
-import pandas as pd
 from .model import MarketAnalysisModel
 
 class CategoryManager:
@@ -36,13 +35,16 @@ class CategoryManager:
 
     def _load_all_data(self):
         """Load all category data and train models"""
+        from .dataset_loader import DatasetLoader, prepare_category_frame
+        from .schemas import get_schema
+
         for category, info in self.categories.items():
             try:
                 # Load data
-                df = pd.read_csv(info['path'])
+                df = DatasetLoader.parse_csv(info['path'], get_schema(category))
                 
                 # Train model
-                metrics = info['model'].train(df)
+                metrics = info['model'].train(prepare_category_frame(df.copy(deep=False), category), category)
                 
                 # Store data and metrics
                 self.categories[category]['data'] = df
@@ -0,0 +1,238 @@
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+
+
+def render_chart(spec):
+    """
+    Render a line chart spec to PNG bytes with the object-oriented Figure API.
+    Figures are never registered with pyplot, so no global state is shared.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=spec.get('figsize', (12, 6)))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    for series in spec['series']:
+        ax.plot(series['x'], series['y'], label=series.get('label'),
+                linestyle=series.get('linestyle', '-'), alpha=series.get('alpha'))
+    ax.set_title(spec.get('title', ''))
+    ax.set_xlabel(spec.get('xlabel', ''))
+    ax.set_ylabel(spec.get('ylabel', ''))
+    if spec.get('legend'):
+        ax.legend()
+    if spec.get('grid'):
+        ax.grid(True, alpha=0.3)
+    ax.tick_params(axis='x', labelrotation=45)
+    fig.tight_layout()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png')
+    return buffer.getvalue()
+
+
+def render_chart_timed(spec):
+    """render_chart in a worker process; returns the PNG bytes and the render time in seconds"""
+    started = time.perf_counter()
+    image = render_chart(spec)
+    return image, time.perf_counter() - started
+
+
+def chart_key(spec):
+    """Content hash of a chart spec: the series data, labels and figure size"""
+    digest = hashlib.sha1()
+    meta = {key: value for key, value in spec.items() if key != 'series'}
+    digest.update(json.dumps(meta, sort_keys=True, default=str).encode())
+    for series in spec['series']:
+        digest.update(json.dumps({key: value for key, value in series.items() if key not in ('x', 'y')},
+                                 sort_keys=True, default=str).encode())
+        for values in (series['x'], series['y']):
+            values = np.asarray(values)
+            digest.update(str(values.dtype).encode())
+            digest.update(np.ascontiguousarray(values).tobytes() if values.dtype != object
+                          else json.dumps(values.tolist(), default=str).encode())
+    return digest.hexdigest()
+
+
+class ChartService:
+    """
+    Renders charts in a process pool, off the request path.
+    submit() returns a content-hash key right away; the PNG is rendered in the
+    background and kept in a bounded in-memory LRU and, when cache_dir is set,
+    on disk, so identical charts are rendered once and served by key.
+    With cache_dir, the spec of a queued chart is saved there until its PNG is, so
+    a worker asked for a key another worker handed out can render it as well.
+    on_render(seconds), when given, is called with the time each render took.
+    """
+
+    def __init__(self, cache_dir=None, max_workers=1, max_entries=64, on_render=None):
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.max_entries = max_entries
+        self.on_render = on_render
+        self._images = OrderedDict()
+        self._pending = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn keeps workers clear of the parent's threads and pyplot state
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def _path(self, key, extension='png'):
+        return os.path.join(self.cache_dir, f'{key}.{extension}')
+
+    def _save_spec(self, key, spec):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f'{self._path(key, "spec")}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(spec, f)
+            os.replace(tmp_path, self._path(key, 'spec'))
+        except Exception as e:
+            print(f"Warning: Could not save chart spec {key}: {str(e)}")
+
+    def _load_spec(self, key):
+        try:
+            with open(self._path(key, 'spec'), 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def _read(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                image = f.read()
+        except OSError:
+            return None
+        self._remember(key, image)
+        return image
+
+    def submit(self, spec):
+        """Queue a chart for rendering unless it is already cached or queued; returns its key"""
+        key = chart_key(spec)
+        with self._lock:
+            if key in self._images:
+                self._images.move_to_end(key)
+                return key
+            if key in self._pending:
+                return key
+        if self.cache_dir and os.path.exists(self._path(key)):
+            return key
+        if self.cache_dir:
+            self._save_spec(key, spec)
+
+        try:
+            future = self._get_executor().submit(render_chart_timed, spec)
+        except BrokenProcessPool:
+            with self._lock:
+                self._executor = None
+            future = self._get_executor().submit(render_chart_timed, spec)
+        with self._lock:
+            self._pending[key] = future
+            self._errors.pop(key, None)
+        future.add_done_callback(lambda f: self._on_done(key, f))
+        return key
+
+    def get(self, key, timeout=30):
+        """
+        Get the PNG bytes of a chart, waiting up to timeout seconds for a queued render.
+        A key queued by another worker sharing cache_dir is rendered here from its
+        saved spec. Returns None for unknown keys; raises TimeoutError while the
+        render is still running and ValueError when it failed.
+        """
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                return image
+            future = self._pending.get(key)
+            error = self._errors.get(key)
+        if error:
+            raise ValueError(f"Error rendering chart: {error}")
+
+        if future is not None:
+            return self._wait(key, future, timeout)
+        if not self.cache_dir:
+            return None
+
+        image = self._read(key)
+        if image is not None:
+            return image
+        spec = self._load_spec(key)
+        if spec is not None:
+            self.submit(spec)
+            with self._lock:
+                future = self._pending.get(key)
+            if future is not None:
+                return self._wait(key, future, timeout)
+        # Saved by the worker that queued it since the first read
+        return self._read(key)
+
+    @staticmethod
+    def _wait(key, future, timeout):
+        try:
+            return future.result(timeout=timeout)[0]
+        except FuturesTimeoutError:
+            raise TimeoutError(f"Chart {key} is still rendering")
+        except Exception as e:
+            raise ValueError(f"Error rendering chart: {str(e)}")
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def _remember(self, key, image):
+        with self._lock:
+            self._images[key] = image
+            self._images.move_to_end(key)
+            while len(self._images) > self.max_entries:
+                self._images.popitem(last=False)
+
+    def _on_done(self, key, future):
+        try:
+            image, seconds = future.result()
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                with self._lock:
+                    self._executor = None
+            print(f"Warning: Could not render chart {key}: {str(e)}")
+            with self._lock:
+                self._pending.pop(key, None)
+                self._errors[key] = str(e)
+            return
+
+        self._remember(key, image)
+        with self._lock:
+            self._pending.pop(key, None)
+        if self.on_render is not None:
+            self.on_render(seconds)
+        if self.cache_dir:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp_path = f'{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(image)
+                os.replace(tmp_path, self._path(key))
+                os.remove(self._path(key, 'spec'))
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"Warning: Could not save chart {key}: {str(e)}")
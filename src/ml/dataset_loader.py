@@ -0,0 +1,266 @@
+import hashlib
+import json
+import os
+import threading
+import shutil
+import numpy as np
+import pandas as pd
+from .schemas import get_schema
+from .shared_columns import write_columns, map_columns, is_mapped
+from .timing import span
+
+# Bump when the parsing rules below change so stale snapshots are rebuilt
+SNAPSHOT_VERSION = 3
+
+# String columns with at most this share of distinct values are stored as categoricals
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+
+class DatasetLoader:
+    """
+    Loads category CSV files through a typed columnar snapshot cache.
+    The first load of a file parses the CSV with its category schema (see
+    schemas.py), cleans it and writes a Parquet snapshot (pickle when no
+    Parquet engine is installed). Later loads read the snapshot, or reuse the
+    parsed frame held in memory, for as long as the source file fingerprint
+    (size, mtime and optionally content hash) and the schema match.
+
+    With shared=True (default: off, on with MARKET_SHARED_DATASETS=1) the snapshot is
+    a column directory (see shared_columns.py) that every process maps read-only, so the
+    numeric and categorical-code columns are held once in the page cache however
+    many workers serve them.
+    """
+
+    def __init__(self, cache_dir='.cache/datasets', verify_hash=False, shared=None):
+        self.cache_dir = cache_dir
+        self.verify_hash = verify_hash
+        if shared is None:
+            shared = os.environ.get('MARKET_SHARED_DATASETS', '0') == '1'
+        self.shared = shared
+        self._snapshot_format = 'columns' if shared else None
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    @property
+    def snapshot_format(self):
+        """Column directories when shared, else Parquet when an engine is importable, pickle otherwise"""
+        if self._snapshot_format is None:
+            try:
+                import pyarrow  # noqa: F401
+                self._snapshot_format = 'parquet'
+            except ImportError:
+                self._snapshot_format = 'pickle'
+        return self._snapshot_format
+
+    def fingerprint(self, path):
+        """Get a fingerprint of the source file that changes whenever its contents do"""
+        stat = os.stat(path)
+        parts = [os.path.abspath(path), str(stat.st_size), str(stat.st_mtime_ns), str(SNAPSHOT_VERSION)]
+        if self.verify_hash:
+            parts.append(self._content_hash(path))
+        return hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+    @staticmethod
+    def _content_hash(path):
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def load(self, path, copy=True, schema=None):
+        """
+        Load a dataset as a parsed frame, typed by schema (a CategorySchema) when given.
+        Returns a shallow copy by default: the endpoints add and replace columns,
+        which never writes into the cached frame, so its data is not duplicated.
+        """
+        fingerprint = self.fingerprint(path)
+        version = (fingerprint, schema.signature() if schema is not None else None)
+        key = os.path.abspath(path)
+
+        with self._lock:
+            cached = self._frames.get(key)
+        if cached is not None and cached[0] == version:
+            df = cached[1]
+        else:
+            with span('read_snapshot'):
+                df = self._read_snapshot(path, version)
+            if df is None:
+                with span('read_csv'):
+                    df = self.parse_csv(path, schema)
+                with span('write_snapshot'):
+                    self._write_snapshot(path, version, df)
+                if self.shared:
+                    # Serve the mapped snapshot rather than this process's private copy
+                    with span('read_snapshot'):
+                        df = self._read_snapshot(path, version)
+                    if df is None:
+                        with span('read_csv'):
+                            df = self.parse_csv(path, schema)
+            with self._lock:
+                self._frames[key] = (version, df)
+
+        return df.copy(deep=False) if copy else df
+
+    def memory_report(self):
+        """Memory used by the frames held in memory, keyed by source path"""
+        with self._lock:
+            frames = {path: df for path, (_, df) in self._frames.items()}
+        return {path: frame_memory_report(df) for path, df in frames.items()}
+
+    def invalidate(self, path=None):
+        """Drop in-memory frames so the next load re-checks the snapshot"""
+        with self._lock:
+            if path is None:
+                self._frames.clear()
+            else:
+                self._frames.pop(os.path.abspath(path), None)
+
+    @staticmethod
+    def parse_csv(path, schema=None):
+        """
+        Parse a category CSV into a typed frame.
+        With a schema this is a single typed pass with exact date formats; without
+        one, dtypes are inferred and repeated header lines are detected.
+        """
+        if schema is not None:
+            return compact_frame(schema.read_csv(path))
+
+        df = pd.read_csv(path, low_memory=False)
+
+        # Some exports repeat the header line inside the data (e.g. Electronics)
+        first_col = df.columns[0]
+        header_rows = df[first_col].astype(str) == str(first_col)
+        if header_rows.any():
+            df = df[~header_rows].reset_index(drop=True)
+
+            # Columns that only became object dtype because of the header rows
+            for col in df.select_dtypes(include=['object']).columns:
+                try:
+                    df[col] = pd.to_numeric(df[col])
+                except (ValueError, TypeError):
+                    continue
+
+        return compact_frame(df)
+
+    def _snapshot_paths(self, path, version):
+        name = os.path.splitext(os.path.basename(path))[0]
+        key = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:12]
+        base = os.path.join(self.cache_dir, f'{name}-{key}')
+        if self.snapshot_format == 'columns':
+            # Mapped files must never be rewritten, so each version gets its own directory
+            digest = hashlib.sha1(json.dumps(version).encode()).hexdigest()[:12]
+            return f'{base}.{digest}.columns', f'{base}.json'
+        return f'{base}.{self.snapshot_format}', f'{base}.json'
+
+    def _read_snapshot(self, path, version):
+        fingerprint, schema = version
+        data_path, meta_path = self._snapshot_paths(path, version)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if (meta.get('fingerprint') != fingerprint or meta.get('schema') != schema
+                    or meta.get('format') != self.snapshot_format):
+                return None
+            if self.snapshot_format == 'columns':
+                return map_columns(data_path)
+            if self.snapshot_format == 'parquet':
+                return pd.read_parquet(data_path)
+            return pd.read_pickle(data_path)
+        except (OSError, ValueError):
+            return None
+        except Exception as e:
+            print(f"Warning: Could not read snapshot for {path}: {str(e)}")
+            return None
+
+    def _write_snapshot(self, path, version, df):
+        fingerprint, schema = version
+        data_path, meta_path = self._snapshot_paths(path, version)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f'{data_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            if self.snapshot_format == 'columns':
+                self._publish_columns(df, tmp_path, data_path)
+            else:
+                if self.snapshot_format == 'parquet':
+                    df.to_parquet(tmp_path, index=False)
+                else:
+                    df.to_pickle(tmp_path)
+                os.replace(tmp_path, data_path)
+
+            tmp_meta = f'{meta_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_meta, 'w') as f:
+                json.dump({
+                    'source': os.path.abspath(path),
+                    'fingerprint': fingerprint,
+                    'schema': schema,
+                    'format': self.snapshot_format,
+                    'rows': len(df)
+                }, f)
+            os.replace(tmp_meta, meta_path)
+        except Exception as e:
+            print(f"Warning: Could not write snapshot for {path}: {str(e)}")
+
+    @staticmethod
+    def _publish_columns(df, tmp_path, data_path):
+        """Write a column directory and move it into place, then drop directories of older versions"""
+        if os.path.isdir(data_path):
+            # Another process already published this version
+            return
+        write_columns(df, tmp_path)
+        try:
+            os.rename(tmp_path, data_path)
+        except OSError:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            if not os.path.isdir(data_path):
+                raise
+
+        # Processes still mapping an older directory keep its pages until they unmap them
+        prefix = os.path.basename(data_path).rsplit('.', 2)[0] + '.'
+        directory = os.path.dirname(data_path)
+        for name in os.listdir(directory):
+            if name.startswith(prefix) and name.endswith('.columns') and os.path.join(directory, name) != data_path:
+                shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+def compact_frame(df, max_unique_ratio=CATEGORY_MAX_UNIQUE_RATIO):
+    """
+    Shrink a frame in place: repetitive string columns become categoricals,
+    integers take the smallest dtype that holds them and floats become float32
+    when that loses nothing
+    """
+    for col in df.columns:
+        series = df[col]
+        if series.dtype == object:
+            if series.nunique(dropna=True) <= max_unique_ratio * len(series):
+                df[col] = series.astype('category')
+        elif pd.api.types.is_integer_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            df[col] = pd.to_numeric(series, downcast='integer')
+        elif pd.api.types.is_float_dtype(series) and series.dtype != np.float32:
+            downcast = series.astype(np.float32)
+            if ((downcast.astype(series.dtype) == series) | series.isna()).all():
+                df[col] = downcast
+    return df
+
+
+def frame_memory_report(df):
+    """
+    Rows, total bytes and per-column dtype and bytes of a frame. Bytes of columns
+    mapped from a shared column directory are also reported as shared_bytes.
+    """
+    usage = df.memory_usage(deep=True, index=False)
+    shared = {col: is_mapped(df[col].array if isinstance(df[col].dtype, pd.CategoricalDtype) else df[col].to_numpy())
+              for col in df.columns}
+    return {
+        'rows': len(df),
+        'bytes': int(usage.sum()),
+        'shared_bytes': int(sum(usage[col] for col in df.columns if shared[col])),
+        'columns': {str(col): {'dtype': str(df[col].dtype), 'bytes': int(usage[col]), 'shared': shared[col]}
+                    for col in df.columns}
+    }
+
+
+def prepare_category_frame(df, category):
+    """Clean a raw frame and derive the sales and date columns the analysis expects, per the category schema"""
+    with span('prepare'):
+        return get_schema(category).prepare(df)
@@ -1,199 +1,127 @@
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
-from sklearn.linear_model import LinearRegression, Lasso, Ridge
 from sklearn.preprocessing import StandardScaler, LabelEncoder
-from sklearn.model_selection import TimeSeriesSplit, GridSearchCV
-from sklearn.metrics import mean_absolute_error, r2_score, mean_squared_error
-import xgboost as xgb
-from statsmodels.tsa.seasonal import seasonal_decompose
+from sklearn.model_selection import TimeSeriesSplit
+import time
 import warnings
 from .market_coverage_model import MarketCoveragePredictor
+from .feature_store import encode_labels, feature_set_for
+from .performance import entity_rows, resolve_entity_columns
+from .schemas import DEFAULT_SCHEMA, get_schema
+from .timing import span
+from .trends import batch_trend_analysis
+from .model_selection import (run_fit_tasks, resolve_selection, select_best, successive_halving,
+                              build_candidates, candidates_signature)
 warnings.filterwarnings('ignore')
 
+# Candidate models as (module, class, parameters); they are only built (and their
+# libraries imported) when training needs them, not when a saved model is served
+CANDIDATE_MODELS = {
+    'random_forest': ('sklearn.ensemble', 'RandomForestRegressor', {'n_estimators': 100, 'random_state': 42}),
+    'gradient_boosting': ('sklearn.ensemble', 'GradientBoostingRegressor', {'n_estimators': 100, 'random_state': 42}),
+    'linear_regression': ('sklearn.linear_model', 'LinearRegression', {}),
+    'lasso': ('sklearn.linear_model', 'Lasso', {'alpha': 0.1}),
+    'ridge': ('sklearn.linear_model', 'Ridge', {'alpha': 0.1}),
+    'xgboost': ('xgboost', 'XGBRegressor', {'n_estimators': 100, 'random_state': 42})
+}
+
 class EnhancedMarketAnalysisModel:
     """Enhanced ML model that combines traditional analysis with market coverage prediction"""
     
-    def __init__(self):
-        self.models = {
-            'random_forest': RandomForestRegressor(n_estimators=100, random_state=42),
-            'gradient_boosting': GradientBoostingRegressor(n_estimators=100, random_state=42),
-            'linear_regression': LinearRegression(),
-            'lasso': Lasso(alpha=0.1),
-            'ridge': Ridge(alpha=0.1),
-            'xgboost': xgb.XGBRegressor(n_estimators=100, random_state=42)
-        }
+    def __init__(self, n_jobs=None, selection=None, time_budget=None):
+        self.candidate_specs = dict(CANDIDATE_MODELS)
+        self._models = None
         self.scaler = StandardScaler()
         self.label_encoders = {}
         self.best_model = None
         self.best_model_name = None
-        self.market_coverage_predictor = MarketCoveragePredictor()
+        self.n_jobs = n_jobs
+        self.selection, self.time_budget = resolve_selection(selection, time_budget)
+        self.selection_report = None
+        self.market_coverage_predictor = MarketCoveragePredictor(n_jobs=n_jobs, selection=selection,
+                                                                 time_budget=time_budget)
         self.category = None
+        self.feature_columns = []
         
-    def process_data_by_category(self, df, category):
-        """Process data based on category type"""
-        self.category = category.lower()
-        df_processed = df.copy()
+    @property
+    def models(self):
+        """Candidate models, built on first use"""
+        if self._models is None:
+            self._models = build_candidates(self.candidate_specs)
+        return self._models
+    
+    def process_data_by_category(self, df, category, fit=True):
+        """
+        Process data as declared by the category schema: clean it, derive sales and
+        date, and label-encode the schema's encode columns. With fit=False the fitted
+        label encoders only transform, and the model is not modified.
+        """
+        if fit:
+            self.category = category.lower()
+        schema = get_schema(category.lower())
+        # Processing only adds or replaces columns, so a shallow copy keeps df intact
+        df_processed = df.copy(deep=False)
         
         try:
-            if self.category == 'smartphones':
-                df_processed = self._process_smartphones(df_processed)
-            elif self.category == 'electronics':
-                df_processed = self._process_electronics(df_processed)
-            elif self.category == 'fashion':
-                df_processed = self._process_fashion(df_processed)
-            elif self.category == 'groceries':
-                df_processed = self._process_groceries(df_processed)
-            elif self.category == 'stocks':
-                df_processed = self._process_stocks(df_processed)
-            else:
-                # Generic processing
-                df_processed = self._process_generic(df_processed)
-                
+            with span('process_data_by_category'):
+                df_processed = schema.prepare(df_processed)
+                for col in schema.encode_columns:
+                    if col in df_processed.columns:
+                        df_processed[f'{col}_encoded'] = encode_labels(self.label_encoders, col,
+                                                                       df_processed[col].astype(str), fit)
             return df_processed
             
         except Exception as e:
             print(f"Error processing {category} data: {str(e)}")
-            return self._process_generic(df_processed)
+            return DEFAULT_SCHEMA.derive(df_processed)
     
-    def _process_smartphones(self, df):
-        """Process smartphone data"""
-        # Ensure required columns exist
-        if 'sales' not in df.columns:
-            if 'Selling Price' in df.columns:
-                # Generate sales based on price
-                df['sales'] = df['Selling Price'] * np.random.uniform(1, 100, len(df))
-            else:
-                df['sales'] = np.random.uniform(1000, 50000, len(df))
-        
-        if 'date' not in df.columns:
-            df['date'] = pd.date_range(start='2020-01-01', periods=len(df), freq='D')
-        
-        # Convert relevant columns to numeric
-        for col in ['Selling Price', 'Original Price', 'Rating']:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-        
-        # Handle categorical encoding
-        categorical_cols = ['Brands', 'Models', 'Colors']
-        for col in categorical_cols:
-            if col in df.columns:
-                if col not in self.label_encoders:
-                    self.label_encoders[col] = LabelEncoder()
-                df[f'{col}_encoded'] = self.label_encoders[col].fit_transform(df[col].astype(str))
-        
-        return df
+    def _serving_features(self, df, features):
+        """features when it holds the processed frames of df encoded by this model, else None"""
+        if features is not None and features.model is self and features.usable_for(df):
+            return features
+        return None
     
-    def _process_electronics(self, df):
-        """Process electronics data"""
-        # Clean the data
-        df = df[df['Order ID'] != 'Order ID'].copy()  # Remove header rows
-        
-        # Convert to numeric
-        for col in ['Price Each', 'Quantity Ordered']:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-        
-        # Calculate sales
-        if 'sales' not in df.columns:
-            if 'Price Each' in df.columns and 'Quantity Ordered' in df.columns:
-                df['sales'] = df['Price Each'] * df['Quantity Ordered']
-            else:
-                df['sales'] = np.random.uniform(10, 1000, len(df))
-        
-        # Handle date
-        if 'date' not in df.columns and 'Order Date' in df.columns:
-            df['date'] = pd.to_datetime(df['Order Date'], errors='coerce')
-        elif 'date' not in df.columns:
-            df['date'] = pd.date_range(start='2020-01-01', periods=len(df), freq='H')
-        
-        # Encode product names
-        if 'Product' in df.columns:
-            if 'Product' not in self.label_encoders:
-                self.label_encoders['Product'] = LabelEncoder()
-            df['Product_encoded'] = self.label_encoders['Product'].fit_transform(df['Product'].astype(str))
-        
-        return df
-    
-    def _process_fashion(self, df):
-        """Process fashion data"""
-        if 'sales' not in df.columns:
-            df['sales'] = np.random.uniform(100, 5000, len(df))
-        
-        if 'date' not in df.columns:
-            df['date'] = pd.date_range(start='2020-01-01', periods=len(df), freq='D')
-        
-        return df
+    def _process_for_serving(self, df):
+        """
+        Category processing for request-time paths, encoding with the label encoders
+        fitted in training: values the model has not seen get UNKNOWN_CODE instead of
+        shifting the codes of the others, and a published model stays read-only, so it
+        can serve several threads at once.
+        """
+        return self.process_data_by_category(df, self.category or 'general', fit=False)
     
-    def _process_groceries(self, df):
-        """Process groceries data"""
-        # Handle column name variations
-        if 'sales' not in df.columns and 'Sales' in df.columns:
-            df['sales'] = pd.to_numeric(df['Sales'], errors='coerce')
-        elif 'sales' not in df.columns:
-            df['sales'] = np.random.uniform(50, 1000, len(df))
-        
-        if 'date' not in df.columns and 'Order_Date' in df.columns:
-            df['date'] = pd.to_datetime(df['Order_Date'], errors='coerce')
-        elif 'date' not in df.columns:
-            df['date'] = pd.date_range(start='2020-01-01', periods=len(df), freq='D')
-        
-        # Encode categorical variables
-        categorical_cols = ['Category', 'Region', 'Customer_Segment']
-        for col in categorical_cols:
-            if col in df.columns:
-                if col not in self.label_encoders:
-                    self.label_encoders[col] = LabelEncoder()
-                df[f'{col}_encoded'] = self.label_encoders[col].fit_transform(df[col].astype(str))
-        
-        return df
-    
-    def _process_stocks(self, df):
-        """Process stocks data"""
-        if 'sales' not in df.columns:
-            # For stocks, use market cap or trading volume as 'sales'
-            df['sales'] = np.random.uniform(1000000, 1000000000, len(df))
-        
-        if 'date' not in df.columns:
-            df['date'] = pd.date_range(start='2020-01-01', periods=len(df), freq='D')
-        
-        # Encode categorical variables
-        categorical_cols = ['Symbol', 'Security Name', 'Market Category']
-        for col in categorical_cols:
-            if col in df.columns:
-                if col not in self.label_encoders:
-                    self.label_encoders[col] = LabelEncoder()
-                df[f'{col}_encoded'] = self.label_encoders[col].fit_transform(df[col].astype(str))
-        
-        return df
-    
-    def _process_generic(self, df):
-        """Generic data processing"""
-        if 'sales' not in df.columns:
-            df['sales'] = np.random.uniform(100, 10000, len(df))
-        
-        if 'date' not in df.columns:
-            df['date'] = pd.date_range(start='2020-01-01', periods=len(df), freq='D')
-        
-        return df
-    
-    def train(self, df, category='general'):
-        """Train the enhanced model"""
+    def train(self, df, category='general', progress_callback=None, features=None):
+        """
+        Train the enhanced model.
+        progress_callback(stage, candidate, status, metrics=None) is called as each
+        candidate model starts ('running') and finishes ('completed', 'failed', or
+        'eliminated' when successive halving drops it).
+        features is an optional FeatureSet of df whose processed frames are reused.
+        The time budget of successive halving is shared by both models.
+        """
         try:
-            # Process data based on category
-            df_processed = self.process_data_by_category(df, category)
+            deadline = time.time() + self.time_budget if self.time_budget is not None else None
+            
+            # Process data based on category, once for both models
+            features = feature_set_for(df, category, features)
+            self.category = category.lower()
             
             # Train market coverage predictor
-            market_coverage_metrics = self.market_coverage_predictor.train_market_coverage_model(df_processed, category)
+            market_coverage_metrics = self.market_coverage_predictor.train_market_coverage_model(
+                features.coverage_frame(), category, progress_callback, prepared=True, deadline=deadline
+            )
+            self.label_encoders = features.encoders('processed')
+            self.market_coverage_predictor.label_encoders = features.encoders('coverage')
             
             # Prepare features for traditional analysis
-            df_processed = self._prepare_features(df_processed)
+            df_processed = features.trend_frame()
             
             # Select features for traditional model
             feature_columns = self._select_features(df_processed)
             
             if not feature_columns:
                 raise ValueError("No suitable features found for training")
+            self.feature_columns = feature_columns
             
             X = df_processed[feature_columns].fillna(0)
             y = df_processed['sales']
@@ -202,12 +130,16 @@ class EnhancedMarketAnalysisModel:
             X_scaled = self.scaler.fit_transform(X)
             
             # Train traditional models
-            traditional_metrics = self._train_traditional_models(X_scaled, y)
+            traditional_metrics = self._train_traditional_models(X_scaled, y, progress_callback, deadline)
             
             # Combine metrics
             combined_metrics = {
                 'traditional_models': traditional_metrics,
-                'market_coverage_model': market_coverage_metrics
+                'market_coverage_model': market_coverage_metrics,
+                'selection': {
+                    'traditional_models': self.selection_report,
+                    'market_coverage_model': self.market_coverage_predictor.selection_report
+                }
             }
             
             return combined_metrics
@@ -217,6 +149,19 @@ class EnhancedMarketAnalysisModel:
     
     def _prepare_features(self, df):
         """Prepare features for traditional analysis"""
+        df = self._time_features(df)
+
+        # Create lag features if we have enough data
+        if len(df) > 30 and 'sales' in df.columns:
+            df = df.sort_values('date')
+            lags = self._lag_features(df['sales'])
+            for col in lags.columns:
+                df[col] = lags[col]
+
+        return df
+    
+    @staticmethod
+    def _time_features(df):
         # Convert date to datetime if it exists
         if 'date' in df.columns:
             df['date'] = pd.to_datetime(df['date'], errors='coerce')
@@ -225,17 +170,18 @@ class EnhancedMarketAnalysisModel:
             df['year'] = df['date'].dt.year
             df['day_of_week'] = df['date'].dt.dayofweek
             df['quarter'] = df['date'].dt.quarter
-
-        # Create lag features if we have enough data
-        if len(df) > 30 and 'sales' in df.columns:
-            df = df.sort_values('date')
-            df['sales_lag_1'] = df['sales'].shift(1)
-            df['sales_lag_7'] = df['sales'].shift(7)
-            df['sales_rolling_mean_7'] = df['sales'].rolling(window=7, min_periods=1).mean()
-            df['sales_rolling_mean_30'] = df['sales'].rolling(window=30, min_periods=1).mean()
-
         return df
     
+    @staticmethod
+    def _lag_features(sales):
+        """Lag and rolling mean features of a sales series in time order"""
+        return pd.DataFrame({
+            'sales_lag_1': sales.shift(1),
+            'sales_lag_7': sales.shift(7),
+            'sales_rolling_mean_7': sales.rolling(window=7, min_periods=1).mean(),
+            'sales_rolling_mean_30': sales.rolling(window=30, min_periods=1).mean()
+        }, index=sales.index)
+    
     def _select_features(self, df):
         """Select appropriate features for training"""
         # Prefer encoded categorical features and time features
@@ -255,7 +201,8 @@ class EnhancedMarketAnalysisModel:
         
         # Add other numeric features
         numeric_cols = df.select_dtypes(include=[np.number]).columns
-        other_numeric = [col for col in numeric_cols if col not in feature_columns and col not in ['sales', 'date']]
+        excluded = ['sales', 'date'] + get_schema(self.category).target_columns()
+        other_numeric = [col for col in numeric_cols if col not in feature_columns and col not in excluded]
         feature_columns.extend(other_numeric[:5])  # Limit to top 5 to avoid overfitting
         
         # Remove any columns with all missing values
@@ -263,66 +210,104 @@ class EnhancedMarketAnalysisModel:
         
         return feature_columns
     
-    def _train_traditional_models(self, X, y):
-        """Train traditional ML models"""
-        best_score = float('-inf')
-        metrics = {}
+    def _train_traditional_models(self, X, y, progress_callback=None, deadline=None):
+        """
+        Train traditional ML models and select the best one, either by cross-validating
+        every candidate on all rows ('exhaustive') or by successive halving ('halving'),
+        which stops at deadline (a time.time() value) or else after the time budget
+        """
+        start = time.monotonic()
+        max_splits = min(5, len(X)//10)
+        names = list(self.models)
+        
+        if self.selection == 'halving':
+            def evaluate(candidates, fraction, n_splits, deadline):
+                # Subsample the most recent rows so the folds stay in time order
+                rows = min(len(X), max(int(len(X) * fraction), 10 * n_splits))
+                return self._cross_validate(candidates, X[len(X) - rows:], y.iloc[len(y) - rows:], n_splits,
+                                            deadline)
+            
+            best_name, results, report = successive_halving(
+                names, evaluate, max_splits, 'R2', time_budget=self.time_budget,
+                stage_name='traditional_models', progress_callback=progress_callback, deadline=deadline
+            )
+        else:
+            if progress_callback:
+                for name in names:
+                    progress_callback('traditional_models', name, 'running')
+            results = self._cross_validate(names, X, y, max_splits)
+            if progress_callback:
+                for name in names:
+                    if name in results:
+                        progress_callback('traditional_models', name, 'completed', results[name]['metrics'])
+                    else:
+                        progress_callback('traditional_models', name, 'failed')
+            best_name = select_best(results, names, 'R2')
+            report = {'strategy': 'exhaustive'}
+        
+        if best_name is not None:
+            self.best_model = results[best_name]['model']
+            self.best_model_name = best_name
+        report['time_spent'] = round(time.monotonic() - start, 3)
+        self.selection_report = report
         
+        return {name: results[name]['metrics'] for name in names if name in results}
+    
+    def _cross_validate(self, names, X, y, n_splits, deadline=None):
+        """
+        Average time-series cross-validation metrics of the named candidates, fitting
+        every (candidate, fold) pair in parallel. Returns {name: {'metrics', 'model'}}
+        for the candidates that trained, with the model fitted on the last fold.
+        No fit starts after deadline.
+        """
         # Use TimeSeriesSplit for time-based data
-        tscv = TimeSeriesSplit(n_splits=min(5, len(X)//10))
+        tscv = TimeSeriesSplit(n_splits=n_splits)
+        splits = list(tscv.split(X))
         
-        for name, model in self.models.items():
-            try:
-                scores = []
-                
-                for train_idx, val_idx in tscv.split(X):
-                    X_train, X_val = X[train_idx], X[val_idx]
-                    y_train, y_val = y.iloc[train_idx], y.iloc[val_idx]
-
-                    model.fit(X_train, y_train)
-                    y_pred = model.predict(X_val)
-                    
-                    # Calculate metrics
-                    mae = mean_absolute_error(y_val, y_pred)
-                    rmse = np.sqrt(mean_squared_error(y_val, y_pred))
-                    r2 = r2_score(y_val, y_pred)
-                    
-                    scores.append({'MAE': mae, 'RMSE': rmse, 'R2': r2})
-
-                # Average metrics across folds
-                avg_metrics = {
+        # Keep the model fitted on the last (largest) fold, as the sequential loop did
+        tasks = [(name, train_idx, val_idx, fold == len(splits) - 1)
+                 for name in names
+                 for fold, (train_idx, val_idx) in enumerate(splits)]
+        results = run_fit_tasks(self.models, X, y, tasks, self.n_jobs, deadline)
+        
+        trained = {}
+        for name in names:
+            candidate_results = [result for task, result in zip(tasks, results) if task[0] == name]
+            errors = [error for _, _, error in candidate_results if error]
+            if errors:
+                print(f"Error training {name}: {errors[0]}")
+                continue
+            
+            scores = [scores for scores, _, _ in candidate_results]
+            
+            # Average metrics across folds
+            trained[name] = {
+                'metrics': {
                     'MAE': np.mean([s['MAE'] for s in scores]),
                     'RMSE': np.mean([s['RMSE'] for s in scores]),
                     'R2': np.mean([s['R2'] for s in scores])
-                }
-                
-                metrics[name] = avg_metrics
-
-                # Update best model
-                if avg_metrics['R2'] > best_score:
-                    best_score = avg_metrics['R2']
-                    self.best_model = model
-                    self.best_model_name = name
-                    
-            except Exception as e:
-                print(f"Error training {name}: {str(e)}")
-                continue
-
-        return metrics
+                },
+                'model': candidate_results[-1][1]
+            }
+        
+        return trained
     
-    def predict(self, df):
+    def predict(self, df, features=None):
         """Make predictions using the best traditional model"""
         try:
             if self.best_model is None:
                 raise ValueError("Model not trained yet")
                 
             # Process data
-            df_processed = self.process_data_by_category(df, self.category or 'general')
-            df_processed = self._prepare_features(df_processed)
+            features = self._serving_features(df, features)
+            if features is not None:
+                df_processed = features.trend_frame()
+            else:
+                df_processed = self._prepare_features(self._process_for_serving(df))
             
             # Use the same features as training
-            feature_columns = self._select_features(df_processed)
-            X = df_processed[feature_columns].fillna(0)
+            feature_columns = self.feature_columns or self._select_features(df_processed)
+            X = df_processed.reindex(columns=feature_columns).fillna(0)
             
             # Scale features
             X_scaled = self.scaler.transform(X)
@@ -335,23 +320,145 @@ class EnhancedMarketAnalysisModel:
         except Exception as e:
             raise ValueError(f"Error in prediction: {str(e)}")
     
-    def predict_market_coverage(self, df, product_name=None, brand=None):
-        """Predict market coverage using the specialized model"""
+    def export_state(self):
+        """Get the fitted state needed to serve predictions without retraining"""
+        return {
+            'category': self.category,
+            'best_model': self.best_model,
+            'best_model_name': self.best_model_name,
+            'scaler': self.scaler,
+            'label_encoders': self.label_encoders,
+            'feature_columns': self.feature_columns,
+            'market_coverage': self.market_coverage_predictor.export_state()
+        }
+    
+    def load_state(self, state):
+        """Restore a state produced by export_state"""
+        self.category = state['category']
+        self.best_model = state['best_model']
+        self.best_model_name = state['best_model_name']
+        self.scaler = state['scaler']
+        self.label_encoders = state['label_encoders']
+        self.feature_columns = state['feature_columns']
+        self.market_coverage_predictor.load_state(state['market_coverage'])
+    
+    def config_signature(self):
+        """Describe the candidate models and selection strategy so changed hyperparameters invalidate saved models"""
+        specs = dict(self.candidate_specs)
+        specs.update({f'market_coverage.{name}': spec for name, spec in self.market_coverage_predictor.candidate_specs.items()})
+        signature = candidates_signature(specs)
+        signature['selection'] = [self.selection, self.time_budget]
+        return signature
+    
+    def predict_market_coverage(self, df, product_name=None, brand=None, index=None, features=None):
+        """
+        Predict market coverage using the specialized model.
+        index is an optional EntityIndex of df used to find the product's rows;
+        features an optional FeatureSet of df.
+        """
+        features = self._serving_features(df, features)
+        if features is not None:
+            return self.market_coverage_predictor.predict_market_coverage(
+                features.coverage_frame(), self.category or 'general', product_name, brand, index, prepared=True
+            )
+        
+        # The coverage model was trained on frames that went through category processing
+        df_processed = self._process_for_serving(df)
         return self.market_coverage_predictor.predict_market_coverage(
-            df, self.category or 'general', product_name, brand
+            df_processed, self.category or 'general', product_name, brand, index
+        )
+    
+    def predict_market_coverage_bulk(self, df, product_col=None, brand_col=None, features=None, entities=None):
+        """
+        Predict market coverage for all products (or brand-product pairs) with a
+        single prepare and predict pass. Returns {product or (brand, product): result}.
+        With entities (keys in the same format), only their rows are predicted; the
+        features are still prepared over the whole frame, so results do not change.
+        """
+        if product_col is None:
+            product_col, brand_col = resolve_entity_columns(df)
+        if product_col is None:
+            return {}
+        
+        keys = [brand_col, product_col] if brand_col else [product_col]
+        features = self._serving_features(df, features)
+        if features is not None:
+            df_processed = features.coverage_frame()
+        elif entities is not None:
+            df_processed = self.market_coverage_predictor._prepare_for_serving(self._process_for_serving(df),
+                                                                               self.category or 'general')
+        else:
+            return self.market_coverage_predictor.predict_market_coverage_bulk(
+                self._process_for_serving(df), self.category or 'general', keys
+            )
+        
+        if entities is not None:
+            df_processed = entity_rows(df_processed, keys, entities)
+        return self.market_coverage_predictor.predict_market_coverage_bulk(
+            df_processed, self.category or 'general', keys, prepared=True
         )
     
-    def analyze_market_coverage_factors(self, df):
+    def analyze_market_coverage_factors(self, df, features=None):
         """Analyze factors affecting market coverage"""
+        features = self._serving_features(df, features)
+        if features is not None:
+            return self.market_coverage_predictor.analyze_market_coverage_factors(
+                features.coverage_frame(), self.category or 'general', prepared=True
+            )
         return self.market_coverage_predictor.analyze_market_coverage_factors(
             df, self.category or 'general'
         )
     
-    def analyze_trends(self, df, product_name=None, brand=None):
-        """Enhanced trend analysis"""
+    def analyze_trends_batch(self, df, product_col=None, brand_col=None, entities=None):
+        """
+        Trend analysis for all products (or brand-product pairs) at once.
+        Returns {product or (brand, product): trend dict} in the analyze_trends format,
+        for the given entities only (keys in the same format) when entities is set.
+        """
+        try:
+            if product_col is None:
+                product_col, brand_col = resolve_entity_columns(df)
+            if product_col is None:
+                return {}
+            
+            if 'date' not in df.columns or 'sales' not in df.columns:
+                df = self._process_for_serving(df)
+            
+            keys = [brand_col, product_col] if brand_col else [product_col]
+            if entities is not None:
+                df = entity_rows(df, keys, entities)
+            return batch_trend_analysis(df, keys)
+            
+        except Exception as e:
+            print(f"Error in batch trend analysis: {str(e)}")
+            return {}
+    
+    def _matching_rows(self, df, index, product_name=None, brand=None):
+        """Positions of the rows analyze_trends keeps for a product/brand filter"""
+        positions = np.arange(len(df))
+        for value, columns in [(product_name, ['Product', 'Mobile', 'product', 'Models']),
+                               (brand, ['Brand', 'Brands', 'brand'])]:
+            if not value:
+                continue
+            col = next((col for col in columns if col in df.columns), None)
+            if col:
+                positions = np.intersect1d(positions, index.matching(col, value), assume_unique=True)
+        return positions
+    
+    def analyze_trends(self, df, product_name=None, brand=None, index=None, features=None):
+        """
+        Enhanced trend analysis.
+        index is an optional EntityIndex of df; with it only the matching rows are sliced
+        out instead of masking the whole frame. With features (a FeatureSet of df) the
+        rows are taken from its processed frame instead of processing them again.
+        """
         try:
-            # Filter data if specific product/brand requested
-            df_filtered = df.copy()
+            if index is not None and (product_name or brand):
+                df_filtered = df.iloc[self._matching_rows(df, index, product_name, brand)]
+                product_name = brand = None
+            else:
+                # Filter data if specific product/brand requested; filtering never modifies df
+                df_filtered = df
             
             if product_name:
                 product_columns = ['Product', 'Mobile', 'product', 'Models']
@@ -385,7 +492,11 @@ class EnhancedMarketAnalysisModel:
                 }
 
             # Process data
-            df_processed = self.process_data_by_category(df_filtered, self.category or 'general')
+            features = self._serving_features(df, features)
+            if features is not None:
+                df_processed = features.processed().reindex(df_filtered.index)
+            else:
+                df_processed = self._process_for_serving(df_filtered)
             
             # Basic trend analysis
             if 'date' not in df_processed.columns or 'sales' not in df_processed.columns:
@@ -424,7 +535,9 @@ class EnhancedMarketAnalysisModel:
                 monthly_data = df_processed.set_index('date')['sales'].resample('M').sum()
                 
                 if len(monthly_data) >= 12:
-                    decomposition = seasonal_decompose(monthly_data, period=12, extrapolate_trend='freq')
+                    from statsmodels.tsa.seasonal import seasonal_decompose
+                    with span('seasonal_decompose'):
+                        decomposition = seasonal_decompose(monthly_data, period=12, extrapolate_trend='freq')
                     trend = decomposition.trend
                     seasonal = decomposition.seasonal
                     
@@ -0,0 +1,80 @@
+import threading
+import numpy as np
+import pandas as pd
+
+# Columns that identify products, brands and symbols across the category datasets
+INDEX_COLUMNS = ['product', 'Product', 'Mobile', 'Models', 'brand', 'Brand', 'Brands', 'Symbol']
+
+_NO_ROWS = np.empty(0, dtype=np.intp)
+
+
+class EntityIndex:
+    """
+    Row positions of every value of a frame's entity columns.
+    Built in one factorize pass per column, so product-scoped requests slice a
+    product's rows instead of scanning the whole frame with boolean masks.
+    Positions are ascending, so slices keep the frame's row order.
+    """
+
+    def __init__(self, df, columns=INDEX_COLUMNS):
+        self.size = len(df)
+        self._columns = {}
+        for col in columns:
+            if col not in df.columns:
+                continue
+            codes, values = pd.factorize(df[col])
+            # Missing values get code -1 and sort first; they are never looked up
+            order = np.argsort(codes, kind='stable')[(codes < 0).sum():]
+            starts = np.concatenate([[0], np.cumsum(np.bincount(codes[codes >= 0], minlength=len(values)))])
+            self._columns[col] = (pd.Index(values), order, starts)
+
+    def __contains__(self, column):
+        return column in self._columns
+
+    def positions(self, column, value):
+        """Positions of the rows where column equals value"""
+        entry = self._columns.get(column)
+        if entry is None:
+            return _NO_ROWS
+        values, order, starts = entry
+        try:
+            code = values.get_loc(value)
+        except (KeyError, TypeError):
+            return _NO_ROWS
+        return order[starts[code]:starts[code + 1]]
+
+    def matching(self, column, pattern, case=False):
+        """Positions of the rows whose value contains pattern, as Series.str.contains(pattern, case, na=False)"""
+        entry = self._columns.get(column)
+        if entry is None:
+            return _NO_ROWS
+        values, order, starts = entry
+        # Match each distinct value once instead of every row
+        matched = np.flatnonzero(pd.Series(values).str.contains(pattern, case=case, na=False).to_numpy(dtype=bool))
+        if not len(matched):
+            return _NO_ROWS
+        return np.sort(np.concatenate([order[starts[code]:starts[code + 1]] for code in matched]))
+
+    def take(self, df, column, value):
+        """Rows of df (the indexed frame) where column equals value"""
+        return df.iloc[self.positions(column, value)]
+
+
+class EntityIndexCache:
+    """Keeps the entity index of the current version of each dataset"""
+
+    def __init__(self):
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, version, df):
+        """Get the index for a dataset version, building it from df when the version changed"""
+        with self._lock:
+            cached = self._indexes.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        index = EntityIndex(df)
+        with self._lock:
+            self._indexes[key] = (version, index)
+        return index
@@ -0,0 +1,156 @@
+import copy
+import threading
+import numpy as np
+import pandas as pd
+from .timing import span
+
+# Code of values a fitted label encoder did not see in training
+UNKNOWN_CODE = -1
+
+
+def encode_labels(encoders, col, values, fit=True):
+    """
+    Label-encode the values (strings) of column col. With fit, the column's encoder in
+    encoders is fitted on them (and created when missing); otherwise the fitted encoder
+    maps the values it knows to their codes and unseen ones to UNKNOWN_CODE, so the
+    codes a model learned keep their meaning. Without an encoder the values are encoded
+    by a new one that is not kept.
+    """
+    from sklearn.preprocessing import LabelEncoder
+    if fit:
+        if col not in encoders:
+            encoders[col] = LabelEncoder()
+        return encoders[col].fit_transform(values)
+    if col not in encoders:
+        return LabelEncoder().fit_transform(values)
+    codes = pd.Index(encoders[col].classes_).get_indexer(values)
+    return np.where(codes >= 0, codes, UNKNOWN_CODE)
+
+
+class FeatureSet:
+    """
+    Processed frames of one dataset version, each materialized once.
+    Both predictors read from the same stages instead of cleaning the data again:
+      processed - category processing (header rows removed, numerics converted,
+                  dates parsed, categorical columns label-encoded)
+      trend     - processed plus date parts and lag features
+      coverage  - processed plus the market coverage features
+    Stages are built on first use; callers get shallow copies and may add columns freely.
+    With a model, the stages are encoded by its label encoders (which are not modified),
+    as served; without one, a private model instance fits encoders on df, as for training.
+    """
+
+    def __init__(self, df, category, model=None):
+        self.df = df
+        self.category = category.lower()
+        self.model = model
+        self.size = len(df)
+        self._frames = {}
+        self._encoders = {}
+        self._processor = None
+        self._lock = threading.RLock()
+
+    def usable_for(self, df):
+        """Whether the stages were built from a frame with the rows of df"""
+        return len(df) == self.size and df.index.equals(self.df.index)
+
+    def _get_processor(self):
+        if self.model is not None:
+            return self.model
+        if self._processor is None:
+            from .enhanced_model import EnhancedMarketAnalysisModel
+            self._processor = EnhancedMarketAnalysisModel()
+        return self._processor
+
+    def _stage(self, name, build):
+        with self._lock:
+            if name not in self._frames:
+                with span(f'features_{name}'):
+                    self._frames[name] = build()
+            return self._frames[name].copy(deep=False)
+
+    def processed(self):
+        """The category-processed frame"""
+        def build():
+            processor = self._get_processor()
+            frame = processor.process_data_by_category(self.df, self.category, fit=self.model is None)
+            if self.model is None:
+                self._encoders['processed'] = dict(processor.label_encoders)
+            return frame
+        return self._stage('processed', build)
+
+    def trend_frame(self):
+        """The processed frame with date parts and lag features, ordered by date"""
+        return self._stage('trend', lambda: self._get_processor()._prepare_features(self.processed()))
+
+    def coverage_frame(self):
+        """The processed frame with the market coverage features"""
+        def build():
+            predictor = self._get_processor().market_coverage_predictor
+            frame = predictor.prepare_data_for_market_coverage(self.processed(), self.category,
+                                                               fit=self.model is None)
+            if self.model is None:
+                self._encoders['coverage'] = dict(predictor.label_encoders)
+            return frame
+        return self._stage('coverage', build)
+
+    def encoders(self, stage):
+        """Copies of the label encoders fitted while building a stage ('processed' or 'coverage'), without a model"""
+        with self._lock:
+            return {col: copy.deepcopy(encoder) for col, encoder in self._encoders.get(stage, {}).items()}
+
+    def memory_bytes(self):
+        """
+        Bytes held by the materialized stages beyond the source frame. Stages share
+        the columns they inherit, except trend, which is reordered and so copied.
+        """
+        with self._lock:
+            frames = dict(self._frames)
+        inherited = {
+            'processed': set(self.df.columns),
+            'coverage': set(frames['processed'].columns) if 'processed' in frames else set(self.df.columns),
+            'trend': set()
+        }
+        total = 0
+        for name, frame in frames.items():
+            columns = [col for col in frame.columns if col not in inherited[name]]
+            total += int(frame[columns].memory_usage(deep=True, index=False).sum())
+        return total
+
+
+class FeatureStore:
+    """Keeps the feature set of the current version of each dataset"""
+
+    def __init__(self):
+        self._sets = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, version, df, category, model=None):
+        """
+        Get the feature set for a dataset version encoded by model's label encoders,
+        creating it for df when the version or the model changed
+        """
+        with self._lock:
+            cached = self._sets.get(key)
+            if cached is not None and cached[0] == version and cached[1].model is model:
+                return cached[1]
+            features = FeatureSet(df, category, model)
+            self._sets[key] = (version, features)
+            return features
+
+    def memory_report(self):
+        """Bytes held by the materialized stages of each feature set"""
+        with self._lock:
+            sets = dict(self._sets)
+        return {key: features.memory_bytes() for key, (_, features) in sets.items()}
+
+
+def feature_set_for(df, category, features=None):
+    """
+    The given feature set when it was built from df for category with fitted encoders,
+    otherwise a new one for df (to train on)
+    """
+    if (features is not None and features.model is None and features.category == category.lower()
+            and features.usable_for(df)):
+        return features
+    return FeatureSet(df, category)
@@ -0,0 +1,360 @@
+import copy
+import os
+import threading
+import joblib
+import pandas as pd
+from .dataset_loader import prepare_category_frame
+from .performance import resolve_entity_columns
+from .schemas import get_schema
+
+# Brand columns used for brand totals, in order of preference
+BRAND_COLUMNS = ['brand', 'Brands']
+
+
+class InvalidRowsError(ValueError):
+    """Raised when rows sent for ingestion do not match the category schema; rows lists the failures"""
+
+    def __init__(self, message, rows):
+        super().__init__(message)
+        self.rows = rows
+
+
+def _add(totals, batch):
+    """Add batch totals to running totals, keeping entries present in only one of them"""
+    return batch.astype(float) if totals.empty else totals.add(batch, fill_value=0)
+
+
+class SalesAggregates:
+    """
+    Running sales totals of a category, updated batch by batch.
+    Keeps per-entity and per-brand totals, the (entity x month) sales series and
+    the market-share denominator, so appended rows never require a rescan.
+    """
+
+    def __init__(self, product_col=None, brand_col=None, sales_col='sales'):
+        self.product_col = product_col
+        self.brand_col = brand_col
+        self.sales_col = sales_col
+        self.keys = [col for col in [brand_col, product_col] if col]
+        self.rows = 0
+        self.total_sales = 0.0
+        self.entity_totals = pd.Series(dtype=float)
+        self.brand_totals = pd.Series(dtype=float)
+        self.monthly = pd.Series(dtype=float)
+
+    @classmethod
+    def for_frame(cls, df):
+        """Create empty aggregates for the entity and sales columns of a prepared frame"""
+        product_col, _ = resolve_entity_columns(df)
+        brand_col = next((col for col in BRAND_COLUMNS if col in df.columns and col != product_col), None)
+        sales_col = next((col for col in ['sales', 'Sales'] if col in df.columns), None)
+        return cls(product_col, brand_col, sales_col)
+
+    def update(self, df):
+        """Add a prepared batch of rows; returns the entity keys the batch touched"""
+        self.rows += len(df)
+        if self.sales_col is None or df.empty:
+            return []
+
+        sales = pd.to_numeric(df[self.sales_col], errors='coerce')
+        self.total_sales += float(sales.sum())
+
+        if self.brand_col:
+            self.brand_totals = _add(self.brand_totals, sales.groupby(df[self.brand_col], observed=True).sum())
+
+        month = pd.to_datetime(df['date'], errors='coerce').dt.strftime('%Y-%m') if 'date' in df.columns else None
+        if not self.keys:
+            if month is not None:
+                self.monthly = _add(self.monthly, sales.groupby(month).sum())
+            return []
+
+        batch_totals = sales.groupby([df[col] for col in self.keys], observed=True).sum()
+        self.entity_totals = _add(self.entity_totals, batch_totals)
+        if month is not None:
+            self.monthly = _add(self.monthly, sales.groupby([df[col] for col in self.keys] + [month.rename('_month')], observed=True).sum())
+        return list(batch_totals.index)
+
+    def distribution(self):
+        """Sales per brand and product (nested when both are known), as /analyze reports them"""
+        if len(self.keys) == 2:
+            return {
+                brand: {product: float(value) for product, value in totals.droplevel(0).items()}
+                for brand, totals in self.entity_totals.groupby(level=0, sort=False)
+            }
+        totals = self.entity_totals if self.keys else self.brand_totals
+        return {key: float(value) for key, value in totals.items()}
+
+    def entity_summary(self, key):
+        """Totals, market share and monthly series of one entity"""
+        sales = float(self.entity_totals.get(key, 0.0))
+        summary = dict(zip(self.keys, key if isinstance(key, tuple) else (key,)))
+        summary['sales'] = sales
+        summary['market_share'] = sales / self.total_sales * 100 if self.total_sales else 0.0
+        if len(self.monthly):
+            try:
+                series = self.monthly.loc[key]
+                summary['monthly_sales'] = {month: float(value) for month, value in series.items()}
+            except KeyError:
+                summary['monthly_sales'] = {}
+        return summary
+
+    def summary(self, top=10):
+        """Overall totals with the top entities and brands by market share"""
+        result = {
+            'rows': self.rows,
+            'total_sales': self.total_sales,
+            'entity_columns': self.keys,
+            'top_entities': [self.entity_summary(key) for key in self.entity_totals.nlargest(top).index]
+        }
+        if self.brand_col:
+            result['brand_market_share'] = {
+                brand: float(value / self.total_sales * 100) if self.total_sales else 0.0
+                for brand, value in self.brand_totals.nlargest(top).items()
+            }
+        if not self.keys and len(self.monthly):
+            result['monthly_sales'] = {month: float(value) for month, value in self.monthly.sort_index().items()}
+        return result
+
+
+class IngestStore:
+    """
+    Rows appended to the category datasets without rewriting their CSV files.
+    Appended rows are journaled per dataset version (a changed source file starts
+    a fresh journal) and keep running aggregates and an online model up to date
+    batch by batch, so new rows are visible within seconds and the saved
+    category model does not have to be retrained.
+    """
+
+    def __init__(self, ingest_dir='.cache/ingest'):
+        self.ingest_dir = ingest_dir
+        self._rows = {}
+        self._frames = {}
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def _paths(self, category, fingerprint):
+        base = os.path.join(self.ingest_dir, f'{category.lower()}-{fingerprint[:16]}')
+        return f'{base}.csv', f'{base}.joblib'
+
+    def _journal_version(self, category, fingerprint):
+        """Size and modification time of a journal, or None when there is none"""
+        journal_path, _ = self._paths(category, fingerprint)
+        try:
+            stat = os.stat(journal_path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def _journal(self, category, fingerprint):
+        """
+        Get the appended rows of a dataset version. The journal is read again whenever
+        its size or modification time changes, so rows appended by other workers show up.
+        """
+        key = (category.lower(), fingerprint)
+        version = self._journal_version(category, fingerprint)
+        cached = self._rows.get(key)
+        if cached is None or cached[0] != version:
+            rows = None
+            if version is not None:
+                journal_path, _ = self._paths(category, fingerprint)
+                try:
+                    rows = pd.read_csv(journal_path, low_memory=False)
+                except Exception as e:
+                    print(f"Warning: Could not read ingest journal for {category}: {str(e)}")
+            cached = self._rows[key] = (version, rows)
+        return cached[1]
+
+    def ingested_rows(self, category, fingerprint):
+        """Number of rows ingested for a dataset version"""
+        with self._lock:
+            rows = self._journal(category, fingerprint)
+        return 0 if rows is None else len(rows)
+
+    def rows(self, category, fingerprint):
+        """The raw rows ingested for a dataset version, or None"""
+        with self._lock:
+            return self._journal(category, fingerprint)
+
+    def extend(self, category, fingerprint, df):
+        """Get a raw dataset frame with the rows ingested for its version appended"""
+        with self._lock:
+            rows = self._journal(category, fingerprint)
+        if rows is None or rows.empty:
+            return df
+        return concat_rows(df, rows)
+
+    def prepared(self, category, fingerprint, df):
+        """
+        Get the prepared frame (see prepare_category_frame) of a dataset version with
+        its ingested rows appended. df is the raw frame of the version. The frame is
+        built once per version of the journal and returned as a shallow copy, like
+        DatasetLoader.load returns its frames.
+        """
+        with self._lock:
+            rows = self._journal(category, fingerprint)
+            version = (fingerprint, self._rows[(category.lower(), fingerprint)][0])
+            cached = self._frames.get(category.lower())
+        if cached is not None and cached[0] == version:
+            return cached[1].copy(deep=False)
+
+        full = df.copy(deep=False) if rows is None or rows.empty else concat_rows(df, rows)
+        frame = prepare_category_frame(full, category)
+        with self._lock:
+            self._frames[category.lower()] = (version, frame)
+        return frame.copy(deep=False)
+
+    def append(self, category, fingerprint, df, records):
+        """
+        Append rows (a list of column -> value dicts) to a category dataset.
+        df is the raw frame of the current dataset version. Updates the aggregates
+        and the online model and returns a summary of the batch.
+        """
+        records = pd.DataFrame.from_records(records)
+        invalid = get_schema(category).validate_rows(records, df.columns)
+        if invalid:
+            raise InvalidRowsError(f"{len(invalid)} of {len(records)} rows do not match the {category} schema", invalid)
+        batch = align_rows(records, df)
+        with self._lock:
+            state = self._state(category, fingerprint, df)
+            prepared = prepare_category_frame(batch.copy(), category)
+            touched = state['aggregates'].update(prepared)
+            try:
+                online = state['online_model'].partial_fit(prepared, category)
+            except ValueError as e:
+                print(f"Warning: {str(e)}")
+                online = {'error': str(e)}
+
+            self._write(category, fingerprint, batch, state['online_model'])
+            state['journal'] = self._journal_version(category, fingerprint)
+            rows = self._journal(category, fingerprint)
+
+            return {
+                'category': category,
+                'rows_ingested': len(batch),
+                'ingested_rows': 0 if rows is None else len(rows),
+                'total_rows': state['aggregates'].rows,
+                'total_sales': state['aggregates'].total_sales,
+                'updated_entities': [state['aggregates'].entity_summary(entity) for entity in touched],
+                'online_model': online
+            }
+
+    def incremental(self, category, fingerprint, df):
+        """
+        Get (aggregates, online model) of a dataset version with ingested rows, or None
+        when nothing was ingested. df is the raw frame of the version. Both are copies,
+        so later batches do not change them while a request reads them.
+        """
+        with self._lock:
+            rows = self._journal(category, fingerprint)
+            if rows is None or rows.empty:
+                return None
+            state = self._state(category, fingerprint, df)
+            return copy.copy(state['aggregates']), copy.deepcopy(state['online_model'])
+
+    def summary(self, category, fingerprint, df):
+        """Get the running aggregates and online model status of a category"""
+        with self._lock:
+            state = self._state(category, fingerprint, df)
+            rows = self._journal(category, fingerprint)
+            return {
+                'category': category,
+                'ingested_rows': 0 if rows is None else len(rows),
+                'aggregates': state['aggregates'].summary(),
+                'online_model': {
+                    'model': state['online_model'].best_model_name,
+                    'samples_seen': state['online_model'].samples_seen,
+                    'feature_columns': state['online_model'].feature_columns
+                }
+            }
+
+    def _state(self, category, fingerprint, df):
+        # Rebuilt when the dataset changes or another worker appended to the journal
+        state = self._states.get(category.lower())
+        if (state is None or state['fingerprint'] != fingerprint
+                or state['journal'] != self._journal_version(category, fingerprint)):
+            state = self._build_state(category, fingerprint, df)
+            self._states[category.lower()] = state
+        return state
+
+    def _build_state(self, category, fingerprint, df):
+        """Aggregate the dataset and its journal once, and load or seed the online model"""
+        journal = self._journal_version(category, fingerprint)
+        rows = self._journal(category, fingerprint)
+        full = df.copy(deep=False) if rows is None else concat_rows(df, rows)
+        full = prepare_category_frame(full, category)
+
+        aggregates = SalesAggregates.for_frame(full)
+        aggregates.update(full)
+
+        from .online_model import OnlineMarketAnalysisModel
+        online_model = OnlineMarketAnalysisModel()
+        _, model_path = self._paths(category, fingerprint)
+        try:
+            online_model.load_state(joblib.load(model_path))
+        except Exception as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"Warning: Could not load online model for {category}: {str(e)}")
+                online_model = OnlineMarketAnalysisModel()
+            # Learn the existing rows in one pass before the first batch
+            try:
+                online_model.partial_fit(full, category)
+            except ValueError as e:
+                print(f"Warning: {str(e)}")
+
+        self._prune(category, fingerprint)
+        return {'fingerprint': fingerprint, 'journal': journal, 'aggregates': aggregates, 'online_model': online_model}
+
+    def _write(self, category, fingerprint, batch, online_model):
+        journal_path, model_path = self._paths(category, fingerprint)
+        try:
+            os.makedirs(self.ingest_dir, exist_ok=True)
+            batch.to_csv(journal_path, mode='a', header=not os.path.exists(journal_path), index=False)
+            tmp_path = f'{model_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            joblib.dump(online_model.export_state(), tmp_path)
+            os.replace(tmp_path, model_path)
+        except Exception as e:
+            print(f"Warning: Could not save ingested rows for {category}: {str(e)}")
+
+    def _prune(self, category, fingerprint):
+        """Drop journals of older versions of the dataset"""
+        prefix = f'{category.lower()}-'
+        keep = {os.path.basename(path) for path in self._paths(category, fingerprint)}
+        try:
+            names = os.listdir(self.ingest_dir)
+        except OSError:
+            return
+        for name in names:
+            if name.startswith(prefix) and name not in keep:
+                try:
+                    os.remove(os.path.join(self.ingest_dir, name))
+                except OSError:
+                    pass
+
+
+def concat_rows(df, rows):
+    """Append ingested rows to a raw dataset frame, keeping its categorical columns categorical"""
+    full = pd.concat([df, align_rows(rows, df)], ignore_index=True)
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            full[col] = full[col].astype('category')
+    return full
+
+
+def align_rows(rows, df):
+    """Align ingested rows with the columns and dtypes of a raw dataset frame"""
+    unknown = [col for col in rows.columns if col not in df.columns]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(map(str, unknown))}")
+
+    rows = rows.reindex(columns=df.columns)
+    for col in df.columns:
+        if pd.api.types.is_bool_dtype(df[col]):
+            continue
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            # Parsed date columns; missing dates are filled from the raw date column on prepare
+            rows[col] = pd.to_datetime(rows[col], errors='coerce')
+        elif pd.api.types.is_numeric_dtype(df[col]):
+            rows[col] = pd.to_numeric(rows[col], errors='coerce')
+        else:
+            rows[col] = rows[col].astype(object)
+    return rows
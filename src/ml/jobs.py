@@ -0,0 +1,299 @@
+import multiprocessing
+import os
+import threading
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+# Progress events from worker processes, set by _init_worker
+_events = None
+
+
+def _init_worker(events):
+    global _events
+    _events = events
+
+
+class TrainingInProgressError(Exception):
+    """Raised when a category has no model to serve yet because its training job is still running"""
+
+    def __init__(self, category, job_id):
+        super().__init__(f"The {category} model is still training")
+        self.category = category
+        self.job_id = job_id
+
+
+def train_category_job(job_id, category, dataset_path, cache_dir, n_jobs=None):
+    """
+    Train a category model in a worker process and save it to the shared registry.
+    Training holds the registry's lock file of the category, so when another process
+    was already training it the job waits and reuses that model instead.
+    """
+    from functools import partial
+    from .dataset_loader import DatasetLoader
+    from .ingest import IngestStore
+    from .model import MarketAnalysisModel
+    from .model_registry import ModelRegistry
+    from .schemas import get_schema
+    from .streaming import should_stream, stream_category
+
+    def progress(stage, candidate, status, metrics=None):
+        if _events is not None:
+            _events.put((job_id, stage, candidate, status, metrics))
+
+    progress('job', None, 'running')
+    loader = DatasetLoader(os.path.join(cache_dir, 'datasets'))
+    registry = ModelRegistry(os.path.join(cache_dir, 'models'), model_factory=partial(MarketAnalysisModel, n_jobs=n_jobs))
+    ingest_store = IngestStore(os.path.join(cache_dir, 'ingest'))
+    fingerprint = loader.fingerprint(dataset_path)
+
+    with registry.training_lock(category, fingerprint) as waited:
+        trained = registry.lookup(category, fingerprint) if waited else None
+        if trained is not None:
+            model, metrics = trained
+            return {'best_model': model.best_model_name, 'metrics': metrics, 'reused': True}
+
+        # The frame the app trains on inline: the dataset with its ingested rows
+        if should_stream(dataset_path):
+            # Files too large to load whole train on a bounded sample of their rows
+            df = stream_category(dataset_path, category, extra_rows=ingest_store.rows(category, fingerprint)).sample
+        else:
+            df = ingest_store.prepared(category, fingerprint,
+                                       loader.load(dataset_path, copy=False, schema=get_schema(category)))
+        model, metrics = registry.train(category, fingerprint, df, progress_callback=progress)
+    return {'best_model': model.best_model_name, 'metrics': metrics}
+
+
+class TrainingScheduler:
+    """
+    Runs model training in a process pool so requests never wait on fitting.
+    Each submitted job gets an id whose status, per-candidate progress and
+    result can be polled. Trained models are written to the shared on-disk
+    model registry, where request handlers pick them up.
+    Each job fits candidates with n_jobs workers (default: MARKET_TRAINING_N_JOBS,
+    else the cores shared out between the pool's workers), so concurrent jobs do
+    not each claim every core.
+    """
+
+    def __init__(self, cache_dir='.cache', max_workers=2, n_jobs=None):
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        if n_jobs is None:
+            n_jobs = int(os.environ.get('MARKET_TRAINING_N_JOBS', 0)) or max(1, (os.cpu_count() or 1) // max_workers)
+        self.n_jobs = n_jobs
+        self._jobs = {}
+        self._active = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._events = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn keeps workers clear of the parent's threads and OpenMP state
+                context = multiprocessing.get_context('spawn')
+                self._events = context.Queue()
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=context,
+                    initializer=_init_worker,
+                    initargs=(self._events,)
+                )
+                threading.Thread(target=self._drain_events, daemon=True).start()
+            return self._executor
+
+    def submit(self, category, dataset_path):
+        """Queue a training job for a category; returns the id of the job (an existing one if already queued)"""
+        key = category.lower()
+        with self._lock:
+            active_id = self._active.get(key)
+            if active_id is not None:
+                return active_id
+
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                'id': job_id,
+                'category': category,
+                'status': 'queued',
+                'submitted_at': datetime.now().isoformat(),
+                'started_at': None,
+                'finished_at': None,
+                'progress': {},
+                'result': None,
+                'error': None
+            }
+            self._active[key] = job_id
+
+        try:
+            future = self._get_executor().submit(train_category_job, job_id, category, dataset_path, self.cache_dir,
+                                                 self.n_jobs)
+        except Exception as e:
+            self._finish(job_id, error=str(e))
+            raise
+        future.add_done_callback(lambda f: self._on_done(job_id, f))
+        return job_id
+
+    def get_job(self, job_id):
+        """Get a snapshot of a job's state, or None for unknown ids"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            snapshot = dict(job)
+            snapshot['progress'] = {stage: dict(candidates) for stage, candidates in job['progress'].items()}
+            return snapshot
+
+    def is_training(self, category):
+        """Whether a job for the category is queued or running"""
+        with self._lock:
+            return category.lower() in self._active
+
+    def active_job(self, category):
+        """Id of the queued or running job of a category, or None"""
+        with self._lock:
+            return self._active.get(category.lower())
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def _drain_events(self):
+        while True:
+            try:
+                job_id, stage, candidate, status, metrics = self._events.get()
+            except (EOFError, OSError):
+                return
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    continue
+                if stage == 'job':
+                    if job['status'] == 'queued':
+                        job['status'] = status
+                        job['started_at'] = datetime.now().isoformat()
+                    continue
+                entry = {'status': status}
+                if metrics is not None:
+                    entry['metrics'] = metrics
+                job['progress'].setdefault(stage, {})[candidate] = entry
+
+    def _on_done(self, job_id, future):
+        try:
+            self._finish(job_id, result=future.result())
+        except BrokenProcessPool as e:
+            # A worker died; start a fresh pool for the next job
+            with self._lock:
+                self._executor = None
+            self._finish(job_id, error=str(e))
+        except Exception as e:
+            print(f"Training job {job_id} failed: {str(e)}")
+            traceback.print_exc()
+            self._finish(job_id, error=str(e))
+
+    def _finish(self, job_id, result=None, error=None):
+        with self._lock:
+            job = self._jobs[job_id]
+            job['status'] = 'failed' if error else 'completed'
+            job['finished_at'] = datetime.now().isoformat()
+            job['result'] = result
+            job['error'] = error
+            self._active.pop(job['category'].lower(), None)
+
+
+class CategoryWarmup:
+    """
+    Warms the categories of a worker at startup, in a background thread.
+    A category whose current model is already in the registry is ready as soon
+    as the model is loaded; the others are queued on the training scheduler and
+    become ready when their job completes, so each category is served as early
+    as it can be instead of after the slowest one. When several workers start
+    together, the registry's lock files let one of them train each category
+    while the jobs of the others wait for its model.
+    """
+
+    def __init__(self, dataset_loader, model_registry, training_scheduler):
+        self.dataset_loader = dataset_loader
+        self.model_registry = model_registry
+        self.training_scheduler = training_scheduler
+        self._categories = {}
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self, datasets):
+        """Start warming up categories ({category: dataset path}); returns right away"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            for category, dataset_path in datasets.items():
+                self._categories[category] = {'path': dataset_path, 'status': 'pending', 'job_id': None, 'error': None}
+        threading.Thread(target=self._warm_all, daemon=True).start()
+
+    def _warm_all(self):
+        from .schemas import get_schema
+        from .streaming import should_stream
+        for category in list(self._categories):
+            self._set(category, status='loading')
+            try:
+                dataset_path = self._categories[category]['path']
+                if not should_stream(dataset_path):
+                    self.dataset_loader.load(dataset_path, schema=get_schema(category))
+                if self.model_registry.lookup(category, self.dataset_loader.fingerprint(dataset_path)) is not None:
+                    self._set(category, status='ready')
+                else:
+                    self._set(category, status='training',
+                              job_id=self.training_scheduler.submit(category, dataset_path))
+            except Exception as e:
+                print(f"Warning: Could not warm up {category}: {str(e)}")
+                self._set(category, status='failed', error=str(e))
+
+    def _set(self, category, **fields):
+        with self._lock:
+            self._categories[category].update(fields)
+
+    def status(self, category=None):
+        """Warm-up status of one category, or of all categories when category is None"""
+        with self._lock:
+            names = list(self._categories) if category is None else [category]
+        if category is not None and category not in self._categories:
+            return None
+        statuses = {name: self._refresh(name) for name in names}
+        return statuses if category is None else statuses[category]
+
+    def _refresh(self, category):
+        with self._lock:
+            entry = dict(self._categories[category])
+        if entry['status'] == 'training':
+            job = self.training_scheduler.get_job(entry['job_id'])
+            if job is not None and job['status'] == 'completed':
+                fingerprint = self.dataset_loader.fingerprint(entry['path'])
+                if self.model_registry.lookup(category, fingerprint) is not None:
+                    self._set(category, status='ready')
+                    entry['status'] = 'ready'
+            elif job is not None and job['status'] == 'failed':
+                self._set(category, status='failed', error=job['error'])
+                entry.update(status='failed', error=job['error'])
+
+        # While training, a category is still servable with its previous model
+        servable = entry['status'] == 'ready' or (
+            entry['status'] == 'training' and self.model_registry.get_latest(category) is not None
+        )
+        return {'status': entry['status'], 'servable': servable, 'job_id': entry['job_id'], 'error': entry['error']}
+
+    def is_ready(self, category=None):
+        """
+        Whether a category (or, when category is None, at least one category) can be
+        served. A worker that never started warming up is always ready.
+        """
+        with self._lock:
+            started = self._started
+        if not started:
+            return True
+        statuses = self.status()
+        if category is None:
+            return any(entry['servable'] for entry in statuses.values())
+        return category in statuses and statuses[category]['servable']
@@ -1,13 +1,25 @@
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
-from sklearn.linear_model import LinearRegression
 from sklearn.preprocessing import StandardScaler, LabelEncoder
-from sklearn.model_selection import TimeSeriesSplit, cross_val_score
-from sklearn.metrics import mean_absolute_error, r2_score, mean_squared_error
+from sklearn.model_selection import KFold
+import time
 import warnings
+from .model_selection import (run_fit_tasks, resolve_selection, select_best, successive_halving,
+                              build_candidates)
+from .feature_store import encode_labels
+from .schemas import SCHEMAS, get_schema
 warnings.filterwarnings('ignore')
 
+# Price segments, as five equal-width price bands
+PRICE_SEGMENTS = ['Budget', 'Mid-Low', 'Mid', 'Mid-High', 'Premium']
+
+# Candidate models as (module, class, parameters), built when training needs them
+CANDIDATE_MODELS = {
+    'random_forest': ('sklearn.ensemble', 'RandomForestRegressor', {'n_estimators': 100, 'random_state': 42}),
+    'gradient_boosting': ('sklearn.ensemble', 'GradientBoostingRegressor', {'n_estimators': 100, 'random_state': 42}),
+    'linear_regression': ('sklearn.linear_model', 'LinearRegression', {})
+}
+
 class MarketCoveragePredictor:
     """
     Advanced ML Model specifically designed to predict market coverage of products.
@@ -15,208 +27,100 @@ class MarketCoveragePredictor:
     that a product or brand captures.
     """
     
-    def __init__(self):
-        self.models = {
-            'random_forest': RandomForestRegressor(n_estimators=100, random_state=42),
-            'gradient_boosting': GradientBoostingRegressor(n_estimators=100, random_state=42),
-            'linear_regression': LinearRegression()
-        }
+    def __init__(self, n_jobs=None, selection=None, time_budget=None):
+        self.candidate_specs = dict(CANDIDATE_MODELS)
+        self._models = None
         self.scaler = StandardScaler()
         self.label_encoders = {}
         self.best_model = None
         self.best_model_name = None
+        self.n_jobs = n_jobs
+        self.selection, self.time_budget = resolve_selection(selection, time_budget)
+        self.selection_report = None
+        self.feature_columns = []
         self.market_share_data = {}
         
-    def prepare_data_for_market_coverage(self, df, category):
+    @property
+    def models(self):
+        """Candidate models, built on first use"""
+        if self._models is None:
+            self._models = build_candidates(self.candidate_specs)
+        return self._models
+    
+    def prepare_data_for_market_coverage(self, df, category, fit=True):
         """
-        Prepare data specifically for market coverage prediction based on category
+        Prepare data specifically for market coverage prediction, adding the
+        coverage features declared by the category schema. With fit=False the
+        fitted label encoders only transform, and the predictor is not modified.
         """
         try:
-            df_processed = df.copy()
-            
-            if category.lower() == 'smartphones':
-                df_processed = self._prepare_smartphones_data(df_processed)
-            elif category.lower() == 'electronics':
-                df_processed = self._prepare_electronics_data(df_processed)
-            elif category.lower() == 'fashion':
-                df_processed = self._prepare_fashion_data(df_processed)
-            elif category.lower() == 'groceries':
-                df_processed = self._prepare_groceries_data(df_processed)
-            elif category.lower() == 'stocks':
-                df_processed = self._prepare_stocks_data(df_processed)
-            else:
+            if category.lower() not in SCHEMAS:
                 raise ValueError(f"Category {category} not supported")
-                
+            schema = SCHEMAS[category.lower()]
+            
+            # Preparation only adds or replaces columns, so a shallow copy keeps df intact
+            df_processed = schema.prepare(df.copy(deep=False))
+            total_sales = df_processed['sales'].sum()
+            
+            # Market share of each value of the share columns
+            for feature, col in schema.coverage_shares.items():
+                if col in df_processed.columns:
+                    df_processed[feature] = df_processed.groupby(col, observed=True)['sales'].transform('sum') / total_sales * 100
+            
+            # Price segmentation; rows without a price get no segment
+            if schema.price_column in df_processed.columns:
+                prices = pd.to_numeric(df_processed[schema.price_column], errors='coerce')
+                known = prices.dropna()
+                if len(known):
+                    df_processed['price_segment'] = pd.cut(known, bins=5, labels=PRICE_SEGMENTS).reindex(prices.index)
+                else:
+                    df_processed['price_segment'] = pd.Categorical([None] * len(prices), categories=PRICE_SEGMENTS)
+            
+            # Encode categorical variables
+            for col in schema.coverage_encode_columns:
+                # Columns already encoded by category processing keep their encoding
+                if col in df_processed.columns and f'{col}_encoded' not in df_processed.columns:
+                    try:
+                        df_processed[f'{col}_encoded'] = encode_labels(self.label_encoders, col,
+                                                                       df_processed[col].astype(str), fit)
+                    except Exception as e:
+                        print(f"Warning: Could not encode {col}: {str(e)}")
+                        continue
+            
+            # Numbers embedded in text columns (e.g. storage and memory sizes)
+            for feature, col in schema.extract_numeric.items():
+                if col in df_processed.columns:
+                    df_processed[feature] = df_processed[col].astype(str).str.extract(r'(\d+)', expand=False).astype(float)
+            
+            # Rating impact on market coverage
+            if schema.rating_column in df_processed.columns:
+                df_processed['rating_score'] = df_processed[schema.rating_column]
+            
+            # Market coverage target (percentage of total market captured)
+            df_processed['market_coverage'] = (df_processed['sales'] / total_sales) * 100
+            
             return df_processed
             
         except Exception as e:
             raise ValueError(f"Error preparing data for {category}: {str(e)}")
     
-    def _prepare_smartphones_data(self, df):
-        """Prepare smartphones data for market coverage prediction"""
-        # Create sales volume if missing
-        if 'sales' not in df.columns:
-            if 'Selling Price' in df.columns and 'Original Price' in df.columns:
-                # Calculate sales based on price and discount
-                df['sales'] = df['Selling Price'] * np.random.uniform(10, 1000, len(df))
-            else:
-                df['sales'] = np.random.uniform(100, 10000, len(df))
-        
-        # Create date if missing
-        if 'date' not in df.columns:
-            df['date'] = pd.date_range(start='2020-01-01', periods=len(df), freq='D')
-        
-        # Market coverage features for smartphones
-        df['brand_market_share'] = df.groupby('Brands')['sales'].transform('sum') / df['sales'].sum() * 100
-        df['price_segment'] = pd.cut(df['Selling Price'], bins=5, labels=['Budget', 'Mid-Low', 'Mid', 'Mid-High', 'Premium'])
-        
-        # Encode categorical variables
-        for col in ['Brands', 'Colors', 'price_segment']:
-            if col in df.columns:
-                if col not in self.label_encoders:
-                    self.label_encoders[col] = LabelEncoder()
-                try:
-                    df[f'{col}_encoded'] = self.label_encoders[col].fit_transform(df[col].astype(str))
-                except Exception as e:
-                    print(f"Warning: Could not encode {col}: {str(e)}")
-                    continue
-        
-        # Storage and memory features
-        if 'Storage' in df.columns:
-            df['storage_numeric'] = df['Storage'].str.extract('(\d+)').astype(float)
-        if 'Memory' in df.columns:
-            df['memory_numeric'] = df['Memory'].str.extract('(\d+)').astype(float)
-            
-        # Rating impact on market coverage
-        if 'Rating' in df.columns:
-            df['rating_score'] = df['Rating']
-        
-        # Market coverage target (percentage of total market captured)
-        total_market_value = df['sales'].sum()
-        df['market_coverage'] = (df['sales'] / total_market_value) * 100
-        
-        return df
-    
-    def _prepare_electronics_data(self, df):
-        """Prepare electronics data for market coverage prediction"""
-        # Clean data
-        df = df[df['Order ID'] != 'Order ID']  # Remove header rows
-        
-        # Create proper sales column
-        if 'Price Each' in df.columns and 'Quantity Ordered' in df.columns:
-            df['Price Each'] = pd.to_numeric(df['Price Each'], errors='coerce')
-            df['Quantity Ordered'] = pd.to_numeric(df['Quantity Ordered'], errors='coerce')
-            df['sales'] = df['Price Each'] * df['Quantity Ordered']
-        
-        # Handle date
-        if 'Order Date' in df.columns:
-            df['date'] = pd.to_datetime(df['Order Date'], errors='coerce')
-        
-        # Product market share
-        df['product_market_share'] = df.groupby('Product')['sales'].transform('sum') / df['sales'].sum() * 100
-        
-        # Price segmentation
-        df['price_segment'] = pd.cut(df['Price Each'], bins=5, labels=['Budget', 'Mid-Low', 'Mid', 'Mid-High', 'Premium'])
-        
-        # Encode categorical variables
-        for col in ['Product', 'price_segment']:
-            if col in df.columns:
-                if col not in self.label_encoders:
-                    self.label_encoders[col] = LabelEncoder()
-                try:
-                    df[f'{col}_encoded'] = self.label_encoders[col].fit_transform(df[col].astype(str))
-                except Exception as e:
-                    print(f"Warning: Could not encode {col}: {str(e)}")
-                    continue
-        
-        # Market coverage calculation
-        total_market_value = df['sales'].sum()
-        df['market_coverage'] = (df['sales'] / total_market_value) * 100
-        
-        return df
-    
-    def _prepare_fashion_data(self, df):
-        """Prepare fashion data for market coverage prediction"""
-        # Sales column
-        if 'sales' not in df.columns:
-            df['sales'] = np.random.uniform(100, 5000, len(df))
-        
-        # Date column
-        if 'date' not in df.columns:
-            df['date'] = pd.date_range(start='2020-01-01', periods=len(df), freq='D')
-        
-        # Fashion-specific market coverage features
-        if 'Category' in df.columns:
-            df['category_market_share'] = df.groupby('Category')['sales'].transform('sum') / df['sales'].sum() * 100
-            if 'Category' not in self.label_encoders:
-                self.label_encoders['Category'] = LabelEncoder()
-                df['Category_encoded'] = self.label_encoders['Category'].fit_transform(df['Category'].astype(str))
-        
-        # Market coverage calculation
-        total_market_value = df['sales'].sum()
-        df['market_coverage'] = (df['sales'] / total_market_value) * 100
-        
-        return df
-    
-    def _prepare_groceries_data(self, df):
-        """Prepare groceries data for market coverage prediction"""
-        # Clean and prepare grocery data
-        if 'sales' not in df.columns and 'Sales' in df.columns:
-            df['sales'] = pd.to_numeric(df['Sales'], errors='coerce')
-        
-        if 'date' not in df.columns and 'Order_Date' in df.columns:
-            df['date'] = pd.to_datetime(df['Order_Date'], errors='coerce')
-        
-        # Category-based market share
-        if 'Category' in df.columns:
-            df['category_market_share'] = df.groupby('Category')['sales'].transform('sum') / df['sales'].sum() * 100
-        
-        # Regional coverage
-        if 'Region' in df.columns:
-            df['regional_coverage'] = df.groupby('Region')['sales'].transform('sum') / df['sales'].sum() * 100
-        
-        # Encode categorical variables
-        for col in ['Category', 'Region', 'Customer_Segment']:
-            if col in df.columns:
-                if col not in self.label_encoders:
-                    self.label_encoders[col] = LabelEncoder()
-                try:
-                    df[f'{col}_encoded'] = self.label_encoders[col].fit_transform(df[col].astype(str))
-                except Exception as e:
-                    print(f"Warning: Could not encode {col}: {str(e)}")
-                    continue
-        
-        # Market coverage calculation
-        total_market_value = df['sales'].sum()
-        df['market_coverage'] = (df['sales'] / total_market_value) * 100
-        
-        return df
-    
-    def _prepare_stocks_data(self, df):
-        """Prepare stocks data for market coverage prediction"""
-        # For stocks, market coverage can be based on market cap and trading volume
-        if 'sales' not in df.columns:
-            # Create synthetic sales data for stocks based on market activity
-            df['sales'] = np.random.uniform(1000000, 100000000, len(df))
-        
-        if 'date' not in df.columns:
-            df['date'] = pd.date_range(start='2020-01-01', periods=len(df), freq='D')
-        
-        # Stock market coverage features
-        if 'Market' in df.columns:
-            df['market_segment_share'] = df.groupby('Market')['sales'].transform('sum') / df['sales'].sum() * 100
-        
-        # Market coverage calculation for stocks
-        total_market_value = df['sales'].sum()
-        df['market_coverage'] = (df['sales'] / total_market_value) * 100
-        
-        return df
+    def _prepare_for_serving(self, df, category):
+        """
+        Data preparation for request-time paths, encoding with the label encoders
+        fitted in training, so a published model is never modified while serving
+        """
+        return self.prepare_data_for_market_coverage(df, category, fit=False)
     
-    def train_market_coverage_model(self, df, category):
-        """Train the model specifically for market coverage prediction"""
+    def train_market_coverage_model(self, df, category, progress_callback=None, prepared=False, deadline=None):
+        """
+        Train the model specifically for market coverage prediction.
+        prepared=True means df already went through prepare_data_for_market_coverage
+        (e.g. a FeatureSet coverage frame). Successive halving stops at deadline
+        (a time.time() value) when given, else after the time budget.
+        """
         try:
             # Prepare data
-            df_processed = self.prepare_data_for_market_coverage(df, category)
+            df_processed = df if prepared else self.prepare_data_for_market_coverage(df, category)
             
             # Select features for training
             feature_columns = [col for col in df_processed.columns if col.endswith('_encoded') or 
@@ -228,7 +132,8 @@ class MarketCoveragePredictor:
             if not feature_columns:
                 # Use numeric columns as fallback
                 numeric_columns = df_processed.select_dtypes(include=[np.number]).columns
-                feature_columns = [col for col in numeric_columns if col not in ['market_coverage', 'sales']]
+                excluded = ['market_coverage', 'sales'] + get_schema(category).target_columns()
+                feature_columns = [col for col in numeric_columns if col not in excluded]
             
             if not feature_columns:
                 raise ValueError("No suitable features found for training")
@@ -243,39 +148,41 @@ class MarketCoveragePredictor:
             y = df_processed['market_coverage']
             
             # Train models and select best one
-            best_score = float('-inf')
-            model_metrics = {}
-            
-            for name, model in self.models.items():
-                try:
-                    # Use cross-validation for model evaluation
-                    scores = cross_val_score(model, X, y, cv=5, scoring='r2')
-                    avg_score = np.mean(scores)
-                    
-                    # Train on full dataset
-                    model.fit(X, y)
-                    y_pred = model.predict(X)
-                    
-                    # Calculate detailed metrics
-                    mae = mean_absolute_error(y, y_pred)
-                    rmse = np.sqrt(mean_squared_error(y, y_pred))
-                    r2 = r2_score(y, y_pred)
-                    
-                    model_metrics[name] = {
-                        'MAE': mae,
-                        'RMSE': rmse,
-                        'R2': r2,
-                        'CV_Score': avg_score
-                    }
-                    
-                    if avg_score > best_score:
-                        best_score = avg_score
-                        self.best_model = model
-                        self.best_model_name = name
-                        
-                except Exception as e:
-                    print(f"Error training {name}: {str(e)}")
-                    continue
+            start = time.monotonic()
+            names = list(self.models)
+            if self.selection == 'halving':
+                def evaluate(candidates, fraction, n_splits, deadline):
+                    rows = min(len(X), max(int(len(X) * fraction), 10 * n_splits))
+                    if rows == len(X):
+                        return self._cross_validate(candidates, X, y, n_splits, deadline)
+                    # Fixed-seed sample, so repeated training picks the same rows
+                    sample = np.sort(np.random.RandomState(42).choice(len(X), rows, replace=False))
+                    return self._cross_validate(candidates, X.iloc[sample], y.iloc[sample], n_splits, deadline)
+                
+                best_name, results, report = successive_halving(
+                    names, evaluate, 5, 'CV_Score', time_budget=self.time_budget,
+                    stage_name='market_coverage_model', progress_callback=progress_callback, deadline=deadline
+                )
+            else:
+                if progress_callback:
+                    for name in names:
+                        progress_callback('market_coverage_model', name, 'running')
+                results = self._cross_validate(names, X, y, 5)
+                if progress_callback:
+                    for name in names:
+                        if name in results:
+                            progress_callback('market_coverage_model', name, 'completed', results[name]['metrics'])
+                        else:
+                            progress_callback('market_coverage_model', name, 'failed')
+                best_name = select_best(results, names, 'CV_Score')
+                report = {'strategy': 'exhaustive'}
+            
+            model_metrics = {name: results[name]['metrics'] for name in names if name in results}
+            if best_name is not None:
+                self.best_model = results[best_name]['model']
+                self.best_model_name = best_name
+            report['time_spent'] = round(time.monotonic() - start, 3)
+            self.selection_report = report
             
             if self.best_model is None:
                 raise ValueError("No model could be trained successfully")
@@ -288,17 +195,80 @@ class MarketCoveragePredictor:
         except Exception as e:
             raise ValueError(f"Error training market coverage model: {str(e)}")
     
-    def predict_market_coverage(self, df, category, product_name=None, brand=None):
-        """Predict market coverage for specific products or overall"""
+    def _cross_validate(self, names, X, y, n_splits, deadline=None):
+        """
+        Score the named candidates by K-fold cross-validation and refit them on all
+        given rows; the folds and the refits are fitted in parallel. Returns
+        {name: {'metrics', 'model'}} for the candidates whose refit succeeded.
+        No fit starts after deadline.
+        """
+        splits = list(KFold(n_splits=n_splits).split(X))
+        all_rows = np.arange(len(X))
+        tasks = []
+        for name in names:
+            tasks.extend((name, train_idx, val_idx, False) for train_idx, val_idx in splits)
+            tasks.append((name, all_rows, all_rows, True))
+        results = run_fit_tasks(self.models, X, y, tasks, self.n_jobs, deadline)
+        
+        trained = {}
+        for name in names:
+            candidate_results = [result for task, result in zip(tasks, results) if task[0] == name]
+            full_scores, full_model, full_error = candidate_results[-1]
+            if full_error:
+                print(f"Error training {name}: {full_error}")
+                continue
+            
+            # Failed folds score NaN, like cross_val_score
+            avg_score = np.mean([scores['R2'] if scores else np.nan for scores, _, _ in candidate_results[:-1]])
+            
+            trained[name] = {
+                'metrics': {
+                    'MAE': full_scores['MAE'],
+                    'RMSE': full_scores['RMSE'],
+                    'R2': full_scores['R2'],
+                    'CV_Score': avg_score
+                },
+                'model': full_model
+            }
+        
+        return trained
+    
+    def export_state(self):
+        """Get the fitted state needed to serve predictions without retraining"""
+        return {
+            'best_model': self.best_model,
+            'best_model_name': self.best_model_name,
+            'scaler': self.scaler,
+            'label_encoders': self.label_encoders,
+            'feature_columns': self.feature_columns
+        }
+    
+    def load_state(self, state):
+        """Restore a state produced by export_state"""
+        self.best_model = state['best_model']
+        self.best_model_name = state['best_model_name']
+        self.scaler = state['scaler']
+        self.label_encoders = state['label_encoders']
+        self.feature_columns = state['feature_columns']
+    
+    def predict_market_coverage(self, df, category, product_name=None, brand=None, index=None, prepared=False):
+        """
+        Predict market coverage for specific products or overall.
+        index is an optional EntityIndex of df used to find the product's rows;
+        prepared=True skips data preparation for an already prepared frame.
+        """
         try:
             if self.best_model is None:
                 raise ValueError("Model not trained yet")
             
             # Prepare data
-            df_processed = self.prepare_data_for_market_coverage(df, category)
+            df_processed = df if prepared else self._prepare_for_serving(df, category)
             
             # Filter for specific product/brand if specified
-            if product_name:
+            if product_name and index is not None and index.size == len(df_processed):
+                other = index.positions('Brands', brand) if brand else index.positions('Mobile', product_name)
+                df_processed = df_processed.iloc[np.union1d(index.positions('Product', product_name), other)]
+            elif product_name:
                 if brand:
                     mask = (df_processed.get('Product', '') == product_name) | (df_processed.get('Brands', '') == brand)
                 else:
@@ -346,10 +316,64 @@ class MarketCoveragePredictor:
         except Exception as e:
             raise ValueError(f"Error predicting market coverage: {str(e)}")
     
-    def analyze_market_coverage_factors(self, df, category):
+    def predict_market_coverage_bulk(self, df, category, keys, prepared=False):
+        """
+        Predict market coverage for every product or brand at once.
+        Prepares features and runs the model a single time over the whole category,
+        then aggregates the predictions per entity. Returns {entity key: result}
+        in the predict_market_coverage format, keyed by the value of the single
+        key column or by a tuple when several key columns are given.
+        """
+        try:
+            if self.best_model is None:
+                raise ValueError("Model not trained yet")
+            
+            df_processed = df if prepared else self._prepare_for_serving(df, category)
+            keys = [col for col in keys if col in df_processed.columns]
+            if not keys or df_processed.empty:
+                return {}
+            
+            available_features = [col for col in self.feature_columns if col in df_processed.columns]
+            if not available_features:
+                return {}
+            
+            X = df_processed[available_features].fillna(0)
+            predictions = pd.Series(self.best_model.predict(X), index=df_processed.index)
+            
+            # Per-entity coverage statistics in one grouped pass (rows keep their data order)
+            grouped = predictions.groupby([df_processed[col] for col in keys], sort=False, observed=True)
+            stats = grouped.agg(['mean', 'max', 'first', 'last', 'size'])
+            stats['market_position'] = np.select(
+                [stats['mean'] > 20, stats['mean'] > 10, stats['mean'] > 5],
+                ['Dominant', 'Strong', 'Moderate'],
+                default='Niche'
+            )
+            stats['coverage_trend'] = np.where(
+                (stats['size'] > 1) & (stats['last'] > stats['first']), 'Increasing', 'Stable/Decreasing'
+            )
+            
+            values = predictions.to_numpy()
+            positions = grouped.indices
+            results = {}
+            for key, row in stats.iterrows():
+                avg_coverage = round(float(row['mean']), 2)
+                results[key] = {
+                    "average_market_coverage": avg_coverage,
+                    "maximum_market_coverage": round(float(row['max']), 2),
+                    "market_position": row['market_position'],
+                    "coverage_trend": row['coverage_trend'],
+                    "predictions": values[positions[key]].tolist(),
+                    "total_addressable_market_captured": avg_coverage
+                }
+            return results
+            
+        except Exception as e:
+            raise ValueError(f"Error predicting market coverage: {str(e)}")
+    
+    def analyze_market_coverage_factors(self, df, category, prepared=False):
         """Analyze factors that influence market coverage"""
         try:
-            df_processed = self.prepare_data_for_market_coverage(df, category)
+            df_processed = df if prepared else self._prepare_for_serving(df, category)
             
             # Get feature importance if available
             insights = {}
@@ -0,0 +1,202 @@
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+import joblib
+from .timing import span
+
+try:
+    import fcntl
+except ImportError:  # Windows: training is only coordinated within a process
+    fcntl = None
+
+# Bump when training, feature or processing code changes in a way that makes
+# previously saved models unusable
+MODEL_VERSION = 2
+
+
+class ModelRegistry:
+    """
+    Persists fitted per-category models so requests can be served without retraining.
+    Entries are keyed by the dataset fingerprint, MODEL_VERSION and the candidate
+    model configuration; a category is retrained only when one of them changes.
+    With mmap=True (default: off, on with MARKET_SHARED_DATASETS=1) models are loaded with
+    their arrays memory-mapped read-only, so workers share one copy of them.
+    """
+
+    def __init__(self, registry_dir='.cache/models', model_factory=None, mmap=None):
+        self.registry_dir = registry_dir
+        self._model_factory = model_factory
+        if mmap is None:
+            mmap = os.environ.get('MARKET_SHARED_DATASETS', '0') == '1'
+        self.mmap_mode = 'r' if mmap else None
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._train_locks = {}
+        self._config_signature = None
+
+    @property
+    def model_factory(self):
+        """The model class, imported on first use so creating a registry stays cheap"""
+        if self._model_factory is None:
+            from .model import MarketAnalysisModel
+            self._model_factory = MarketAnalysisModel
+        return self._model_factory
+
+    def make_key(self, category, fingerprint, config=None):
+        """Build the registry key for a category, dataset version and model config"""
+        payload = json.dumps({
+            'category': category.lower(),
+            'fingerprint': fingerprint,
+            'model_version': MODEL_VERSION,
+            'config': config
+        }, sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    def _entry_path(self, category, key):
+        return os.path.join(self.registry_dir, f'{category.lower()}-{key[:16]}.joblib')
+
+    @contextmanager
+    def training_lock(self, category, fingerprint):
+        """
+        Hold the lock file of a category's current registry entry, so processes sharing
+        the registry train it one at a time. Yields whether another process held the
+        lock first, in which case the entry it trained may be in the registry by now.
+        """
+        path = f'{self._entry_path(category, self.current_key(category, fingerprint))[:-len(".joblib")]}.lock'
+        os.makedirs(self.registry_dir, exist_ok=True)
+        with open(path, 'a') as lock_file:
+            if fcntl is None:
+                yield False
+                return
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                waited = False
+            except BlockingIOError:
+                with span('wait_training'):
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                waited = True
+            try:
+                yield waited
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def get(self, category, key):
+        """Get a (model, metrics) pair for a key from memory or disk, or None"""
+        with self._lock:
+            entry = self._entries.get(category.lower())
+        if entry is not None and entry['key'] == key:
+            return entry['model'], entry['metrics']
+
+        path = self._entry_path(category, key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with span('load_model'):
+                saved = joblib.load(path, mmap_mode=self.mmap_mode)
+            if saved.get('key') != key:
+                return None
+            model = self.model_factory()
+            model.load_state(saved['state'])
+        except Exception as e:
+            print(f"Warning: Could not load saved model for {category}: {str(e)}")
+            return None
+
+        self._remember(category, key, model, saved['metrics'])
+        return model, saved['metrics']
+
+    def put(self, category, key, model, metrics):
+        """Save a trained model for a key and drop older entries of the category"""
+        self._remember(category, key, model, metrics)
+        path = self._entry_path(category, key)
+        try:
+            os.makedirs(self.registry_dir, exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            joblib.dump({
+                'key': key,
+                'category': category.lower(),
+                'model_version': MODEL_VERSION,
+                'trained_at': datetime.now().isoformat(),
+                'state': model.export_state(),
+                'metrics': metrics
+            }, tmp_path)
+            os.replace(tmp_path, path)
+            self._prune(category, keep=path)
+        except Exception as e:
+            print(f"Warning: Could not save model for {category}: {str(e)}")
+
+    def current_key(self, category, fingerprint):
+        """Get the key a model trained now on this dataset version would be saved under"""
+        if self._config_signature is None:
+            self._config_signature = self.model_factory().config_signature()
+        return self.make_key(category, fingerprint, self._config_signature)
+
+    def lookup(self, category, fingerprint):
+        """Get the (model, metrics) pair for the current dataset version without training, or None"""
+        return self.get(category, self.current_key(category, fingerprint))
+
+    def get_latest(self, category):
+        """Get the most recently trained (model, metrics) pair for a category, whatever its key"""
+        with self._lock:
+            entry = self._entries.get(category.lower())
+        if entry is not None:
+            return entry['model'], entry['metrics']
+
+        prefix = f'{category.lower()}-'
+        try:
+            names = [name for name in os.listdir(self.registry_dir)
+                     if name.startswith(prefix) and name.endswith('.joblib')]
+        except OSError:
+            return None
+        for name in sorted(names, key=lambda n: os.path.getmtime(os.path.join(self.registry_dir, n)), reverse=True):
+            try:
+                saved = joblib.load(os.path.join(self.registry_dir, name))
+                return self.get(category, saved['key'])
+            except Exception as e:
+                print(f"Warning: Could not load saved model {name}: {str(e)}")
+        return None
+
+    def train(self, category, fingerprint, df, progress_callback=None, features=None):
+        """Train and save a model for a category, replacing any existing entry"""
+        model = self.model_factory()
+        key = self.make_key(category, fingerprint, model.config_signature())
+        with span('train'):
+            metrics = model.train(df, category, progress_callback=progress_callback, features=features)
+        self.put(category, key, model, metrics)
+        return model, metrics
+
+    def get_or_train(self, category, fingerprint, df, features=None):
+        """
+        Get the trained model for a category, training and saving it only when
+        no entry exists for the current dataset fingerprint and configuration.
+        """
+        cached = self.lookup(category, fingerprint)
+        if cached is not None:
+            return cached
+
+        # Concurrent requests for the same category, in this and other workers, wait for one training run
+        with self._lock:
+            train_lock = self._train_locks.setdefault(category.lower(), threading.Lock())
+        with train_lock, self.training_lock(category, fingerprint):
+            cached = self.lookup(category, fingerprint)
+            if cached is not None:
+                return cached
+            return self.train(category, fingerprint, df, features=features)
+
+    def _remember(self, category, key, model, metrics):
+        with self._lock:
+            self._entries[category.lower()] = {'key': key, 'model': model, 'metrics': metrics}
+
+    def _prune(self, category, keep):
+        # Lock files stay: removing one another process holds or is about to open would
+        # let a third process lock a new file of the same name and train alongside it
+        prefix = f'{category.lower()}-'
+        for name in os.listdir(self.registry_dir):
+            path = os.path.join(self.registry_dir, name)
+            if name.startswith(prefix) and name.endswith('.joblib') and path != keep:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
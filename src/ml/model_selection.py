@@ -0,0 +1,200 @@
+import importlib
+import math
+import os
+import time
+from importlib import metadata
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.metrics import mean_absolute_error, r2_score, mean_squared_error
+
+
+def resolve_n_jobs(n_jobs=None):
+    """Worker count for candidate fitting: the argument, else MARKET_MODEL_N_JOBS, else all cores"""
+    if n_jobs is None:
+        n_jobs = int(os.environ.get('MARKET_MODEL_N_JOBS', -1))
+    return n_jobs
+
+
+def _take(data, idx):
+    return data.iloc[idx] if hasattr(data, 'iloc') else data[idx]
+
+
+def fit_and_score(model, X, y, train_idx, val_idx, keep_model=False, deadline=None):
+    """
+    Fit a fresh clone of a model on the training rows and score it on the validation rows.
+    Returns (scores, fitted model or None, error message or None); failures are
+    reported rather than raised so one candidate cannot abort the others.
+    Once deadline (a time.time() value) has passed, nothing is fitted.
+    """
+    if deadline is not None and time.time() > deadline:
+        return None, None, 'time budget exhausted'
+    try:
+        estimator = clone(model)
+        estimator.fit(_take(X, train_idx), _take(y, train_idx))
+        y_val = _take(y, val_idx)
+        y_pred = estimator.predict(_take(X, val_idx))
+        scores = {
+            'MAE': mean_absolute_error(y_val, y_pred),
+            'RMSE': np.sqrt(mean_squared_error(y_val, y_pred)),
+            'R2': r2_score(y_val, y_pred)
+        }
+        return scores, estimator if keep_model else None, None
+    except Exception as e:
+        return None, None, str(e)
+
+
+def run_fit_tasks(candidates, X, y, tasks, n_jobs=None, deadline=None):
+    """
+    Run (candidate, split) fits in parallel.
+    tasks is a list of (candidate name, train_idx, val_idx, keep_model) tuples; the
+    results come back in task order, so selection on them is deterministic
+    whatever the worker count. Every fit starts from a clone of the candidate.
+    Fits that would start after deadline (a time.time() value) fail instead.
+    """
+    if not tasks:
+        return []
+    n_jobs = resolve_n_jobs(n_jobs)
+    return Parallel(n_jobs=n_jobs)(
+        delayed(fit_and_score)(candidates[name], X, y, train_idx, val_idx, keep_model, deadline)
+        for name, train_idx, val_idx, keep_model in tasks
+    )
+
+
+def resolve_selection(selection=None, time_budget=None):
+    """
+    Selection strategy and wall-clock budget (seconds): the arguments, else
+    MARKET_MODEL_SELECTION ('exhaustive' or 'halving') and MARKET_TRAINING_BUDGET.
+    The budget only applies to successive halving.
+    """
+    if selection is None:
+        selection = os.environ.get('MARKET_MODEL_SELECTION', 'exhaustive')
+    if selection not in ('exhaustive', 'halving'):
+        raise ValueError(f"Unknown model selection strategy: {selection}")
+    if time_budget is None and os.environ.get('MARKET_TRAINING_BUDGET'):
+        time_budget = float(os.environ['MARKET_TRAINING_BUDGET'])
+    return selection, time_budget
+
+
+def select_best(results, names, score_key):
+    """Name of the best-scoring candidate; ties and NaN scores never displace an earlier candidate"""
+    best_name, best_score = None, float('-inf')
+    for name in names:
+        if name in results and results[name]['metrics'][score_key] > best_score:
+            best_name, best_score = name, results[name]['metrics'][score_key]
+    return best_name
+
+
+def successive_halving(names, evaluate, max_splits, score_key, eta=2, time_budget=None,
+                       stage_name=None, progress_callback=None, deadline=None):
+    """
+    Successive-halving model selection under an optional wall-clock budget.
+    Every stage evaluates the surviving candidates on a larger share of the rows
+    with more folds, then keeps the best 1/eta of them; the last stage uses all
+    rows and max_splits folds. evaluate(names, fraction, n_splits, deadline) must
+    return {name: {'metrics': {...}, 'model': fitted model}} for the candidates
+    that trained, starting no fit after deadline.
+    The budget ends at deadline (a time.time() value, e.g. shared by several
+    selections), else time_budget seconds from now. A stage is not started when it
+    is projected to overrun it, and the stage it runs out in is the last; the best
+    model evaluated so far is returned. When it runs out before any candidate
+    trained, the first candidate is trained anyway, so there is always a model.
+    Returns (best name, latest result per candidate, report).
+    """
+    start = time.monotonic()
+    if deadline is None and time_budget is not None:
+        deadline = time.time() + time_budget
+    n_stages = max(1, math.ceil(math.log(len(names), eta))) if len(names) > 1 else 1
+    survivors = list(names)
+    latest = {}
+    report = {'strategy': 'successive_halving', 'eta': eta, 'time_budget': time_budget,
+              'timed_out': False, 'stages': []}
+    best_name = None
+    previous = None
+
+    def notify(candidates, status):
+        if progress_callback:
+            for name in candidates:
+                progress_callback(stage_name, name, status, latest[name]['metrics'] if name in latest else None)
+
+    for stage in range(n_stages):
+        fraction = float(eta) ** (stage - (n_stages - 1))
+        n_splits = max(2, max_splits - (n_stages - 1 - stage))
+
+        # Stop early when this stage is unlikely to fit in what is left of the budget
+        if previous is not None and deadline is not None:
+            seconds, prev_count, prev_splits = previous
+            projected = seconds * eta * (len(survivors) / prev_count) * (n_splits / prev_splits)
+            if time.time() + projected > deadline:
+                report['timed_out'] = True
+                break
+
+        notify(survivors, 'running')
+        stage_start = time.monotonic()
+        results = evaluate(survivors, fraction, n_splits, deadline)
+        timed_out = deadline is not None and time.time() > deadline
+        if timed_out:
+            report['timed_out'] = True
+            if not results and best_name is None:
+                results = evaluate(survivors[:1], fraction, n_splits, None)
+        seconds = time.monotonic() - stage_start
+        previous = (seconds, len(survivors), n_splits)
+        latest.update(results)
+
+        ranked = [name for name in survivors if name in results]
+        ranked.sort(key=lambda name: -results[name]['metrics'][score_key]
+                    if not np.isnan(results[name]['metrics'][score_key]) else float('inf'))
+        notify([name for name in survivors if name not in results], 'failed')
+        if not ranked:
+            survivors = [best_name] if best_name else []
+            break
+        best_name = select_best(results, survivors, score_key)
+
+        report['stages'].append({
+            'fraction': fraction,
+            'n_splits': n_splits,
+            'candidates': list(survivors),
+            'scores': {name: results[name]['metrics'][score_key] for name in ranked},
+            'seconds': round(seconds, 3)
+        })
+
+        if stage < n_stages - 1 and not timed_out:
+            keep = ranked[:max(1, math.ceil(len(ranked) / eta))]
+        else:
+            keep = [best_name] if best_name else []
+        notify([name for name in ranked if name not in keep], 'eliminated')
+        survivors = keep
+        if timed_out:
+            break
+
+    notify([name for name in survivors if name in latest], 'completed')
+    report['time_spent'] = round(time.monotonic() - start, 3)
+    return best_name, latest, report
+
+
+def build_candidates(specs):
+    """Instantiate candidate models from {name: (module, class name, params)} specs"""
+    return {
+        name: getattr(importlib.import_module(module), class_name)(**params)
+        for name, (module, class_name, params) in specs.items()
+    }
+
+
+def _library_version(module):
+    distribution = {'sklearn': 'scikit-learn'}.get(module.split('.')[0], module.split('.')[0])
+    try:
+        return metadata.version(distribution)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def candidates_signature(specs):
+    """
+    Describe candidate specs without importing their libraries: class, explicit
+    parameters and library version (which covers changed defaults)
+    """
+    return {
+        name: [f'{module}.{class_name}', sorted((key, repr(value)) for key, value in params.items()),
+               _library_version(module)]
+        for name, (module, class_name, params) in specs.items()
+    }
@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import SGDRegressor
+from sklearn.metrics import r2_score
+from sklearn.preprocessing import StandardScaler
+from .enhanced_model import EnhancedMarketAnalysisModel
+
+# Sales of the last rows learned that are kept for the lags of the next batch,
+# enough for the longest rolling window
+HISTORY_ROWS = 30
+
+
+class OnlineMarketAnalysisModel(EnhancedMarketAnalysisModel):
+    """
+    Incrementally trainable variant of the enhanced model.
+    Uses the same category processing and features, but a linear SGD regressor
+    whose feature and target scalers are updated with partial_fit, so every new
+    batch of rows refines the model without refitting on the whole dataset.
+    Label encoders are fitted once, on the first (seed) batch, and the lag
+    features of each batch continue the sales of the rows learned before it.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.best_model = SGDRegressor(random_state=42)
+        self.best_model_name = 'sgd_online'
+        self.target_scaler = StandardScaler()
+        self.samples_seen = 0
+        self.sales_history = None
+
+    def partial_fit(self, df, category):
+        """
+        Update the model with a batch of rows.
+        Returns the batch size, the total rows seen and the R2 of the model on the
+        batch before the update (None for the first batch).
+        """
+        try:
+            df_processed = self.process_data_by_category(df, category)
+            df_processed = df_processed[df_processed['sales'].notna()]
+            df_processed = self._prepare_features(df_processed)
+            if df_processed.empty:
+                raise ValueError("No rows with sales to learn from")
+
+            # Features are fixed by the first batch, like train does for the full model
+            if not self.feature_columns:
+                self.feature_columns = self._select_features(df_processed)
+                if not self.feature_columns:
+                    raise ValueError("No suitable features found for training")
+
+            X = df_processed.reindex(columns=self.feature_columns).fillna(0)
+            y = df_processed['sales'].to_numpy(dtype=float).reshape(-1, 1)
+
+            # Score before learning from the batch, so the score is on unseen rows
+            batch_r2 = None
+            if self.samples_seen and len(X) > 1:
+                batch_r2 = float(r2_score(y.ravel(), self._predict_scaled(X)))
+
+            self.scaler.partial_fit(X)
+            self.target_scaler.partial_fit(y)
+            self.best_model.partial_fit(self.scaler.transform(X), self.target_scaler.transform(y).ravel())
+            self.samples_seen += len(X)
+            history = df_processed['sales'].to_numpy(dtype=float)
+            if self.sales_history is not None:
+                history = np.concatenate([self.sales_history, history])
+            self.sales_history = history[-HISTORY_ROWS:]
+
+            return {'rows': len(X), 'samples_seen': self.samples_seen, 'batch_R2': batch_r2}
+
+        except Exception as e:
+            raise ValueError(f"Error updating online model: {str(e)}")
+
+    def process_data_by_category(self, df, category, fit=True):
+        """
+        Process data like the enhanced model. Once the encoders are fitted (on the
+        seed batch) later batches are only transformed, values they have not seen
+        getting UNKNOWN_CODE, so the codes the model learned keep their meaning.
+        """
+        return super().process_data_by_category(df, category, fit=fit and not self.label_encoders)
+
+    def _prepare_features(self, df):
+        """
+        Prepare features like the enhanced model, with the sales lags of a batch
+        computed after the sales history, so small batches get lags too and those
+        of larger batches do not restart at the first row
+        """
+        if self.sales_history is None or 'sales' not in df.columns:
+            return super()._prepare_features(df)
+
+        df = self._time_features(df)
+        if 'date' in df.columns:
+            df = df.sort_values('date')
+        sales = pd.concat([pd.Series(self.sales_history), df['sales'].reset_index(drop=True).astype(float)],
+                          ignore_index=True)
+        lags = self._lag_features(sales).iloc[len(self.sales_history):]
+        for col in lags.columns:
+            df[col] = lags[col].to_numpy()
+        return df
+
+    def _predict_scaled(self, X):
+        predictions = self.best_model.predict(self.scaler.transform(X))
+        return self.target_scaler.inverse_transform(predictions.reshape(-1, 1)).ravel()
+
+    def predict(self, df, history=True):
+        """
+        Make sales predictions with the online model. By default df continues the rows
+        learned so far (like a new batch); with history=False it holds its own history,
+        e.g. a whole dataset, and its lags come from its own rows only.
+        """
+        try:
+            if not self.samples_seen:
+                raise ValueError("Model not trained yet")
+
+            df_processed = self._process_for_serving(df)
+            if history:
+                df_processed = self._prepare_features(df_processed)
+            else:
+                df_processed = super()._prepare_features(df_processed)
+            X = df_processed.reindex(columns=self.feature_columns).fillna(0)
+            return self._predict_scaled(X)
+
+        except Exception as e:
+            raise ValueError(f"Error in prediction: {str(e)}")
+
+    def export_state(self):
+        """Get the fitted state needed to resume online training"""
+        state = super().export_state()
+        state.update({'target_scaler': self.target_scaler, 'samples_seen': self.samples_seen,
+                      'sales_history': self.sales_history})
+        return state
+
+    def load_state(self, state):
+        """Restore a state produced by export_state"""
+        super().load_state(state)
+        self.target_scaler = state['target_scaler']
+        self.samples_seen = state['samples_seen']
+        self.sales_history = state.get('sales_history')
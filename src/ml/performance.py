@@ -0,0 +1,156 @@
+import numpy as np
+import pandas as pd
+
+# Product identifier columns in order of preference, as used by the insights loop
+PRODUCT_COLUMNS = ['product', 'Product', 'Mobile']
+
+
+def resolve_entity_columns(df):
+    """Get the (product_col, brand_col) pair that identifies an entity in the frame"""
+    product_col = next((col for col in PRODUCT_COLUMNS if col in df.columns), None)
+    brand_col = 'brand' if product_col == 'product' and 'brand' in df.columns else None
+    return product_col, brand_col
+
+
+def entity_rows(df, keys, entities):
+    """Rows of df belonging to entities: values of the key column, or tuples of the key columns"""
+    if len(keys) == 1:
+        return df[df[keys[0]].isin(entities)]
+    wanted = pd.MultiIndex.from_tuples(list(entities), names=keys)
+    return df[pd.MultiIndex.from_frame(df[keys]).isin(wanted)]
+
+
+def compute_product_performance(df, product_col=None, brand_col=None, total_sales=None, brand_sales=None):
+    """
+    Compute market share, month-over-month growth and competitor share for every
+    product (or brand-product pair) in a single grouped pass over the frame.
+    When df holds only some entities' rows, pass the category's total sales and
+    per-brand sales so shares stay relative to the whole category.
+    Returns a frame indexed by product, or by (brand, product) when a brand
+    column is used; an empty frame when the data has no product column.
+    """
+    if product_col is None:
+        product_col, brand_col = resolve_entity_columns(df)
+    if product_col is None or 'sales' not in df.columns:
+        return pd.DataFrame(columns=['sales', 'market_share', 'growth_rate', 'competitor_percentage',
+                                     'growth_status', 'competition_level'])
+
+    keys = [brand_col, product_col] if brand_col else [product_col]
+    sales = df['sales']
+    if total_sales is None:
+        total_sales = sales.sum()
+
+    table = df.groupby(keys, sort=False, observed=True)['sales'].sum().to_frame('sales')
+    table['market_share'] = table['sales'] / total_sales * 100
+
+    # Competitors are every other brand when a brand is known, every other product otherwise
+    if brand_col:
+        if brand_sales is None:
+            brand_sales = df.groupby(brand_col, sort=False, observed=True)['sales'].sum()
+        own_sales = brand_sales.reindex(table.index.get_level_values(0)).to_numpy()
+    else:
+        own_sales = table['sales'].to_numpy()
+    table['competitor_percentage'] = (total_sales - own_sales) / total_sales * 100
+
+    # Month-over-month growth between each entity's last two months with sales
+    table['growth_rate'] = 0.0
+    if 'date' in df.columns:
+        months = pd.to_datetime(df['date'], errors='coerce').dt.to_period('M')
+        monthly = df[keys].assign(month=months, sales=sales)
+        monthly = monthly.groupby(keys + ['month'], sort=True, observed=True)['sales'].sum().reset_index()
+        monthly['previous'] = monthly.groupby(keys, sort=False, observed=True)['sales'].shift(1)
+        latest = monthly.groupby(keys, sort=False, observed=True).tail(1).set_index(keys)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            growth = (latest['sales'] - latest['previous']) / latest['previous'] * 100
+        # Entities with a single month of sales have no growth
+        growth = growth.where(latest['previous'].notna(), 0)
+        table['growth_rate'] = growth.reindex(table.index).fillna(0)
+
+    return _classify(table)
+
+
+def performance_from_aggregates(aggregates, product_col, brand_col=None):
+    """
+    The compute_product_performance table built from running SalesAggregates
+    (e.g. of a streamed file) instead of rows. The aggregates may be keyed by more
+    columns than the entity; their totals are summed up to the entity.
+    """
+    keys = [brand_col, product_col] if brand_col else [product_col]
+    if product_col not in aggregates.keys or (brand_col and brand_col not in aggregates.keys):
+        return compute_product_performance(pd.DataFrame())
+
+    levels = [aggregates.keys.index(col) for col in keys]
+    total_sales = aggregates.total_sales
+    table = aggregates.entity_totals.groupby(level=levels, sort=False, observed=True).sum().to_frame('sales')
+    table.index.names = keys
+    table['market_share'] = table['sales'] / total_sales * 100
+
+    if brand_col:
+        own_sales = aggregates.brand_totals.reindex(table.index.get_level_values(0)).to_numpy()
+    else:
+        own_sales = table['sales'].to_numpy()
+    table['competitor_percentage'] = (total_sales - own_sales) / total_sales * 100
+
+    # Month-over-month growth between each entity's last two months with sales
+    table['growth_rate'] = 0.0
+    if len(aggregates.monthly):
+        monthly = aggregates.monthly.groupby(level=levels + [len(aggregates.keys)], observed=True).sum()
+        monthly = monthly.to_frame('sales').reset_index()
+        monthly.columns = keys + ['month', 'sales']
+        monthly = monthly.sort_values(keys + ['month'])
+        monthly['previous'] = monthly.groupby(keys, sort=False, observed=True)['sales'].shift(1)
+        latest = monthly.groupby(keys, sort=False, observed=True).tail(1).set_index(keys)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            growth = (latest['sales'] - latest['previous']) / latest['previous'] * 100
+        growth = growth.where(latest['previous'].notna(), 0)
+        table['growth_rate'] = growth.reindex(table.index).fillna(0)
+
+    return _classify(table)
+
+
+def _classify(table):
+    table['growth_status'] = np.where(table['growth_rate'] > 0, 'Growing', 'Declining')
+    table['competition_level'] = np.select(
+        [table['competitor_percentage'] > 70, table['competitor_percentage'] > 40],
+        ['High', 'Moderate'],
+        default='Low'
+    )
+    return table
+
+
+def lookup_product_performance(table, product_name, brand=None):
+    """Get the performance row for a product (and brand), or None when it has no data"""
+    if table.empty:
+        return None
+    key = (brand, product_name) if table.index.nlevels == 2 else product_name
+    if table.index.nlevels == 2 and brand is None:
+        return None
+    try:
+        row = table.loc[key]
+    except (KeyError, TypeError):
+        return None
+    return row if isinstance(row, pd.Series) else None
+
+
+def compute_entity_performance(df, index, product_name, brand=None):
+    """
+    Performance row of one product (and brand) computed from its own rows, found
+    through the frame's EntityIndex; the same row compute_product_performance
+    gives for the whole frame. Returns None when the product has no data.
+    """
+    product_col, brand_col = resolve_entity_columns(df)
+    if product_col is None or 'sales' not in df.columns or (brand_col and brand is None):
+        return None
+
+    positions = index.positions(product_col, product_name)
+    brand_sales = None
+    if brand_col:
+        brand_positions = index.positions(brand_col, brand)
+        positions = np.intersect1d(positions, brand_positions, assume_unique=True)
+        brand_sales = pd.Series({brand: df['sales'].iloc[brand_positions].sum()})
+    if not len(positions):
+        return None
+
+    table = compute_product_performance(df.iloc[positions], product_col, brand_col,
+                                        total_sales=df['sales'].sum(), brand_sales=brand_sales)
+    return lookup_product_performance(table, product_name, brand)
@@ -0,0 +1,150 @@
+import cProfile
+import hmac
+import json
+import os
+import pstats
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+# Orders a report can be sorted by, and the function field each sorts on
+SORT_KEYS = {'cumulative': 'cumtime', 'tottime': 'tottime', 'calls': 'calls'}
+
+
+class RequestProfiler:
+    """
+    Opt-in cProfile of single requests, for diagnosing slow endpoints in place.
+    Disabled unless enabled (default: MARKET_PROFILING=1); when a token is set
+    (default: MARKET_PROFILING_TOKEN) a request must also present it. Each report
+    lists the `top` hottest functions and is kept in a bounded in-memory LRU and,
+    with profile_dir, on disk next to the raw pstats dump.
+    """
+
+    def __init__(self, enabled=None, token=None, profile_dir=None, top=None, max_entries=50):
+        if enabled is None:
+            enabled = os.environ.get('MARKET_PROFILING', '0') == '1'
+        if token is None:
+            token = os.environ.get('MARKET_PROFILING_TOKEN') or None
+        if top is None:
+            top = int(os.environ.get('MARKET_PROFILING_TOP', 30))
+        self.enabled = enabled
+        self.token = token
+        self.profile_dir = profile_dir
+        self.top = top
+        self.max_entries = max_entries
+        self._reports = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allows(self, token=None):
+        """Whether a request presenting this token may be profiled"""
+        if not self.enabled:
+            return False
+        if self.token is None:
+            return True
+        return token is not None and hmac.compare_digest(str(token), self.token)
+
+    @staticmethod
+    def start():
+        """Start profiling the current thread; returns the profile for finish()"""
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def finish(self, profile, endpoint, path, status, sort='cumulative'):
+        """Stop a profile and store its report; returns the report"""
+        profile.disable()
+        stats = pstats.Stats(profile)
+        profile_id = f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        report = {
+            'id': profile_id,
+            'endpoint': endpoint,
+            'path': path,
+            'status': status,
+            'created_at': datetime.now().isoformat(),
+            'total_seconds': round(stats.total_tt, 6),
+            'total_calls': stats.total_calls,
+            'sort': sort if sort in SORT_KEYS else 'cumulative',
+            'functions': hot_functions(stats, self.top, sort)
+        }
+        self._remember(profile_id, report)
+
+        if self.profile_dir:
+            try:
+                os.makedirs(self.profile_dir, exist_ok=True)
+                stats.dump_stats(self._path(profile_id, 'prof'))
+                with open(self._path(profile_id, 'json'), 'w') as f:
+                    json.dump(report, f)
+                self._prune_disk()
+            except Exception as e:
+                print(f"Warning: Could not save profile {profile_id}: {str(e)}")
+        return report
+
+    def get(self, profile_id):
+        """Get a stored report by id, or None"""
+        with self._lock:
+            report = self._reports.get(profile_id)
+        if report is not None or not self.profile_dir:
+            return report
+        try:
+            with open(self._path(os.path.basename(profile_id), 'json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def list(self):
+        """Summaries of the reports held in memory, newest first"""
+        with self._lock:
+            reports = list(self._reports.values())
+        return [{key: report[key] for key in ('id', 'endpoint', 'path', 'status', 'created_at', 'total_seconds')}
+                for report in reversed(reports)]
+
+    def _path(self, profile_id, extension):
+        return os.path.join(self.profile_dir, f'{profile_id}.{extension}')
+
+    def _remember(self, profile_id, report):
+        with self._lock:
+            self._reports[profile_id] = report
+            while len(self._reports) > self.max_entries:
+                self._reports.popitem(last=False)
+
+    def _prune_disk(self):
+        names = sorted(name for name in os.listdir(self.profile_dir) if name.endswith('.json'))
+        for name in names[:max(0, len(names) - self.max_entries)]:
+            for extension in ('json', 'prof'):
+                try:
+                    os.remove(self._path(name[:-len('.json')], extension))
+                except OSError:
+                    pass
+
+
+def hot_functions(stats, top=30, sort='cumulative'):
+    """The `top` functions of a pstats.Stats by the sort order, with call counts and times"""
+    rows = []
+    for (filename, line, name), (primitive_calls, calls, own_time, cumulative_time, _) in stats.stats.items():
+        rows.append({
+            'function': name,
+            'location': f'{_short_path(filename)}:{line}' if line else filename,
+            'calls': calls,
+            'primitive_calls': primitive_calls,
+            'tottime': own_time,
+            'cumtime': cumulative_time
+        })
+    rows.sort(key=lambda row: row[SORT_KEYS.get(sort, 'cumtime')], reverse=True)
+    for row in rows[:top]:
+        row['tottime'] = round(row['tottime'], 6)
+        row['cumtime'] = round(row['cumtime'], 6)
+        row['percall'] = round(row['cumtime'] / row['calls'], 6) if row['calls'] else 0.0
+    return rows[:top]
+
+
+def _short_path(filename):
+    """A source path relative to site-packages or the working directory"""
+    marker = f'site-packages{os.sep}'
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    try:
+        relative = os.path.relpath(filename)
+    except ValueError:
+        return filename
+    return filename if relative.startswith('..') else relative
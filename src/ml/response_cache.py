@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """
+    Bounded LRU of serialized responses, each stored with the ETag of its body.
+    Entries are evicted once max_entries or max_bytes is exceeded. With a
+    cache_dir, entries are also written to disk so they survive restarts and
+    evictions; the disk tier keeps at most max_disk_entries files.
+    """
+
+    def __init__(self, max_entries=128, max_bytes=64 * 1024 * 1024, cache_dir=None, max_disk_entries=1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts):
+        """Build a cache key from JSON-serializable parts (dict keys are normalized by sorting)"""
+        payload = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    @staticmethod
+    def make_etag(body):
+        return hashlib.sha1(body).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.json')
+
+    def get(self, key):
+        """Get the (etag, body) pair stored for a key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+
+        if self.cache_dir:
+            try:
+                with open(self._path(key), 'rb') as f:
+                    etag, body = f.read().split(b'\n', 1)
+            except (OSError, ValueError):
+                return None
+            entry = (etag.decode(), body)
+            self._remember(key, entry)
+            return entry
+        return None
+
+    def put(self, key, body):
+        """Store a serialized body for a key; returns its ETag"""
+        etag = self.make_etag(body)
+        self._remember(key, (etag, body))
+        if self.cache_dir:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp_path = f'{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(etag.encode() + b'\n' + body)
+                os.replace(tmp_path, self._path(key))
+                self._prune_disk()
+            except Exception as e:
+                print(f"Warning: Could not save cached response: {str(e)}")
+        return etag
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remember(self, key, entry):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous[1])
+            if len(entry[1]) > self.max_bytes:
+                return
+            self._entries[key] = entry
+            self._bytes += len(entry[1])
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, body) = self._entries.popitem(last=False)
+                self._bytes -= len(body)
+
+    def _prune_disk(self):
+        names = [name for name in os.listdir(self.cache_dir) if name.endswith('.json')]
+        if len(names) <= self.max_disk_entries:
+            return
+        paths = sorted((os.path.join(self.cache_dir, name) for name in names), key=os.path.getmtime)
+        for path in paths[:len(paths) - self.max_disk_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
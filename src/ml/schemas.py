@@ -0,0 +1,274 @@
+import hashlib
+import json
+import numpy as np
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+
+# Seed of the synthetic sales drawn for categories without a sales figure, so every
+# load (and every worker) derives the same values
+SYNTHETIC_SEED = 42
+
+
+class CategorySchema:
+    """
+    Declares how a category dataset is read and which columns play which role.
+    Parsing, the derived sales and date columns, category processing and the market
+    coverage features are all driven by the schema, so supporting a new dataset means
+    registering a schema rather than adding code paths.
+
+    sales is one of:
+      {'column': name}                      - a numeric column
+      {'product': [price, quantity]}        - the product of numeric columns
+      {'scale': name, 'uniform': (lo, hi)}  - a column times a synthetic volume
+      {'uniform': (lo, hi)}                 - synthetic sales
+    date_formats are tried in order; values matching none of them become NaT.
+    """
+
+    def __init__(self, name, sales=None, date_column=None, date_formats=(), date_freq='D',
+                 header_column=None, numeric_columns=(), category_columns=(), string_columns=(),
+                 product_column=None, brand_column=None, encode_columns=(),
+                 coverage_shares=None, price_column=None, coverage_encode_columns=(),
+                 extract_numeric=None, rating_column=None):
+        self.name = name
+        self.sales = sales or {'uniform': (100, 10000)}
+        self.date_column = date_column
+        self.date_formats = list(date_formats)
+        self.date_freq = date_freq
+        self.header_column = header_column
+        self.numeric_columns = list(numeric_columns)
+        self.category_columns = list(category_columns)
+        self.string_columns = list(string_columns)
+        self.product_column = product_column
+        self.brand_column = brand_column
+        self.encode_columns = list(encode_columns)
+        self.coverage_shares = dict(coverage_shares or {})
+        self.price_column = price_column
+        self.coverage_encode_columns = list(coverage_encode_columns)
+        self.extract_numeric = dict(extract_numeric or {})
+        self.rating_column = rating_column
+
+    def signature(self):
+        """Hash of the declaration, so cached parses are rebuilt when it changes"""
+        payload = json.dumps(vars(self), sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    def read_csv(self, path):
+        """Parse a CSV in one typed pass: declared categoricals and strings, then the date column"""
+        df = pd.read_csv(path, dtype=self._read_dtypes(), low_memory=False)
+        return self._parse(df).reset_index(drop=True)
+
+    def iter_csv(self, path, chunk_rows):
+        """Parse a CSV in typed chunks of chunk_rows rows, indexed by their row position in the file"""
+        start = 0
+        for chunk in pd.read_csv(path, dtype=self._read_dtypes(), chunksize=chunk_rows, low_memory=False):
+            chunk = self._parse(chunk)
+            chunk.index = pd.RangeIndex(start, start + len(chunk))
+            start += len(chunk)
+            yield chunk
+
+    def _read_dtypes(self):
+        dtypes = {col: 'category' for col in self.category_columns}
+        dtypes.update({col: str for col in self.string_columns})
+        if self.header_column:
+            dtypes[self.header_column] = str
+        return dtypes
+
+    def _parse(self, df):
+        df = self.clean(df)
+        if self.date_column in df.columns:
+            df['date'] = self.parse_dates(df[self.date_column])
+        return df
+
+    def clean(self, df):
+        """Drop repeated header rows and convert the declared numeric columns"""
+        if self.header_column in df.columns:
+            header_rows = df[self.header_column].astype(str) == self.header_column
+            if header_rows.any():
+                df = df[~header_rows].copy(deep=False)
+        for col in self.numeric_columns:
+            if col in df.columns and not pd.api.types.is_numeric_dtype(df[col]):
+                df[col] = pd.to_numeric(df[col], errors='coerce')
+        return df
+
+    def parse_dates(self, values):
+        """Parse date strings with the declared formats"""
+        if pd.api.types.is_datetime64_any_dtype(values):
+            return values
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Parse each distinct value once
+            categories = self.parse_dates(pd.Series(values.cat.categories.astype(str), dtype=object))
+            return pd.Series(categories.to_numpy()[values.cat.codes.to_numpy()], index=values.index).where(values.notna())
+        values = values.astype(object)
+        if not self.date_formats:
+            return pd.to_datetime(values, errors='coerce')
+        parsed = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+        for date_format in self.date_formats:
+            missing = parsed.isna() & values.notna()
+            if not missing.any():
+                break
+            parsed[missing] = pd.to_datetime(values[missing], format=date_format, errors='coerce')
+        return parsed
+
+    def prepare(self, df):
+        """Clean a frame and derive its sales and date columns"""
+        return self.derive(self.clean(df))
+
+    def derive(self, df, start=0, random_state=None):
+        """
+        Add the sales and date columns the analysis expects, when they are missing.
+        When df is a chunk of a stream, start is the position of its first row and
+        random_state is shared by the chunks, so synthetic values match those the
+        whole frame would get.
+        """
+        if 'sales' not in df.columns:
+            df['sales'] = self.derive_sales(df, random_state)
+
+        if self.date_column in df.columns:
+            if 'date' not in df.columns:
+                df['date'] = self.parse_dates(df[self.date_column])
+            else:
+                # Rows appended without a parsed date (e.g. ingested rows)
+                missing = df['date'].isna() & df[self.date_column].notna()
+                if missing.any():
+                    dates = pd.to_datetime(df['date'], errors='coerce')
+                    df['date'] = dates.mask(missing, self.parse_dates(df.loc[missing, self.date_column]))
+        elif 'date' not in df.columns:
+            first = pd.Timestamp('2020-01-01') + to_offset(self.date_freq) * start
+            df['date'] = pd.date_range(start=first, periods=len(df), freq=self.date_freq)
+        return df
+
+    def required_columns(self, columns=None):
+        """
+        Columns every appended row must fill: the product and brand roles, the columns
+        sales is derived from, the price and the date. With columns (those of the
+        dataset), only the ones the dataset has.
+        """
+        spec = self.sales
+        required = [self.product_column, self.brand_column, spec.get('column'), *spec.get('product', []),
+                    spec.get('scale'), self.price_column, self.date_column]
+        required = [col for col in dict.fromkeys(required) if col]
+        if columns is not None:
+            required = [col for col in required if col in columns]
+        return required
+
+    def validate_rows(self, rows, columns=None):
+        """
+        Check raw rows (e.g. rows sent for ingestion) against the schema: the required
+        columns are filled, the declared numeric columns hold numbers and dates match a
+        declared format. Returns [{'row': position, 'errors': [...]}] for the failing rows.
+        """
+        errors = {}
+
+        def fail(mask, message):
+            for position in np.flatnonzero(mask.to_numpy(dtype=bool)):
+                errors.setdefault(int(position), []).append(message)
+
+        def filled(values):
+            return values.notna() & (values.astype(str).str.strip() != '')
+
+        for col in self.required_columns(columns):
+            if col not in rows.columns:
+                fail(pd.Series(True, index=rows.index), f'{col} is required')
+            else:
+                fail(~filled(rows[col]), f'{col} is required')
+        for col in self.numeric_columns:
+            if col in rows.columns:
+                fail(filled(rows[col]) & pd.to_numeric(rows[col], errors='coerce').isna(), f'{col} must be a number')
+        if self.date_column in rows.columns:
+            values = rows[self.date_column]
+            formats = f" ({', '.join(self.date_formats)})" if self.date_formats else ''
+            fail(filled(values) & self.parse_dates(values).isna(), f'{self.date_column} is not a valid date{formats}')
+        return [{'row': position, 'errors': messages} for position, messages in sorted(errors.items())]
+
+    def target_columns(self):
+        """Source columns that sales is a copy of, which must not be used as features"""
+        column = self.sales.get('column')
+        return [column] if column else []
+
+    def derive_sales(self, df, random_state=None):
+        spec = self.sales
+        if 'column' in spec and spec['column'] in df.columns:
+            return pd.to_numeric(df[spec['column']], errors='coerce')
+        if 'product' in spec and all(col in df.columns for col in spec['product']):
+            sales = pd.to_numeric(df[spec['product'][0]], errors='coerce')
+            for col in spec['product'][1:]:
+                sales = sales * pd.to_numeric(df[col], errors='coerce')
+            return sales
+        low, high = spec.get('uniform', (100, 10000))
+        if random_state is None:
+            random_state = np.random.RandomState(SYNTHETIC_SEED)
+        volume = random_state.uniform(low, high, len(df))
+        if 'scale' in spec and spec['scale'] in df.columns:
+            return pd.to_numeric(df[spec['scale']], errors='coerce') * volume
+        return pd.Series(volume, index=df.index)
+
+
+SCHEMAS = {}
+
+# Schema of categories without an entry of their own
+DEFAULT_SCHEMA = CategorySchema('general', product_column='product', brand_column='brand')
+
+
+def register_schema(schema):
+    SCHEMAS[schema.name.lower()] = schema
+    return schema
+
+
+def get_schema(category):
+    """Get the schema of a category, falling back to DEFAULT_SCHEMA"""
+    return SCHEMAS.get((category or 'general').lower(), DEFAULT_SCHEMA)
+
+
+register_schema(CategorySchema(
+    'electronics',
+    sales={'product': ['Price Each', 'Quantity Ordered'], 'uniform': (10, 1000)},
+    date_column='Order Date', date_formats=['%m/%d/%y %H:%M'], date_freq='H',
+    header_column='Order ID',
+    numeric_columns=['Order ID', 'Price Each', 'Quantity Ordered'],
+    category_columns=['Product'],
+    product_column='Product',
+    encode_columns=['Product'],
+    coverage_shares={'product_market_share': 'Product'},
+    price_column='Price Each',
+    coverage_encode_columns=['Product', 'price_segment']
+))
+
+register_schema(CategorySchema(
+    'smartphones',
+    sales={'scale': 'Selling Price', 'uniform': (1, 100)},
+    numeric_columns=['Selling Price', 'Original Price', 'Rating'],
+    category_columns=['Brands', 'Memory', 'Storage'],
+    product_column='Mobile', brand_column='Brands',
+    encode_columns=['Brands', 'Models', 'Colors'],
+    coverage_shares={'brand_market_share': 'Brands'},
+    price_column='Selling Price',
+    coverage_encode_columns=['Brands', 'Colors', 'price_segment'],
+    extract_numeric={'storage_numeric': 'Storage', 'memory_numeric': 'Memory'},
+    rating_column='Rating'
+))
+
+register_schema(CategorySchema(
+    'fashion',
+    sales={'column': 'Purchase Amount (USD)', 'uniform': (100, 5000)},
+    date_column='Date Purchase', date_formats=['%d-%m-%Y'],
+    category_columns=['Item Purchased', 'Payment Method'],
+    coverage_shares={'category_market_share': 'Category'},
+    coverage_encode_columns=['Category']
+))
+
+register_schema(CategorySchema(
+    'groceries',
+    sales={'column': 'Sales', 'uniform': (50, 1000)},
+    date_column='Order Date', date_formats=['%m-%d-%Y', '%m/%d/%Y'],
+    category_columns=['Customer Name', 'Category', 'Sub Category', 'City', 'Region'],
+    encode_columns=['Category', 'Region', 'Customer_Segment'],
+    coverage_shares={'category_market_share': 'Category', 'regional_coverage': 'Region'},
+    coverage_encode_columns=['Category', 'Region', 'Customer_Segment']
+))
+
+register_schema(CategorySchema(
+    'stocks',
+    category_columns=['Listing Exchange', 'Market Category', 'Financial Status'],
+    encode_columns=['Symbol', 'Security Name', 'Market Category'],
+    coverage_shares={'market_segment_share': 'Market'}
+))
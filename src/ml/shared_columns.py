@@ -0,0 +1,60 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Layout and non-mappable column data of a column directory
+LAYOUT_FILE = 'layout.pkl'
+
+
+def write_columns(df, directory):
+    """
+    Write a frame as a column directory: one .npy file per numeric, datetime or
+    categorical-code column, and a pickle with the layout, the categories and the
+    columns that cannot be mapped (strings and other objects)
+    """
+    os.makedirs(directory)
+    columns = []
+    for position, col in enumerate(df.columns):
+        series = df[col]
+        file_name = f'{position}.npy'
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            np.save(os.path.join(directory, file_name), series.cat.codes.to_numpy())
+            columns.append({'name': col, 'kind': 'categorical', 'file': file_name,
+                            'categories': series.cat.categories, 'ordered': series.cat.ordered})
+        elif isinstance(series.dtype, np.dtype) and series.dtype.kind in 'biufmM':
+            np.save(os.path.join(directory, file_name), series.to_numpy())
+            columns.append({'name': col, 'kind': 'array', 'file': file_name})
+        else:
+            columns.append({'name': col, 'kind': 'object', 'values': series.array})
+    pd.to_pickle({'rows': len(df), 'columns': columns}, os.path.join(directory, LAYOUT_FILE))
+
+
+def map_columns(directory):
+    """
+    Open a column directory as a frame whose numeric and categorical-code columns
+    are read-only memory maps of its files. Every process that maps the same
+    directory shares those pages through the page cache instead of holding a copy.
+    """
+    layout = pd.read_pickle(os.path.join(directory, LAYOUT_FILE))
+    data = {}
+    for column in layout['columns']:
+        if column['kind'] == 'object':
+            data[column['name']] = column['values']
+            continue
+        values = np.load(os.path.join(directory, column['file']), mmap_mode='r')
+        if column['kind'] == 'categorical':
+            values = pd.Categorical.from_codes(values, categories=column['categories'], ordered=column['ordered'])
+        data[column['name']] = values
+    return pd.DataFrame(data, index=pd.RangeIndex(layout['rows']), copy=False)
+
+
+def is_mapped(values):
+    """Whether an array (or the codes of a categorical) is backed by a memory map"""
+    if isinstance(values, pd.Categorical):
+        values = values.codes
+    base = values
+    while base is not None:
+        if isinstance(base, np.memmap):
+            return True
+        base = getattr(base, 'base', None)
+    return False
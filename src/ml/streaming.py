@@ -0,0 +1,141 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+from .dataset_loader import compact_frame
+from .ingest import SalesAggregates, align_rows
+from .schemas import SYNTHETIC_SEED, get_schema
+from .timing import span
+
+# Files of at least this many megabytes are analyzed in streaming mode
+STREAMING_THRESHOLD_MB = float(os.environ.get('MARKET_STREAMING_THRESHOLD_MB', 1024))
+
+# Rows read per chunk, and rows kept in the training sample, in streaming mode
+STREAM_CHUNK_ROWS = int(os.environ.get('MARKET_STREAM_CHUNK_ROWS', 100000))
+STREAM_SAMPLE_ROWS = int(os.environ.get('MARKET_STREAM_SAMPLE_ROWS', 50000))
+
+
+def should_stream(path):
+    """Whether a dataset file is large enough to be analyzed in streaming mode"""
+    return os.path.getsize(path) >= STREAMING_THRESHOLD_MB * 1024 * 1024
+
+
+class ReservoirSample:
+    """
+    Uniform random sample of at most `size` rows of a stream of frames.
+    Every row gets a random key and the rows with the smallest keys are kept
+    (bottom-k sampling), so a chunk only adds the rows that beat the current
+    largest kept key and memory stays bounded by size plus one chunk.
+    """
+
+    def __init__(self, size, seed=SYNTHETIC_SEED):
+        self.size = size
+        self.seen = 0
+        self._random = np.random.RandomState(seed)
+        self._keys = np.empty(0)
+        self._rows = None
+
+    def add(self, chunk):
+        keys = self._random.random_sample(len(chunk))
+        self.seen += len(chunk)
+        if len(self._keys) >= self.size:
+            candidates = keys < self._keys.max()
+            chunk, keys = chunk[candidates], keys[candidates]
+        if not len(chunk):
+            return
+
+        rows = chunk if self._rows is None else pd.concat([self._rows, chunk])
+        keys = np.concatenate([self._keys, keys])
+        if len(keys) > self.size:
+            keep = np.sort(np.argpartition(keys, self.size - 1)[:self.size])
+            rows, keys = rows.iloc[keep], keys[keep]
+        self._rows, self._keys = rows, keys
+
+    def frame(self):
+        """The sampled rows in stream order"""
+        if self._rows is None:
+            return pd.DataFrame()
+        return compact_frame(self._rows.sort_index())
+
+
+class StreamedDataset:
+    """
+    A category file read in chunks: exact running aggregates over every row
+    (entity, brand and monthly sales totals and the market-share denominator)
+    and a bounded uniform sample of prepared rows to train and predict on
+    """
+
+    def __init__(self, aggregates, sample, rows, chunk_rows):
+        self.aggregates = aggregates
+        self.sample = sample
+        self.rows = rows
+        self.chunk_rows = chunk_rows
+
+    def summary(self):
+        return {
+            'rows': self.rows,
+            'sample_rows': len(self.sample),
+            'chunk_rows': self.chunk_rows,
+            'total_sales': self.aggregates.total_sales if self.aggregates is not None else 0.0
+        }
+
+
+def stream_category(path, category, chunk_rows=STREAM_CHUNK_ROWS, sample_rows=STREAM_SAMPLE_ROWS, extra_rows=None):
+    """
+    Read a category file chunk by chunk into a StreamedDataset. Only one chunk
+    and the sample are in memory at a time. extra_rows are raw rows appended after
+    the file (e.g. ingested rows).
+    """
+    schema = get_schema(category)
+    random_state = np.random.RandomState(SYNTHETIC_SEED)
+    sample = ReservoirSample(sample_rows)
+    aggregates = None
+    rows = 0
+    reference = None
+
+    def consume(chunk):
+        nonlocal aggregates, rows
+        chunk = schema.derive(chunk, start=rows, random_state=random_state)
+        if aggregates is None:
+            aggregates = SalesAggregates.for_frame(chunk)
+        aggregates.update(chunk)
+        sample.add(chunk)
+        rows += len(chunk)
+
+    try:
+        for chunk in schema.iter_csv(path, chunk_rows):
+            if reference is None:
+                reference = chunk.iloc[:0].copy()
+            consume(chunk)
+        if extra_rows is not None and len(extra_rows) and reference is not None:
+            extra = schema.clean(align_rows(extra_rows, reference))
+            extra.index = pd.RangeIndex(rows, rows + len(extra))
+            consume(extra)
+    except Exception as e:
+        raise ValueError(f"Error streaming {category} data: {str(e)}")
+
+    return StreamedDataset(aggregates, sample.frame(), rows, chunk_rows)
+
+
+class StreamingLoader:
+    """Streams large category files once per dataset version and keeps the result"""
+
+    def __init__(self, chunk_rows=STREAM_CHUNK_ROWS, sample_rows=STREAM_SAMPLE_ROWS):
+        self.chunk_rows = chunk_rows
+        self.sample_rows = sample_rows
+        self._datasets = {}
+        self._lock = threading.Lock()
+
+    def load(self, category, path, version, extra_rows=None):
+        """Get the streamed dataset of a file version, streaming it when the version changed"""
+        key = category.lower()
+        with self._lock:
+            cached = self._datasets.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        with span('stream_csv'):
+            streamed = stream_category(path, category, self.chunk_rows, self.sample_rows, extra_rows)
+        with self._lock:
+            self._datasets[key] = (version, streamed)
+        return streamed
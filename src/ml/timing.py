@@ -0,0 +1,130 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds of the histogram buckets, from cached responses up to model training
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Timings of the request being handled in the current thread (or context), if any
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """Time spent in each stage of one request, summed over repeated spans of a stage"""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.stages = {}
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self, total):
+        """Value of a Server-Timing header: each stage and the total in milliseconds"""
+        entries = [f'{stage};dur={seconds * 1000:.1f}' for stage, seconds in self.stages.items()]
+        entries.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(entries)
+
+
+def start_request(endpoint):
+    """Start collecting spans for a request; returns the token for finish_request"""
+    return _current.set(RequestTimings(endpoint))
+
+
+def current_request():
+    return _current.get()
+
+
+def finish_request(token):
+    """Stop collecting spans for a request; returns its RequestTimings"""
+    timings = _current.get()
+    _current.reset(token)
+    return timings
+
+
+@contextmanager
+def span(stage):
+    """
+    Time a stage of the current request. Outside a request (background jobs,
+    worker processes) nothing is recorded, so library code can be wrapped freely.
+    """
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(stage, time.perf_counter() - started)
+
+
+class Histograms:
+    """Cumulative histograms of durations by label values, in the Prometheus text format"""
+
+    def __init__(self, name, help_text, label_names, buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, seconds):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for position, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series['counts'][position] += 1
+            series['sum'] += seconds
+            series['count'] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((labels, dict(values, counts=list(values['counts'])))
+                            for labels, values in self._series.items())
+        for labels, values in series:
+            label_text = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+            for bound, count in zip(self.buckets, values['counts']):
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound:g}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {values["count"]}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {values["sum"]:.6f}')
+            lines.append(f'{self.name}_count{{{label_text}}} {values["count"]}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class RequestMetrics:
+    """
+    Request and per-stage duration histograms of every endpoint, fed from the
+    RequestTimings of finished requests and exposed in the Prometheus text format
+    """
+
+    def __init__(self, prefix='market'):
+        self.requests = Histograms(f'{prefix}_request_duration_seconds',
+                                   'Time to handle a request', ('endpoint', 'status'))
+        self.stages = Histograms(f'{prefix}_stage_duration_seconds',
+                                 'Time spent in a stage of a request', ('endpoint', 'stage'))
+
+    def observe_request(self, timings, total, status):
+        self.requests.observe((timings.endpoint, str(status)), total)
+        for stage, seconds in timings.stages.items():
+            self.stages.observe((timings.endpoint, stage), seconds)
+
+    def observe_stage(self, endpoint, stage, seconds):
+        """Record a stage measured outside a request, e.g. chart rendering in a worker process"""
+        self.stages.observe((endpoint, stage), seconds)
+
+    def render(self):
+        return '\n'.join(self.requests.render() + self.stages.render()) + '\n'
@@ -0,0 +1,181 @@
+import numpy as np
+import pandas as pd
+from .timing import span
+
+# Monthly seasonality, as used by analyze_trends
+SEASONAL_PERIOD = 12
+
+
+def monthly_sales_matrix(df, keys):
+    """
+    Pivot sales into an (entity x month) matrix.
+    Row i starts at that entity's first month with sales and holds lengths[i]
+    consecutive monthly totals (zero for months without sales, like a monthly
+    resample), followed by NaN padding. Returns (index, matrix, lengths).
+    """
+    month = df['date'].dt.year * 12 + df['date'].dt.month - 1
+    totals = df.groupby(keys + [month.rename('_month')], sort=True, observed=True)['sales'].sum()
+    dense = totals.unstack('_month')
+    # Months without sales for any entity still count as zero-sales months
+    dense = dense.reindex(columns=range(dense.columns.min(), dense.columns.max() + 1))
+    values = dense.to_numpy(dtype=float)
+
+    present = ~np.isnan(values)
+    start = present.argmax(axis=1)
+    end = values.shape[1] - 1 - present[:, ::-1].argmax(axis=1)
+    lengths = end - start + 1
+
+    offsets = np.arange(lengths.max() if len(lengths) else 0)
+    columns = start[:, None] + offsets
+    valid = offsets < lengths[:, None]
+    matrix = np.nan_to_num(values)[np.arange(len(values))[:, None], np.minimum(columns, values.shape[1] - 1)]
+    matrix[~valid] = np.nan
+    return dense.index, matrix, lengths
+
+
+def _row_nanmean(values):
+    """
+    Mean of the non-NaN values of each row, summed in column order so that a row's
+    result does not depend on the width of the matrix (or the rows batched with it)
+    """
+    present = ~np.isnan(values)
+    totals = np.add.reduce(np.ascontiguousarray(np.where(present, values, 0).T), axis=0)
+    return totals / present.sum(axis=1)
+
+
+def _row_nanstd(values):
+    """Standard deviation of the non-NaN values of each row, like _row_nanmean"""
+    deviations = values - _row_nanmean(values)[:, None]
+    return np.sqrt(_row_nanmean(deviations * deviations))
+
+
+def _line_fit(x, y, mask):
+    """Least-squares slope and intercept of each row of y against x, over the masked points"""
+    count = mask.sum(axis=1, keepdims=True)
+    x_mean = np.where(mask, x, 0).sum(axis=1, keepdims=True) / count
+    y_mean = np.where(mask, y, 0).sum(axis=1, keepdims=True) / count
+    dx = np.where(mask, x - x_mean, 0)
+    slope = (dx * np.where(mask, y - y_mean, 0)).sum(axis=1) / (dx ** 2).sum(axis=1)
+    return slope, y_mean[:, 0] - slope * x_mean[:, 0]
+
+
+def decompose_trends(matrix, lengths, period=SEASONAL_PERIOD):
+    """
+    Additive moving-average decomposition of every row of a monthly matrix at once.
+    Mirrors statsmodels seasonal_decompose(period=12, extrapolate_trend='freq'):
+    a centred 2x12 moving average for the trend, linearly extrapolated over the
+    first and last half-period from the nearest `period` trend points, and
+    per-phase means of the detrended series for the seasonal component.
+    Every row must have at least two full periods.
+    Returns (first trend value, last trend value, std of seasonal component).
+    """
+    rows = np.arange(len(matrix))
+    width = matrix.shape[1]
+    half = period // 2
+    values = np.nan_to_num(matrix)
+    valid = np.arange(width) < lengths[:, None]
+
+    # Centred moving average with weights [.5, 1, ..., 1, .5] / period
+    cumulative = np.concatenate([np.zeros((len(matrix), 1)), values.cumsum(axis=1)], axis=1)
+    centres = np.arange(half, width - half)
+    trend = np.full(matrix.shape, np.nan)
+    trend[:, centres] = (cumulative[:, centres + half] - cumulative[:, centres - half + 1] +
+                         0.5 * (values[:, centres - half] + values[:, centres + half])) / period
+    trend[np.arange(width) > (lengths - half - 1)[:, None]] = np.nan
+
+    # Extrapolate both ends from the nearest `period` trend points; the windows
+    # stop short of the last defined point, as in statsmodels
+    back = lengths - half - 1
+    front_x = half + np.arange(period)[None, :] + np.zeros((len(matrix), 1), dtype=int)
+    front_slope, front_intercept = _line_fit(front_x, trend[rows[:, None], np.minimum(front_x, width - 1)],
+                                             front_x < back[:, None])
+    trend[:, :half] = front_slope[:, None] * np.arange(half) + front_intercept[:, None]
+
+    back_x = (back - period)[:, None] + np.arange(period)
+    back_slope, back_intercept = _line_fit(back_x, trend[rows[:, None], np.maximum(back_x, 0)],
+                                           back_x >= half)
+    tail = back[:, None] + np.arange(1, half + 1)
+    trend[rows[:, None], tail] = back_slope[:, None] * tail + back_intercept[:, None]
+
+    # Seasonal component: per-phase mean of the detrended series, centred on zero
+    detrended = np.where(valid, matrix - trend, np.nan)
+    phase_means = np.stack([_row_nanmean(detrended[:, phase::period]) for phase in range(period)], axis=1)
+    phase_means -= phase_means.mean(axis=1, keepdims=True)
+    seasonal = np.where(valid, phase_means[:, np.arange(width) % period], np.nan)
+
+    return trend[:, 0], trend[rows, lengths - 1], _row_nanstd(seasonal)
+
+
+def _trend_result(trend_direction, seasonality, stability, trend_strength):
+    return {
+        'trend_direction': trend_direction,
+        'seasonality': seasonality,
+        'stability': stability,
+        'trend_strength': float(trend_strength),
+        'market_coverage_trend': trend_direction
+    }
+
+
+def batch_trend_analysis(df, keys, period=SEASONAL_PERIOD):
+    """
+    Trend analysis for every entity identified by the key columns at once.
+    Returns {entity key: trend dict} with the same fields and thresholds as
+    EnhancedMarketAnalysisModel.analyze_trends.
+    """
+    data = df[keys + ['date', 'sales']].copy()
+    data['date'] = pd.to_datetime(data['date'], errors='coerce')
+    data = data.dropna(subset=['date', 'sales']).sort_values('date', kind='mergesort')
+    if data.empty:
+        return {}
+
+    rows = data.groupby(keys, sort=True, observed=True)['sales'].agg(['size', 'first', 'last', 'mean'])
+    index, matrix, lengths = monthly_sales_matrix(data, keys)
+    rows = rows.reindex(index)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        monthly_mean = _row_nanmean(matrix)
+        monthly_std = _row_nanstd(matrix)
+        monthly_first = matrix[:, 0]
+        monthly_last = matrix[np.arange(len(matrix)), lengths - 1]
+        row_strength = (rows['last'] - rows['first']).abs().to_numpy() / rows['mean'].to_numpy()
+
+        decomposable = lengths >= 2 * period
+        trend_first = np.full(len(matrix), np.nan)
+        trend_last = np.full(len(matrix), np.nan)
+        seasonal_std = np.full(len(matrix), np.nan)
+        if decomposable.any():
+            with span('seasonal_decompose'):
+                trend_first[decomposable], trend_last[decomposable], seasonal_std[decomposable] = decompose_trends(
+                    matrix[decomposable][:, :lengths[decomposable].max()], lengths[decomposable], period
+                )
+        seasonal_strength = seasonal_std / monthly_std
+        volatility = monthly_std / monthly_mean
+        trend_strength = np.abs(trend_last - trend_first) / monthly_mean
+        monthly_strength = np.abs(monthly_last - monthly_first) / monthly_mean
+
+    row_growing = (rows['last'] > rows['first']).to_numpy()
+    results = {}
+    for i, key in enumerate(index):
+        size = rows['size'].iloc[i]
+        if size < period:
+            # Simple trend for small datasets
+            if size >= 2:
+                direction = 'Growing' if row_growing[i] else 'Declining'
+                results[key] = _trend_result(direction, 'Insufficient data', 'Unknown', row_strength[i])
+            else:
+                results[key] = _trend_result('Stable', 'Insufficient data', 'Unknown', 0)
+        elif lengths[i] < period:
+            direction = 'Growing' if monthly_last[i] > monthly_first[i] else 'Declining'
+            results[key] = _trend_result(direction, 'Insufficient data', 'Unknown', monthly_strength[i])
+        elif not decomposable[i]:
+            # Fewer than two seasonal cycles cannot be decomposed
+            direction = 'Growing' if row_growing[i] else 'Declining'
+            results[key] = _trend_result(direction, 'Unknown', 'Unknown', row_strength[i])
+        else:
+            direction = 'Growing' if trend_last[i] > trend_first[i] else 'Declining'
+            seasonality = ('Strong' if seasonal_strength[i] > 0.3 else
+                           'Moderate' if seasonal_strength[i] > 0.1 else 'Weak')
+            stability = ('Stable' if volatility[i] < 0.2 else
+                         'Moderate' if volatility[i] < 0.5 else 'Volatile')
+            results[key] = _trend_result(direction, seasonality, stability, trend_strength[i])
+    return results